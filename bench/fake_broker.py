@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Minimal MQTT 3.1.1 broker stand-in: accepts QoS 0 publishes, keeps retained messages and counts traffic.
+#   python bench/fake_broker.py --port 1883
+import argparse, json, socket, socketserver, threading, time
+
+class FakeBroker:
+  def __init__(self, *, username=None, password=None):
+    self.username, self.password = username, password
+    self.calls, self.retained, self.lock = {}, {}, threading.Lock()
+    self.clients = set()
+    self.port = None
+
+  def count(self, key: str, n: int = 1):
+    with self.lock:
+      self.calls[key] = self.calls.get(key, 0) + n
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      return dict(self.calls)
+
+  def retain(self, topic: str, payload: bytes):
+    with self.lock:
+      if payload:
+        self.retained[topic] = payload
+      else:
+        self.retained.pop(topic, None)
+
+  def drop(self):
+    with self.lock:
+      clients = list(self.clients)
+    for sock in clients:
+      try:
+        sock.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+
+  def topics(self, prefix: str = "") -> dict:
+    with self.lock:
+      return {t: p.decode("utf-8", "replace") for t, p in self.retained.items() if t.startswith(prefix)}
+
+def _read_str(buf: bytes, i: int):
+  n = int.from_bytes(buf[i:i + 2], "big")
+  return buf[i + 2:i + 2 + n], i + 2 + n
+
+class _Handler(socketserver.BaseRequestHandler):
+  broker = None
+
+  def _recv(self, n: int) -> bytes:
+    data = b""
+    while len(data) < n:
+      chunk = self.request.recv(n - len(data))
+      if not chunk:
+        raise ConnectionError("client went away")
+      data += chunk
+    return data
+
+  def _packet(self):
+    kind = self._recv(1)[0]
+    length, shift = 0, 0
+    while True:
+      byte = self._recv(1)[0]
+      length |= (byte & 0x7f) << shift
+      shift += 7
+      if not byte & 0x80:
+        break
+    return kind, self._recv(length) if length else b""
+
+  def handle(self):
+    broker, will, clean = self.broker, None, False
+    try:
+      kind, body = self._packet()
+      if kind >> 4 != 1:
+        return
+      flags = body[7]
+      _, i = _read_str(body, 10)
+      if flags & 0x04:
+        topic, i = _read_str(body, i)
+        msg, i = _read_str(body, i)
+        will = (topic.decode(), msg, bool(flags & 0x20))
+      user = pwd = None
+      if flags & 0x80:
+        user, i = _read_str(body, i)
+      if flags & 0x40:
+        pwd, i = _read_str(body, i)
+      if broker.username is not None and (user, pwd) != (broker.username.encode(), (broker.password or "").encode()):
+        broker.count("refused")
+        self.request.sendall(b"\x20\x02\x00\x04")
+        return
+      broker.count("connect")
+      with broker.lock:
+        broker.clients.add(self.request)
+      self.request.sendall(b"\x20\x02\x00\x00")
+      while True:
+        kind, body = self._packet()
+        ptype = kind >> 4
+        if ptype == 3:
+          topic, i = _read_str(body, 0)
+          if (kind >> 1) & 3:
+            i += 2
+          payload = body[i:]
+          broker.count("publish")
+          broker.count("bytes", len(payload))
+          if kind & 1:
+            broker.retain(topic.decode(), payload)
+        elif ptype == 12:
+          broker.count("ping")
+          self.request.sendall(b"\xd0\x00")
+        elif ptype == 14:
+          broker.count("disconnect")
+          clean = True
+          return
+    except (ConnectionError, OSError):
+      pass
+    finally:
+      with broker.lock:
+        broker.clients.discard(self.request)
+      if will and not clean:
+        broker.count("will")
+        if will[2]:
+          broker.retain(will[0], will[1])
+
+def serve(broker: FakeBroker, port: int = 0):
+  handler = type("Handler", (_Handler,), {"broker": broker})
+  server = socketserver.ThreadingTCPServer(("127.0.0.1", port), handler, bind_and_activate=False)
+  server.allow_reuse_address = True
+  server.server_bind()
+  server.server_activate()
+  server.daemon_threads = True
+  broker.port = server.server_address[1]
+  threading.Thread(target=server.serve_forever, daemon=True, name="fake-broker").start()
+  return server
+
+def main():
+  ap = argparse.ArgumentParser(description="Fake MQTT 3.1.1 broker")
+  ap.add_argument("--port", type=int, default=1883)
+  ap.add_argument("--username", default=None)
+  ap.add_argument("--password", default=None)
+  args = ap.parse_args()
+  broker = FakeBroker(username=args.username, password=args.password)
+  serve(broker, args.port)
+  print(f"fake broker on 127.0.0.1:{broker.port}")
+  try:
+    while True:
+      time.sleep(10)
+      print(json.dumps(dict(broker.snapshot(), retained=len(broker.retained))))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
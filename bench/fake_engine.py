@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# Minimal Docker Engine API stand-in on a unix socket, enough for docker-monitor's calls.
+#   python bench/fake_engine.py --socket /tmp/bench/docker.sock --containers 100 --images 30
+import argparse, hashlib, json, os, random, re, socketserver, threading, time
+from http.server import BaseHTTPRequestHandler
+from urllib import parse as _urlparse
+
+def _sha(*parts) -> str:
+  return "sha256:" + hashlib.sha256("/".join(str(p) for p in parts).encode()).hexdigest()
+
+class FakeEngine:
+  def __init__(self, containers=10, images=None, *, registry="127.0.0.1:5001", latency=0.0, stats_latency=0.5, fail_rate=0.0, seed=1):
+    self.latency, self.stats_latency, self.fail_rate = latency, stats_latency, fail_rate
+    self.rand = random.Random(seed)
+    self.calls, self.lock = {}, threading.Lock()
+    self.events = []
+    self.images, self.containers = {}, {}
+    nimages = max(1, images or max(1, containers // 3))
+    for i in range(nimages):
+      repo = f"{registry}/bench/img{i}"
+      iid = _sha("image", i)
+      self.images[iid] = {"Id": iid, "RepoTags": [f"{repo}:latest"], "RepoDigests": [f"{repo}@{_sha('local', i)}"],
+                          "Created": 1700000000, "Size": 50_000_000 + i * 1_000_000, "SharedSize": -1, "Containers": -1, "Labels": {}}
+    ids = list(self.images)
+    for i in range(containers):
+      cid = hashlib.sha256(f"container/{i}".encode()).hexdigest()
+      img = self.images[ids[i % len(ids)]]
+      self.containers[cid] = {
+        "Id": cid, "Name": f"/c{i}", "Image": img["Id"], "Created": "2024-01-01T00:00:00Z",
+        "State": {"Status": "running", "Running": True, "Pid": 1000 + i, "StartedAt": "2024-01-01T00:00:00Z"},
+        "Config": {"Image": img["RepoTags"][0], "Env": ["A=1"], "Cmd": ["sleep", "infinity"], "Labels": {}},
+        "HostConfig": {"NetworkMode": "bridge", "RestartPolicy": {"Name": "unless-stopped"}, "Binds": None, "PortBindings": {}},
+        "NetworkSettings": {"Networks": {"bridge": {"IPAddress": f"172.17.{i // 250}.{i % 250 + 2}", "Aliases": None}}},
+      }
+
+  def count(self, key: str):
+    with self.lock:
+      self.calls[key] = self.calls.get(key, 0) + 1
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      return dict(self.calls)
+
+  def find(self, ref: str):
+    ref = ref.lstrip("/")
+    for cid, c in self.containers.items():
+      if cid == ref or c["Name"] == "/" + ref or (len(ref) >= 12 and cid.startswith(ref)):
+        return c
+    return None
+
+  def stats(self, c, n=0):
+    i = int(c["Name"][2:]) if c["Name"][2:].isdigit() else 0
+    t = time.time()
+    return {
+      "read": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime(t)),
+      "cpu_stats": {"cpu_usage": {"total_usage": int(t * 1e7) + i * 1000}, "system_cpu_usage": int(t * 1e9), "online_cpus": 4},
+      "precpu_stats": {"cpu_usage": {"total_usage": int((t - 1) * 1e7) + i * 1000}, "system_cpu_usage": int((t - 1) * 1e9), "online_cpus": 4},
+      "memory_stats": {"usage": 100_000_000 + i * 1000, "limit": 8_000_000_000, "stats": {"inactive_file": 1000}},
+      "networks": {"eth0": {"rx_bytes": int(t) * 10 + n, "tx_bytes": int(t) * 5 + n}},
+      "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 4096 * i}, {"op": "write", "value": 8192 * i}]},
+    }
+
+  def write_cgroups(self, root: str, proc: str, version: int = 2, tick: float = 1.0):
+    # Lays out a cgroup tree and /proc entries for the running containers and keeps the counters moving.
+    def _write(path, text):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      with open(path + ".tmp", "w") as f:
+        f.write(text)
+      os.replace(path + ".tmp", path)
+    if version == 2:
+      _write(os.path.join(root, "cgroup.controllers"), "cpu io memory pids\n")
+    _write(os.path.join(proc, "meminfo"), "MemTotal:       16384000 kB\nMemFree:         8192000 kB\n")
+    def layout(n):
+      for i, c in enumerate(self.containers.values()):
+        if not c["State"]["Running"]:
+          continue
+        cid, pid = c["Id"], c["State"]["Pid"]
+        cpu_us, mem, io = (i % 10 + 1) * 10_000 * n, 100_000_000 + i * 1000, 4096 * i * (n + 1)
+        if version == 2:
+          d = os.path.join(root, "system.slice", f"docker-{cid}.scope")
+          _write(os.path.join(d, "cpu.stat"), f"usage_usec {cpu_us}\nuser_usec {cpu_us}\nsystem_usec 0\n")
+          _write(os.path.join(d, "memory.current"), f"{mem}\n")
+          _write(os.path.join(d, "memory.max"), "max\n" if i % 2 else "536870912\n")
+          _write(os.path.join(d, "io.stat"), f"8:0 rbytes={io} wbytes={2 * io} rios=1 wios=2 dbytes=0 dios=0\n")
+          cgroup = f"0::/system.slice/docker-{cid}.scope\n"
+        else:
+          _write(os.path.join(root, "cpuacct", "docker", cid, "cpuacct.usage"), f"{cpu_us * 1000}\n")
+          _write(os.path.join(root, "memory", "docker", cid, "memory.usage_in_bytes"), f"{mem}\n")
+          _write(os.path.join(root, "memory", "docker", cid, "memory.limit_in_bytes"), "9223372036854771712\n")
+          _write(os.path.join(root, "blkio", "docker", cid, "blkio.throttle.io_service_bytes_recursive"),
+                 f"8:0 Read {io}\n8:0 Write {2 * io}\n8:0 Total {3 * io}\nTotal {3 * io}\n")
+          cgroup = f"12:memory:/docker/{cid}\n11:cpu,cpuacct:/docker/{cid}\n10:blkio:/docker/{cid}\n"
+        _write(os.path.join(proc, str(pid), "cgroup"), cgroup)
+        _write(os.path.join(proc, str(pid), "net", "dev"),
+               "Inter-|   Receive                                                |  Transmit\n"
+               " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n"
+               f"    lo:    1000      10    0    0    0     0          0         0     1000      10    0    0    0     0       0          0\n"
+               f"  eth0: {10 * n + i} 5 0 0 0 0 0 0 {5 * n + i} 5 0 0 0 0 0 0\n")
+    layout(0)
+    def ticker():
+      n = 0
+      while True:
+        time.sleep(tick); n += 1
+        layout(n)
+    threading.Thread(target=ticker, daemon=True, name="fake-cgroup").start()
+
+  def df(self):
+    base = 30_000_000 if len(self.images) > 1 else 0
+    used = {}
+    for c in self.containers.values():
+      used[c["Image"]] = used.get(c["Image"], 0) + 1
+    images = [dict(i, SharedSize=base if i["RepoTags"] else 0, Containers=used.get(iid, 0)) for iid, i in self.images.items()]
+    containers = [dict(self.summary(c), SizeRw=4096 * (n % 7)) for n, c in enumerate(self.containers.values())]
+    return {"LayersSize": sum(i["Size"] for i in images) - base * max(0, sum(1 for i in images if i["RepoTags"]) - 1), "Images": images,
+            "Containers": containers, "Volumes": [], "BuildCache": []}
+
+  def summary(self, c):
+    img = self.images.get(c["Image"]) or {}
+    return {"Id": c["Id"], "Names": [c["Name"]], "Image": c["Config"]["Image"], "ImageID": c["Image"], "Command": "sleep infinity",
+            "Created": 1700000000, "State": c["State"]["Status"], "Status": "Up", "Labels": c["Config"]["Labels"],
+            "HostConfig": {"NetworkMode": "bridge"}, "SizeRootFs": img.get("Size")}
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  engine = None
+
+  def address_string(self):
+    return "unix"
+
+  def log_message(self, *args):
+    pass
+
+  def _send(self, code: int, payload=None, headers=None):
+    body = b"" if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+    self.send_response(code)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    for k, v in (headers or {}).items():
+      self.send_header(k, v)
+    self.end_headers()
+    if self.command != "HEAD":
+      self.wfile.write(body)
+
+  def _stream(self, chunks):
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Transfer-Encoding", "chunked")
+    self.end_headers()
+    try:
+      for chunk in chunks:
+        data = json.dumps(chunk).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+      self.wfile.write(b"0\r\n\r\n")
+    except (BrokenPipeError, ConnectionResetError):
+      self.close_connection = True
+
+  def _body(self):
+    n = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(n) or b"{}") if n else {}
+
+  def _route(self):
+    eng = self.engine
+    url = _urlparse.urlparse(self.path)
+    path = re.sub(r"^/v[0-9.]+", "", url.path)
+    qs = dict(_urlparse.parse_qsl(url.query))
+    key = self.command + " " + re.sub(r"/[0-9a-f]{12,64}|/c\d+|/sha256:[0-9a-f]+", "/{id}", path)
+    eng.count(key)
+    if eng.latency:
+      time.sleep(eng.latency)
+    if eng.fail_rate and path not in ("/_ping", "/version", "/events") and eng.rand.random() < eng.fail_rate:
+      return self._send(500, {"message": "injected failure"})
+    if path in ("/_ping",):
+      return self._send(200, b"OK")
+    if path == "/version":
+      return self._send(200, {"Version": "24.0.0", "ApiVersion": "1.43", "MinAPIVersion": "1.12", "Os": "linux", "Arch": "amd64"})
+    if path == "/info":
+      return self._send(200, {"OSType": "linux", "Architecture": "x86_64", "Containers": len(eng.containers), "Images": len(eng.images)})
+    if path == "/containers/json":
+      return self._send(200, [eng.summary(c) for c in eng.containers.values()])
+    if path == "/images/json":
+      filters = json.loads(qs.get("filters") or "{}")
+      if filters.get("dangling"):
+        return self._send(200, [])
+      return self._send(200, list(eng.images.values()))
+    if path == "/system/df":
+      return self._send(200, eng.df())
+    if path == "/events":
+      def events():
+        while True:
+          if eng.events:
+            yield eng.events.pop(0)
+          else:
+            time.sleep(0.5)
+      return self._stream(events())
+    if path == "/images/create":
+      ref = qs.get("fromImage", "") + ":" + qs.get("tag", "latest")
+      return self._stream([{"status": f"Pulling from {ref}"}, {"status": "Digest: " + _sha("remote", ref)}, {"status": f"Status: Image is up to date for {ref}"}])
+    m = re.match(r"^/images/(.+)/json$", path)
+    if m:
+      ref = _urlparse.unquote(m.group(1))
+      img = eng.images.get(ref) or next((i for i in eng.images.values() if ref in i["RepoTags"]), None)
+      return self._send(200, img) if img else self._send(404, {"message": f"No such image: {ref}"})
+    m = re.match(r"^/containers/([^/]+)(/[a-z]+)?$", path)
+    if m:
+      c = eng.find(m.group(1))
+      if c is None:
+        return self._send(404, {"message": f"No such container: {m.group(1)}"})
+      action = m.group(2) or ""
+      if action == "/json":
+        return self._send(200, c)
+      if action == "/stats":
+        if qs.get("stream", "1").lower() in ("0", "false"):
+          time.sleep(eng.stats_latency)
+          return self._send(200, eng.stats(c))
+        def samples():
+          n = 0
+          while True:
+            yield eng.stats(c, n); n += 1
+            time.sleep(1.0)
+        return self._stream(samples())
+      if action in ("/start", "/stop", "/restart", "/rename"):
+        return self._send(204)
+    return self._send(404, {"message": f"not implemented: {self.command} {path}"})
+
+  do_GET = do_POST = do_HEAD = do_DELETE = _route
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+def serve(engine: FakeEngine, socket_path: str):
+  if os.path.exists(socket_path):
+    os.unlink(socket_path)
+  handler = type("Handler", (_Handler,), {"engine": engine})
+  server = _UnixServer(socket_path, handler)
+  threading.Thread(target=server.serve_forever, daemon=True, name="fake-engine").start()
+  return server
+
+def main():
+  ap = argparse.ArgumentParser(description="Fake Docker Engine API on a unix socket")
+  ap.add_argument("--socket", default="/tmp/docker-monitor-bench/docker.sock")
+  ap.add_argument("--containers", type=int, default=10)
+  ap.add_argument("--images", type=int, default=None)
+  ap.add_argument("--registry", default="127.0.0.1:5001")
+  ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+  ap.add_argument("--stats-latency", type=float, default=0.5, help="seconds a one-shot stats call blocks")
+  ap.add_argument("--fail-rate", type=float, default=0.0)
+  ap.add_argument("--cgroup-root", default=None, help="also lay out a fake cgroup tree here")
+  ap.add_argument("--proc", default=None, help="fake /proc for the cgroup tree (default <cgroup-root>/../proc)")
+  ap.add_argument("--cgroup-version", type=int, choices=(1, 2), default=2)
+  args = ap.parse_args()
+  os.makedirs(os.path.dirname(args.socket) or ".", exist_ok=True)
+  engine = FakeEngine(args.containers, args.images, registry=args.registry, latency=args.latency, stats_latency=args.stats_latency, fail_rate=args.fail_rate)
+  serve(engine, args.socket)
+  if args.cgroup_root:
+    engine.write_cgroups(args.cgroup_root, args.proc or os.path.join(os.path.dirname(args.cgroup_root.rstrip("/")), "proc"), args.cgroup_version)
+  print(f"fake engine on unix://{args.socket} ({len(engine.containers)} containers, {len(engine.images)} images)")
+  try:
+    while True:
+      time.sleep(10)
+      print(json.dumps(engine.snapshot()))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
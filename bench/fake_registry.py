@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Minimal OCI registry stand-in with bearer-token auth, answering manifest HEAD/GET with a digest.
+#   python bench/fake_registry.py --port 5001 --update-ratio 0.3 --latency 0.05
+import argparse, hashlib, json, random, re, secrets, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as _urlparse
+
+class FakeRegistry:
+  def __init__(self, *, latency=0.0, fail_rate=0.0, update_ratio=0.3, token_ttl=300, rate_limit=None, seed=1):
+    self.latency, self.fail_rate, self.update_ratio, self.token_ttl = latency, fail_rate, update_ratio, token_ttl
+    self.rate_limit = rate_limit
+    self.rand = random.Random(seed)
+    self.tokens = {}
+    self.calls, self.lock = {}, threading.Lock()
+    self.port = None
+
+  def count(self, key: str):
+    with self.lock:
+      self.calls[key] = self.calls.get(key, 0) + 1
+
+  def snapshot(self) -> dict:
+    with self.lock:
+      return dict(self.calls)
+
+  def digest(self, repo: str, tag: str) -> str:
+    m = re.search(r"img(\d+)$", repo)
+    i = int(m.group(1)) if m else 0
+    if (i * 7919 % 100) < self.update_ratio * 100:
+      return "sha256:" + hashlib.sha256(f"remote/{repo}:{tag}".encode()).hexdigest()
+    return "sha256:" + hashlib.sha256(f"local/{i}".encode()).hexdigest()
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  registry = None
+
+  def log_message(self, *args):
+    pass
+
+  def _send(self, code: int, payload=b"", headers=None):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    self.send_response(code)
+    self.send_header("Content-Length", str(len(body)))
+    for k, v in (headers or {}).items():
+      self.send_header(k, v)
+    self.end_headers()
+    if self.command != "HEAD":
+      self.wfile.write(body)
+
+  def _route(self):
+    reg = self.registry
+    url = _urlparse.urlparse(self.path)
+    qs = dict(_urlparse.parse_qsl(url.query))
+    if reg.latency:
+      time.sleep(reg.latency)
+    if url.path == "/token":
+      reg.count("token")
+      token = secrets.token_hex(16)
+      reg.tokens[token] = (qs.get("scope", ""), time.time() + reg.token_ttl)
+      return self._send(200, {"token": token, "expires_in": reg.token_ttl}, {"Content-Type": "application/json"})
+    m = re.match(r"^/v2/(.+)/manifests/([^/]+)$", url.path)
+    if not m:
+      reg.count("other")
+      return self._send(404, {"errors": [{"code": "NOT_FOUND"}]})
+    repo, tag = m.group(1), m.group(2)
+    reg.count(f"manifest_{self.command.lower()}")
+    scope = f"repository:{repo}:pull"
+    auth = self.headers.get("Authorization") or ""
+    entry = reg.tokens.get(auth[7:]) if auth.startswith("Bearer ") else None
+    if not entry or entry[0] != scope or entry[1] < time.time():
+      reg.count("unauthorized")
+      realm = f"http://127.0.0.1:{reg.port}/token"
+      return self._send(401, {"errors": [{"code": "UNAUTHORIZED"}]},
+                        {"WWW-Authenticate": f'Bearer realm="{realm}",service="bench-registry",scope="{scope}"'})
+    headers = {}
+    if reg.rate_limit is not None:
+      reg.rate_limit = max(0, reg.rate_limit - 1)
+      headers["RateLimit-Limit"] = "100;w=21600"
+      headers["RateLimit-Remaining"] = f"{reg.rate_limit};w=21600"
+      if reg.rate_limit == 0:
+        reg.count("throttled")
+        return self._send(429, {"errors": [{"code": "TOOMANYREQUESTS"}]}, dict(headers, **{"Retry-After": "60"}))
+    if reg.fail_rate and reg.rand.random() < reg.fail_rate:
+      reg.count("failed")
+      return self._send(503, {"errors": [{"code": "UNAVAILABLE"}]})
+    manifest = json.dumps({"schemaVersion": 2, "mediaType": "application/vnd.oci.image.index.v1+json", "manifests": []}).encode()
+    headers.update({"Docker-Content-Digest": reg.digest(repo, tag), "Content-Type": "application/vnd.oci.image.index.v1+json"})
+    return self._send(200, manifest, headers)
+
+  do_GET = do_HEAD = _route
+
+def serve(registry: FakeRegistry, port: int = 0):
+  handler = type("Handler", (_Handler,), {"registry": registry})
+  server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+  server.daemon_threads = True
+  registry.port = server.server_address[1]
+  threading.Thread(target=server.serve_forever, daemon=True, name="fake-registry").start()
+  return server
+
+def main():
+  ap = argparse.ArgumentParser(description="Fake OCI registry with token auth")
+  ap.add_argument("--port", type=int, default=5001)
+  ap.add_argument("--latency", type=float, default=0.0)
+  ap.add_argument("--fail-rate", type=float, default=0.0)
+  ap.add_argument("--update-ratio", type=float, default=0.3, help="share of images whose remote digest differs")
+  ap.add_argument("--rate-limit", type=int, default=None, help="requests before answering 429")
+  args = ap.parse_args()
+  registry = FakeRegistry(latency=args.latency, fail_rate=args.fail_rate, update_ratio=args.update_ratio, rate_limit=args.rate_limit)
+  serve(registry, args.port)
+  print(f"fake registry on http://127.0.0.1:{registry.port}")
+  try:
+    while True:
+      time.sleep(10)
+      print(json.dumps(registry.snapshot()))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Throughput check for a running docker-monitor instance.
+#   python bench/load.py --url http://127.0.0.1:5000 --key <key> --paths /status?light=1,/health --concurrency 32 --duration 20
+import argparse, json, threading, time, urllib.request, urllib.error
+from urllib import parse as _urlparse
+
+def _percentile(values, p):
+  if not values: return None
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+def _request(url: str, timeout: float):
+  t0 = time.perf_counter()
+  try:
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+      r.read()
+      code = r.status
+  except urllib.error.HTTPError as e:
+    code = e.code
+  except Exception:
+    code = 0
+  return code, time.perf_counter() - t0
+
+def _with_key(url: str, key: str) -> str:
+  if not key: return url
+  return url + ("&" if "?" in url else "?") + _urlparse.urlencode({"key": key})
+
+def container_count(base: str, key: str, timeout: float = 60.0):
+  try:
+    with urllib.request.urlopen(_with_key(base + "/status?light=1", key), timeout=timeout) as r:
+      return len((json.loads(r.read()) or {}).get("updates") or {})
+  except Exception:
+    return None
+
+def run_load(base: str, paths, *, key: str = "", concurrency: int = 16, duration: float = 10.0, timeout: float = 30.0) -> dict:
+  results = {p: {"lat": [], "codes": {}} for p in paths}
+  lock = threading.Lock()
+  deadline = time.perf_counter() + duration
+  def worker(i):
+    n = i
+    while time.perf_counter() < deadline:
+      path = paths[n % len(paths)]; n += 1
+      code, dt = _request(_with_key(base + path, key), timeout)
+      with lock:
+        res = results[path]
+        res["codes"][str(code)] = res["codes"].get(str(code), 0) + 1
+        if code == 200 or code == 304: res["lat"].append(dt)
+  threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+  t0 = time.perf_counter()
+  for t in threads: t.start()
+  for t in threads: t.join()
+  elapsed = time.perf_counter() - t0
+  out = {"concurrency": concurrency, "duration": round(elapsed, 2), "endpoints": {}}
+  for path, res in results.items():
+    total = sum(res["codes"].values())
+    out["endpoints"][path] = {
+      "requests": total, "ok": len(res["lat"]), "rps": round(len(res["lat"]) / elapsed, 1), "codes": res["codes"],
+      "p50_ms": round(_percentile(res["lat"], 50) * 1000, 1) if res["lat"] else None,
+      "p95_ms": round(_percentile(res["lat"], 95) * 1000, 1) if res["lat"] else None,
+    }
+  return out
+
+def main():
+  ap = argparse.ArgumentParser(description="Concurrent HTTP load against docker-monitor")
+  ap.add_argument("--url", default="http://127.0.0.1:5000")
+  ap.add_argument("--key", default="")
+  ap.add_argument("--paths", default="/status?light=1,/health")
+  ap.add_argument("--concurrency", type=int, default=16)
+  ap.add_argument("--duration", type=float, default=10.0)
+  ap.add_argument("--timeout", type=float, default=30.0)
+  ap.add_argument("--json", action="store_true", help="print a JSON report")
+  args = ap.parse_args()
+  base = args.url.rstrip("/")
+  report = run_load(base, [p.strip() for p in args.paths.split(",") if p.strip()], key=args.key,
+                    concurrency=args.concurrency, duration=args.duration, timeout=args.timeout)
+  report["containers"] = container_count(base, args.key)
+  if args.json:
+    print(json.dumps(report, indent=2)); return
+  print(f"{report['containers']} containers, {args.concurrency} clients, {report['duration']}s")
+  for path, r in report["endpoints"].items():
+    print(f"  {path:<28} {r['rps']:>8} req/s  p50 {r['p50_ms']} ms  p95 {r['p95_ms']} ms  codes {r['codes']}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Runs docker-monitor against the fake engine and registry and reports latency and call counts.
+#   python bench/run.py --sizes 10,100,500 --out bench-results.json
+#   python bench/run.py --sizes 100 --compare bench-results.json
+import argparse, json, os, platform, socket, subprocess, sys, tempfile, time, urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_broker, fake_engine, fake_registry, load
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _free_port() -> int:
+  with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    return s.getsockname()[1]
+
+def _get(url: str, timeout: float = 120.0):
+  t0 = time.perf_counter()
+  try:
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+      body = r.read()
+      code = r.status
+  except urllib.error.HTTPError as e:
+    body, code = e.read(), e.code
+  return code, time.perf_counter() - t0, body
+
+def _delta(after: dict, before: dict) -> dict:
+  return {k: after[k] - before.get(k, 0) for k in after if after[k] - before.get(k, 0)}
+
+def _registry_total(calls: dict) -> int:
+  return sum(v for k, v in calls.items() if k != "unauthorized")
+
+def start_app(socket_path: str, workdir: str, port: int, extra_env: dict):
+  env = dict(os.environ, DOCKER_HOSTS=f"local=unix://{socket_path}", SETTINGS_PATH=os.path.join(workdir, "settings.json"),
+             DIGEST_CACHE_PATH=os.path.join(workdir, "digest_cache.json"), AUTH_ENABLED="false", HOSTNAME="", PYTHONUNBUFFERED="1")
+  env.update(extra_env)
+  code = ("import sys; sys.path.insert(0, %r); import script; " % REPO +
+          ("script._serve_production('127.0.0.1', %d)" % port if env.get("SERVER_MODE") == "production"
+           else "script.app.run(host='127.0.0.1', port=%d, threaded=True)" % port))
+  log = open(os.path.join(workdir, "app.log"), "w")
+  return subprocess.Popen([sys.executable, "-c", code], cwd=REPO, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for(base: str, path: str, deadline: float, codes=(200,)):
+  while time.time() < deadline:
+    try:
+      if _get(base + path, timeout=5)[0] in codes:
+        return True
+    except Exception:
+      pass
+    time.sleep(0.05)
+  return False
+
+def run_scenario(n: int, args) -> dict:
+  registry = fake_registry.FakeRegistry(latency=args.registry_latency, fail_rate=args.registry_fail_rate, update_ratio=args.update_ratio)
+  reg_server = fake_registry.serve(registry)
+  engine = fake_engine.FakeEngine(n, args.images or max(1, n // 3), registry=f"127.0.0.1:{registry.port}",
+                                  latency=args.daemon_latency, stats_latency=args.stats_latency, fail_rate=args.daemon_fail_rate)
+  workdir = tempfile.mkdtemp(prefix=f"dm-bench-{n}-")
+  socket_path = os.path.join(workdir, "docker.sock")
+  eng_server = fake_engine.serve(engine, socket_path)
+  extra_env = dict(kv.split("=", 1) for kv in args.env)
+  if args.cgroup:
+    cg_root, fake_proc = os.path.join(workdir, "cgroup"), os.path.join(workdir, "proc")
+    engine.write_cgroups(cg_root, fake_proc, version=args.cgroup)
+    extra_env.update(CGROUP_ROOT=cg_root, HOST_PROC=fake_proc)
+  else:
+    extra_env.setdefault("CGROUP_STATS", "false")
+  broker = broker_server = None
+  if args.mqtt:
+    broker = fake_broker.FakeBroker()
+    broker_server = fake_broker.serve(broker)
+    extra_env.update(MQTT_HOST="127.0.0.1", MQTT_PORT=str(broker.port))
+  port = _free_port()
+  base = f"http://127.0.0.1:{port}"
+  t_start = time.time()
+  proc = start_app(socket_path, workdir, port, extra_env)
+  result = {"containers": n, "images": len(engine.images), "endpoints": {}}
+  try:
+    if not wait_for(base, "/ready", time.time() + 120, codes=(200, 503)):
+      raise RuntimeError(f"app did not start, see {workdir}/app.log")
+    result["first_response_s"] = round(time.time() - t_start, 3)
+    result["startup_ok"] = result["first_response_s"] <= args.startup_target
+    if not wait_for(base, "/ready", time.time() + 120):
+      raise RuntimeError(f"app never became ready, see {workdir}/app.log")
+    result["ready_s"] = round(time.time() - t_start, 3)
+    wait_for(base, "/health", time.time() + 120)
+    result["startup_s"] = round(time.time() - t_start, 3)
+    refs = len(engine.images)
+    while time.time() - t_start < args.warm_timeout:
+      if registry.snapshot().get("manifest_head", 0) - registry.snapshot().get("unauthorized", 0) >= refs:
+        break
+      time.sleep(0.05)
+    result["warm"] = {"seconds": round(time.time() - t_start, 3), "registry": registry.snapshot(), "daemon_calls": sum(engine.snapshot().values())}
+    names = [f"c{i}" for i in range(n)]
+    targets = [("/status", lambda i: "/status"), ("/status?light=1", lambda i: "/status?light=1"),
+               ("/metrics/<name>", lambda i: f"/metrics/{names[i % n]}")]
+    for label, path_for in targets:
+      lat, codes = [], {}
+      e0, r0 = engine.snapshot(), registry.snapshot()
+      for i in range(args.requests):
+        code, dt, _ = _get(base + path_for(i))
+        codes[str(code)] = codes.get(str(code), 0) + 1
+        lat.append(dt)
+      daemon, reg = _delta(engine.snapshot(), e0), _delta(registry.snapshot(), r0)
+      result["endpoints"][label] = {
+        "requests": args.requests, "codes": codes,
+        "p50_ms": round(load._percentile(lat, 50) * 1000, 2), "p95_ms": round(load._percentile(lat, 95) * 1000, 2),
+        "daemon_calls_per_request": round(sum(daemon.values()) / args.requests, 2), "daemon_calls": daemon,
+        "registry_requests_per_request": round(_registry_total(reg) / args.requests, 2), "registry": reg,
+      }
+    if args.load_seconds:
+      e0 = engine.snapshot()
+      result["load"] = load.run_load(base, ["/status", "/status?light=1", "/health"], concurrency=args.load_concurrency, duration=args.load_seconds)
+      result["load"]["daemon_calls"] = _delta(engine.snapshot(), e0)
+    if broker:
+      m0 = broker.snapshot()
+      time.sleep(args.mqtt_seconds)
+      idle = _delta(broker.snapshot(), m0)
+      result["mqtt"] = {"totals": broker.snapshot(), "retained": len(broker.retained), "states": len(broker.topics("docker_monitor/")) - 1,
+                        "idle_seconds": args.mqtt_seconds, "idle_publishes_per_s": round(idle.get("publish", 0) / args.mqtt_seconds, 2)}
+  finally:
+    proc.terminate()
+    try:
+      proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+    eng_server.server_close()
+    if broker_server:
+      broker_server.shutdown()
+    reg_server.shutdown()
+  return result
+
+def compare(current: dict, baseline: dict):
+  old = {s["containers"]: s for s in baseline.get("scenarios", [])}
+  for s in current["scenarios"]:
+    b = old.get(s["containers"])
+    if not b:
+      continue
+    print(f"-- {s['containers']} containers vs baseline")
+    for ep, r in s["endpoints"].items():
+      o = (b.get("endpoints") or {}).get(ep)
+      if not o:
+        continue
+      ratio = lambda k: (r[k] / o[k]) if o.get(k) else float("nan")
+      print(f"  {ep:<18} p50 x{ratio('p50_ms'):.2f}  p95 x{ratio('p95_ms'):.2f}  daemon/req {o['daemon_calls_per_request']} -> {r['daemon_calls_per_request']}"
+            f"  registry/req {o['registry_requests_per_request']} -> {r['registry_requests_per_request']}")
+
+def main():
+  ap = argparse.ArgumentParser(description="docker-monitor benchmark against a fake daemon and registry")
+  ap.add_argument("--sizes", default="10,100,500")
+  ap.add_argument("--images", type=int, default=None, help="distinct images (default containers/3)")
+  ap.add_argument("--requests", type=int, default=20, help="sequential requests per endpoint")
+  ap.add_argument("--daemon-latency", type=float, default=0.0)
+  ap.add_argument("--stats-latency", type=float, default=0.5)
+  ap.add_argument("--daemon-fail-rate", type=float, default=0.0)
+  ap.add_argument("--registry-latency", type=float, default=0.02)
+  ap.add_argument("--registry-fail-rate", type=float, default=0.0)
+  ap.add_argument("--update-ratio", type=float, default=0.3)
+  ap.add_argument("--warm-timeout", type=float, default=120.0)
+  ap.add_argument("--startup-target", type=float, default=2.0, help="seconds allowed until the first HTTP response")
+  ap.add_argument("--load-seconds", type=float, default=0.0, help="also run a throughput phase of this length")
+  ap.add_argument("--load-concurrency", type=int, default=16)
+  ap.add_argument("--cgroup", type=int, choices=(1, 2), default=None, help="serve stats from a fake cgroup v1/v2 tree")
+  ap.add_argument("--mqtt", action="store_true", help="publish to a fake MQTT broker and report its traffic")
+  ap.add_argument("--mqtt-seconds", type=float, default=15.0, help="idle window used to measure steady-state MQTT traffic")
+  ap.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the app, repeatable")
+  ap.add_argument("--out", default=None, help="write the JSON report here")
+  ap.add_argument("--compare", default=None, help="baseline JSON report to compare with")
+  args = ap.parse_args()
+  try:
+    rev = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO, capture_output=True, text=True).stdout.strip()
+  except Exception:
+    rev = None
+  report = {"revision": rev, "python": platform.python_version(), "time": int(time.time()),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}, "scenarios": []}
+  for n in [int(x) for x in args.sizes.split(",") if x.strip()]:
+    s = run_scenario(n, args)
+    report["scenarios"].append(s)
+    print(f"{n} containers: first response {s['first_response_s']}s{'' if s['startup_ok'] else ' (over target)'}, ready {s['ready_s']}s, "
+          f"health {s['startup_s']}s, warm {s['warm']['seconds']}s ({s['warm']['registry']})", file=sys.stderr)
+    if "mqtt" in s:
+      print(f"  mqtt: {s['mqtt']['states']} container states, {s['mqtt']['totals'].get('publish', 0)} publishes, "
+            f"{s['mqtt']['idle_publishes_per_s']}/s when idle", file=sys.stderr)
+    for ep, r in s["endpoints"].items():
+      print(f"  {ep:<18} p50 {r['p50_ms']:>9} ms  p95 {r['p95_ms']:>9} ms  daemon/req {r['daemon_calls_per_request']:>7}  registry/req {r['registry_requests_per_request']}", file=sys.stderr)
+  if args.out:
+    with open(args.out, "w") as f:
+      json.dump(report, f, indent=2)
+  else:
+    print(json.dumps(report, indent=2))
+  if args.compare:
+    with open(args.compare) as f:
+      compare(report, json.load(f))
+
+if __name__ == "__main__":
+  main()
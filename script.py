@@ -1,12 +1,15 @@
-import os, time, urllib.request, logging, json, secrets, ipaddress, threading
+import os, re, time, logging, json, secrets, ipaddress, threading, hashlib, http.client, gzip, queue, heapq, random, socket, select
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
 from typing import Optional
-from flask import Flask, jsonify, request, abort, render_template, send_from_directory
+from flask import Flask, jsonify, request, abort, render_template, send_from_directory, stream_with_context, g
 import docker
 from urllib import parse as _urlparse
-from urllib.error import HTTPError
 
 logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
+_STARTED_AT = time.time()
 
 SETTINGS_PATH = os.getenv("SETTINGS_PATH", "/data/settings.json")
 
@@ -83,39 +86,500 @@ def _is_ip_allowed(addr: str) -> bool:
       continue
   return False
 
-client = docker.DockerClient(base_url='unix://var/run/docker.sock', version='auto', timeout=10)
+PERF_ENABLED = _truthy(os.getenv("PERF_ENABLED", "true"))
+_PERF_WINDOW = 512
+_perf = {"phases": {}, "registries": {}}
+_perf_lock = threading.Lock()
+_perf_counters = {"pull_cache_hits": 0, "pull_cache_misses": 0, "stats_cache_hits": 0, "stats_cache_misses": 0, "stats_live_hits": 0, "disk_cache_hits": 0, "disk_cache_misses": 0,
+                  "status_snapshot_hits": 0, "status_snapshot_misses": 0, "status_snapshot_joined": 0}
+_perf_local = threading.local()
 
-try:
-  SELF_CONTAINER_ID = os.getenv("HOSTNAME")
-  _self = client.containers.get(SELF_CONTAINER_ID) if SELF_CONTAINER_ID else None
-  SELF_CONTAINER_NAME = _self.name if _self else None
-except Exception:
-  SELF_CONTAINER_ID = None
-  SELF_CONTAINER_NAME = None
+def _perf_since(name: str, t0: float, group: str = "phases"):
+  if not PERF_ENABLED:
+    return
+  seconds = time.perf_counter() - t0
+  with _perf_lock:
+    e = _perf[group].get(name)
+    if e is None:
+      e = _perf[group][name] = {"count": 0, "total": 0.0, "max": 0.0, "window": deque(maxlen=_PERF_WINDOW)}
+    e["count"] += 1; e["total"] += seconds; e["max"] = max(e["max"], seconds)
+    e["window"].append(seconds)
+  timings = getattr(_perf_local, "timings", None)
+  if timings is not None and group == "phases":
+    timings[name] = timings.get(name, 0.0) + seconds
+
+def _perf_summary(group: str) -> dict:
+  with _perf_lock:
+    entries = {k: (e["count"], e["total"], e["max"], sorted(e["window"])) for k, e in _perf[group].items()}
+  out = {}
+  for name, (count, total, mx, win) in sorted(entries.items()):
+    pct = lambda p: round(win[min(len(win) - 1, int(round(p / 100.0 * (len(win) - 1))))] * 1000, 3) if win else None
+    out[name] = {"count": count, "avg_ms": round(total / count * 1000, 3) if count else None, "p50_ms": pct(50), "p95_ms": pct(95), "max_ms": round(mx * 1000, 3)}
+  return out
+
+DOCKER_TIMEOUT = int(os.getenv("DOCKER_TIMEOUT", "10"))
+DOCKER_POOL_SIZE = max(1, int(os.getenv("DOCKER_POOL_SIZE", "10")))
+
+def _parse_docker_hosts(raw: str) -> dict:
+  hosts = {}
+  for part in (raw or "").split(","):
+    part = part.strip()
+    if not part:
+      continue
+    name, sep, url = part.partition("=")
+    if not sep or "://" in name:
+      name, url = f"host{len(hosts)}" if hosts else "local", part
+    name = name.strip().replace("/", "-")
+    base, _, query = url.strip().partition("?")
+    opts = dict(_urlparse.parse_qsl(query))
+    try:
+      timeout, pool = int(opts.get("timeout", DOCKER_TIMEOUT)), int(opts.get("pool", DOCKER_POOL_SIZE))
+    except ValueError:
+      logging.warning("ignoring invalid options for docker host %s: %s", name, query)
+      timeout, pool = DOCKER_TIMEOUT, DOCKER_POOL_SIZE
+    hosts[name] = {"name": name, "url": base, "timeout": timeout, "pool": pool, "client": None,
+                   "ok": None, "error": None, "ts": None, "latency": None}
+  return hosts or {"local": {"name": "local", "url": "unix://var/run/docker.sock", "timeout": DOCKER_TIMEOUT, "pool": DOCKER_POOL_SIZE,
+                             "client": None, "ok": None, "error": None, "ts": None, "latency": None}}
+
+_hosts = _parse_docker_hosts(os.getenv("DOCKER_HOSTS", ""))
+PRIMARY_HOST = next(iter(_hosts))
+_hosts_lock = threading.Lock()
+_hosts_pool = ThreadPoolExecutor(max_workers=max(2, len(_hosts) * 2), thread_name_prefix="hosts")
+_host_lists = {}
+DOCKER_HOST_LIST_TTL = float(os.getenv("DOCKER_HOST_LIST_TTL", "5"))
+
+def _host_client(host: str):
+  h = _hosts[host]
+  if h["client"] is None:
+    with h.setdefault("lock", threading.Lock()):
+      if h["client"] is None:
+        h["client"] = docker.DockerClient(base_url=h["url"], version='auto', timeout=h["timeout"], max_pool_size=h["pool"])
+  return h["client"]
+
+class _LazyClient:
+  def __init__(self, host: str):
+    self._host = host
+  def __getattr__(self, attr):
+    return getattr(_host_client(self._host), attr)
+
+client = _LazyClient(PRIMARY_HOST)
+
+class _HostContainer:
+  def __init__(self, container, host: str):
+    self._container, self.host = container, host
+  def __getattr__(self, attr):
+    return getattr(self._container, attr)
+  @property
+  def name(self):
+    return f"{self.host}/{self._container.name}"
+
+def _host_of(container) -> str:
+  return getattr(container, "host", None) or PRIMARY_HOST
+
+def _split_host(name: str):
+  host, sep, rest = str(name).partition("/")
+  if sep and host in _hosts:
+    return host, rest
+  return PRIMARY_HOST, name
+
+def _host_arg(name: str) -> str:
+  host = (request.args.get("host") or "").strip()
+  if host and host != PRIMARY_HOST and "/" not in name:
+    return f"{host}/{name}"
+  return name
+
+def _for_each_host(fn, hosts=None):
+  hosts = [h for h in (hosts or _hosts) if h in _hosts]
+  start = time.time()
+  futures, results, errors = {}, {}, {}
+  for h in hosts:
+    pending = _hosts[h].get("pending")
+    if pending is not None and not pending[0].done() and start - pending[1] > _hosts[h]["timeout"]:
+      errors[h] = "previous call still pending"
+      continue
+    futures[h] = _hosts_pool.submit(fn, h)
+    if pending is None or pending[0].done():
+      _hosts[h]["pending"] = (futures[h], start)
+  for h, f in futures.items():
+    try:
+      results[h] = f.result(timeout=max(0.0, start + _hosts[h]["timeout"] - time.time()))
+      _hosts[h].update({"ok": True, "error": None})
+    except FutureTimeout:
+      errors[h] = f"timed out after {_hosts[h]['timeout']}s"
+    except Exception as e:
+      errors[h] = str(e)
+    if h in errors:
+      _hosts[h].update({"ok": False, "error": errors[h]})
+    _hosts[h].update({"ts": time.time(), "latency": round(time.time() - start, 3)})
+  return results, errors
+
+def _hosts_summary(errors=None) -> dict:
+  errors = errors or {}
+  return {h: {"url": e["url"], "ok": h not in errors and e["ok"] is not False, "error": errors.get(h) or e["error"],
+              "latency": e["latency"], "checked": e["ts"]} for h, e in _hosts.items()}
+
+_startup = {"at": {}, "errors": {}}
+
+def _startup_mark(subsystem: str):
+  if subsystem not in _startup["at"]:
+    _startup["at"][subsystem] = round(time.time() - _STARTED_AT, 3)
+    _startup["errors"].pop(subsystem, None)
+    logging.info("%s ready %.3fs after start", subsystem, _startup["at"][subsystem])
+
+_self_state = {"id": os.getenv("HOSTNAME") or None, "name": None, "resolved": False}
+
+def _self_name() -> Optional[str]:
+  if not _self_state["resolved"]:
+    try:
+      _self_state["name"] = client.containers.get(_self_state["id"]).name if _self_state["id"] else None
+      _self_state["resolved"] = True
+    except docker.errors.NotFound:
+      _self_state["resolved"] = True
+    except Exception as e:
+      _startup["errors"]["self"] = str(e)
+      return None
+    _startup_mark("self")
+  return _self_state["name"]
 
 _pull_cache = {}
 CACHE_TTL = 3600
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "300"))
+DIGEST_CACHE_MAX = max(1, int(os.getenv("DIGEST_CACHE_MAX", "2000")))
+DIGEST_CACHE_PATH = os.getenv("DIGEST_CACHE_PATH") or os.path.join(os.path.dirname(SETTINGS_PATH) or ".", "digest_cache.json")
+_pull_cache_state = {"loaded": False, "dirty": False}
+_pull_cache_save_lock = threading.Lock()
+
+def _load_pull_cache_from_disk():
+  _pull_cache_state["loaded"] = True
+  try:
+    if not os.path.isfile(DIGEST_CACHE_PATH):
+      return
+    with open(DIGEST_CACHE_PATH, "r", encoding="utf-8") as f:
+      data = json.load(f)
+    for ref, (digest, ts) in (data.get("e") or {}).items():
+      if ref not in _pull_cache:
+        _pull_cache[ref] = {"digest": digest, "ts": float(ts)}
+  except Exception as e:
+    logging.info("digest cache load failed: %s", e)
 
-try:
-  _INFO = client.info()
-  _LOCAL_OS = str(_INFO.get('OSType') or _INFO.get('OperatingSystem') or 'linux').lower()
-  _LOCAL_ARCH = str(_INFO.get('Architecture') or 'amd64').lower()
-except Exception:
-  _LOCAL_OS = 'linux'
-  _LOCAL_ARCH = 'amd64'
+def _pull_cache_fresh(entry: dict, now_ts: float) -> bool:
+  ttl = (entry.get("ttl") or CACHE_TTL) if entry.get("digest") else NEGATIVE_CACHE_TTL
+  return (now_ts - entry["ts"]) < ttl
+
+def _save_pull_cache_to_disk():
+  if not _pull_cache_state["dirty"]:
+    return False
+  with _pull_cache_save_lock:
+    _pull_cache_state["dirty"] = False
+    entries = sorted(list(_pull_cache.items()), key=lambda kv: kv[1]["ts"], reverse=True)
+    for ref, _ in entries[DIGEST_CACHE_MAX:]:
+      _pull_cache.pop(ref, None)
+    payload = {"v": 1, "e": {ref: [e["digest"], round(e["ts"], 1)] for ref, e in entries[:DIGEST_CACHE_MAX]}}
+    try:
+      import tempfile
+      dir_ = os.path.dirname(DIGEST_CACHE_PATH) or "."
+      os.makedirs(dir_, exist_ok=True)
+      with tempfile.NamedTemporaryFile("w", delete=False, dir=dir_, encoding="utf-8") as tmp:
+        json.dump(payload, tmp, separators=(",", ":")); tmp_path = tmp.name
+      os.replace(tmp_path, DIGEST_CACHE_PATH)
+      return True
+    except Exception as e:
+      logging.info("digest cache save failed: %s", e)
+      return False
 
 _ARCH_MAP = {'x86_64': 'amd64','aarch64': 'arm64','arm64/v8': 'arm64','arm64v8': 'arm64','armv7l': 'arm','armv7': 'arm','armv6l': 'arm'}
-_LOCAL_ARCH = _ARCH_MAP.get(_LOCAL_ARCH, _LOCAL_ARCH)
+_local_platform = {"os": "linux", "arch": "amd64", "detected": False}
 
-def _compute_unused_images():
+def _detect_platform():
+  info = client.info()
+  arch = str(info.get('Architecture') or 'amd64').lower()
+  _local_platform.update({"os": str(info.get('OSType') or info.get('OperatingSystem') or 'linux').lower(),
+                          "arch": _ARCH_MAP.get(arch, arch), "detected": True})
+  _startup_mark("platform")
+
+def startup_probe():
+  backoff = 0.5
+  while True:
+    try:
+      client.ping()
+      _startup_mark("docker")
+      if not _local_platform["detected"]:
+        _detect_platform()
+      _self_name()
+      if _self_state["resolved"]:
+        return
+    except Exception as e:
+      _startup["errors"]["docker" if "docker" not in _startup["at"] else "platform"] = str(e)
+      logging.info("docker not reachable yet: %s", e)
+    time.sleep(backoff)
+    backoff = min(backoff * 2, 30)
+
+INVENTORY_ENABLED = _truthy(os.getenv("INVENTORY_ENABLED", "true"))
+_CONTAINER_EVENTS = {"create", "start", "restart", "die", "stop", "pause", "unpause", "rename", "update", "health_status", "oom"}
+_inventory = {}
+_inventory_state = {"ready": False, "version": 0, "image_version": 0, "synced_at": None, "events": 0, "resyncs": 0}
+_inventory_lock = threading.Lock()
+_inventory_listeners = []
+
+def _inventory_notify(kind: str, action: str, ident: str):
+  for listener in list(_inventory_listeners):
+    try:
+      listener(kind, action, ident)
+    except Exception as e:
+      logging.info("inventory listener failed: %s", e)
+
+_inspect_pool = ThreadPoolExecutor(max_workers=DOCKER_POOL_SIZE, thread_name_prefix="inspect")
+
+def _containers_list(cli):
+  def _inspect(cid):
+    try:
+      return cli.containers.get(cid)
+    except docker.errors.NotFound:
+      return None
+  return [c for c in _inspect_pool.map(_inspect, [r["Id"] for r in cli.api.containers(all=True)]) if c is not None]
+
+def _inventory_resync():
+  containers = _containers_list(client)
+  with _inventory_lock:
+    _inventory.clear()
+    _inventory.update({c.id: c for c in containers})
+    _inventory_state["ready"] = True
+    _inventory_state["version"] += 1
+    _inventory_state["image_version"] += 1
+    _inventory_state["synced_at"] = time.time()
+    _inventory_state["resyncs"] += 1
+  _startup_mark("inventory")
+  _inventory_notify("container", "resync", "")
+
+def _wait_inventory(timeout: float = 30.0):
+  deadline = time.time() + timeout
+  while INVENTORY_ENABLED and not _inventory_state["ready"] and time.time() < deadline:
+    time.sleep(0.2)
+
+def _inventory_refresh_container(cid: str, action: str):
   try:
-    dangling_imgs = client.images.list(all=True, filters={"dangling": True})
-    items = []
-    for img in dangling_imgs:
-      try:
-        items.append({'id': img.id, 'tags': img.tags or []})
-      except Exception:
-        continue
+    c = None if action == "destroy" else client.containers.get(cid)
+  except docker.errors.NotFound:
+    c = None
+  with _inventory_lock:
+    if c is None:
+      _inventory.pop(cid, None)
+    else:
+      _inventory[c.id] = c
+    _inventory_state["version"] += 1
+
+def _inventory_apply_event(ev: dict):
+  kind = ev.get("Type") or ""
+  action = str(ev.get("Action") or ev.get("status") or "").split(":", 1)[0]
+  ident = ev.get("id") or (ev.get("Actor") or {}).get("ID") or ""
+  _inventory_state["events"] += 1
+  if kind == "container":
+    if action not in _CONTAINER_EVENTS and action != "destroy":
+      return
+    _inventory_refresh_container(ident, action)
+  elif kind == "image":
+    with _inventory_lock:
+      _inventory_state["version"] += 1
+      _inventory_state["image_version"] += 1
+  else:
+    return
+  _inventory_notify(kind, action, ident)
+
+def inventory_watcher():
+  backoff = 1
+  while True:
+    try:
+      since = int(time.time())
+      _inventory_resync()
+      for ev in client.events(decode=True, since=since, filters={"type": ["container", "image"]}):
+        _inventory_apply_event(ev)
+        backoff = 1
+    except Exception as e:
+      logging.info("inventory event stream lost: %s", e)
+    _inventory_state["ready"] = False
+    time.sleep(backoff)
+    backoff = min(backoff * 2, 30)
+
+def _list_containers(host: Optional[str] = None):
+  if host and host != PRIMARY_HOST:
+    cached = _host_lists.get(host)
+    if cached and time.time() - cached[0] < DOCKER_HOST_LIST_TTL:
+      return cached[1]
+    t0 = time.perf_counter()
+    containers = [_HostContainer(c, host) for c in _containers_list(_host_client(host))]
+    _perf_since("docker.list", t0)
+    _host_lists[host] = (time.time(), containers)
+    return containers
+  if INVENTORY_ENABLED and _inventory_state["ready"]:
+    with _inventory_lock:
+      return sorted(_inventory.values(), key=lambda c: c.name)
+  t0 = time.perf_counter()
+  containers = _containers_list(client)
+  _perf_since("docker.list", t0)
+  return containers
+
+def _list_all_containers(hosts=None):
+  t0 = time.perf_counter()
+  if len(_hosts) == 1:
+    containers, errors = _list_containers(), {}
+  else:
+    results, errors = _for_each_host(_list_containers, hosts)
+    containers = [c for h in _hosts if h in results for c in results[h]]
+  _perf_since("containers.list", t0)
+  return containers, errors
+
+def _get_container(name: str):
+  host, bare = _split_host(name)
+  if host != PRIMARY_HOST:
+    return _HostContainer(_host_client(host).containers.get(bare), host)
+  name = bare
+  if not (INVENTORY_ENABLED and _inventory_state["ready"]):
+    return client.containers.get(name)
+  with _inventory_lock:
+    containers = list(_inventory.values())
+  for c in containers:
+    if c.name == name or c.id == name:
+      return c
+  matches = [c for c in containers if name and c.id.startswith(name)]
+  if len(matches) == 1:
+    return matches[0]
+  raise docker.errors.NotFound(f"No such container: {name}")
+
+_IMAGE_TABLE_TTL = 2.0
+_image_table = {"rows": {}, "ts": 0.0, "version": None}
+_image_table_lock = threading.Lock()
+
+def _image_info(img_attrs: dict):
+  tags = [t for t in (img_attrs.get("RepoTags") or []) if t and t != "<none>:<none>"]
+  digests = [d for d in (img_attrs.get("RepoDigests") or []) if d and d != "<none>@<none>"]
+  image_ref = tags[0] if tags else None
+  if not image_ref and digests:
+    image_ref = f"{digests[0].split('@')[0]}:latest"
+  return {"tags": tags, "digests": digests, "image_ref": image_ref, "local_digests": _local_repo_digests({"RepoDigests": digests})}
+
+_host_image_tables = {}
+
+def _image_table_for(host: str) -> dict:
+  if host == PRIMARY_HOST:
+    return _image_table
+  return _host_image_tables.setdefault(host, {"rows": {}, "ts": 0.0, "version": None})
+
+def _image_rows(host: Optional[str] = None):
+  host = host or PRIMARY_HOST
+  table = _image_table_for(host)
+  now = time.time()
+  version = _inventory_state["image_version"] if (host == PRIMARY_HOST and INVENTORY_ENABLED and _inventory_state["ready"]) else None
+  with _image_table_lock:
+    if (version is not None and version == table["version"]) or (now - table["ts"] < _IMAGE_TABLE_TTL):
+      return table["rows"]
+    t0 = time.perf_counter()
+    rows = {img.get("Id"): _image_info(img) for img in _host_client(host).api.images(all=True)}
+    _perf_since("docker.images", t0)
+    table.update({"rows": rows, "ts": now, "version": version})
+    return rows
+
+def _image_meta_for(container):
+  image_id = (container.attrs or {}).get("Image") or ""
+  host = _host_of(container)
+  try:
+    info = _image_rows(host).get(image_id)
+  except Exception as e:
+    app.logger.info("image table refresh failed on %s: %s", host, e)
+    info = None
+  if info is None:
+    t0 = time.perf_counter()
+    info = _image_info(container.image.attrs or {})
+    _perf_since("docker.image_inspect", t0)
+    with _image_table_lock:
+      _image_table_for(host)["rows"][image_id] = info
+  return info
+
+_unused_last = {"count": None, "ts": None}
+
+DISK_USAGE_TTL = max(5, int(os.getenv("DISK_USAGE_TTL", "300")))
+_DISK_CONTAINER_EVENTS = {"create", "destroy", "start", "die", "stop", "resync"}
+_disk_cache = {}
+_disk_gen = {h: 0 for h in _hosts}
+_disk_locks = {h: threading.Lock() for h in _hosts}
+
+def _disk_invalidate(host: Optional[str] = None):
+  for h in ([host] if host else list(_hosts)):
+    _disk_gen[h] = _disk_gen.get(h, 0) + 1
+
+def _disk_fresh(host: str, entry) -> bool:
+  return bool(entry) and entry["gen"] == _disk_gen.get(host, 0) and time.time() - entry["ts"] < DISK_USAGE_TTL
+
+def _disk_on_inventory(kind: str, action: str, ident: str):
+  if kind == "image" or action in _DISK_CONTAINER_EVENTS:
+    _disk_invalidate(PRIMARY_HOST)
+
+_inventory_listeners.append(_disk_on_inventory)
+
+def _disk_summary(df: dict, host: str) -> dict:
+  extra = {} if host == PRIMARY_HOST else {"host": host}
+  images, dangling = [], []
+  for img in df.get("Images") or []:
+    size = img.get("Size") or 0
+    shared = max(0, img.get("SharedSize") or 0)
+    tags = [t for t in (img.get("RepoTags") or []) if t and t != "<none>:<none>"]
+    row = dict({"id": img.get("Id"), "tags": tags, "size": size, "shared": shared, "unique": max(0, size - shared),
+                "containers": max(0, img.get("Containers") or 0)}, **extra)
+    images.append(row)
+    if not tags and not row["containers"]:
+      dangling.append(row)
+  images.sort(key=lambda r: r["unique"], reverse=True)
+  unused = [r for r in images if not r["containers"]]
+  unique = sum(r["unique"] for r in images)
+  layers = df.get("LayersSize") or sum(r["size"] for r in images)
+  stopped = []
+  for c in df.get("Containers") or []:
+    if c.get("State") != "running":
+      name = ((c.get("Names") or ["/"])[0]).lstrip("/")
+      stopped.append(dict({"name": name if host == PRIMARY_HOST else f"{host}/{name}", "image": c.get("Image"), "size": c.get("SizeRw") or 0}, **extra))
+  cache = df.get("BuildCache") or []
+  cache_free = sum(b.get("Size") or 0 for b in cache if not b.get("InUse") and not b.get("Shared"))
+  out = {
+    "images": {"count": len(images), "size": layers, "unique": unique, "shared": max(0, layers - unique), "items": images,
+               "dangling": {"count": len(dangling), "reclaimable": sum(r["unique"] for r in dangling)},
+               "unused": {"count": len(unused), "reclaimable": sum(r["unique"] for r in unused)}},
+    "containers": {"count": len(df.get("Containers") or []), "stopped": len(stopped), "reclaimable": sum(c["size"] for c in stopped), "items": stopped},
+    "build_cache": {"count": len(cache), "size": sum(b.get("Size") or 0 for b in cache), "reclaimable": cache_free},
+  }
+  out["reclaimable"] = out["images"]["dangling"]["reclaimable"] + out["containers"]["reclaimable"] + cache_free
+  return out, dangling
+
+def _disk_usage(host: str) -> dict:
+  entry = _disk_cache.get(host)
+  if _disk_fresh(host, entry):
+    _perf_counters["disk_cache_hits"] += 1
+    return entry
+  with _disk_locks.setdefault(host, threading.Lock()):
+    entry = _disk_cache.get(host)
+    if _disk_fresh(host, entry):
+      _perf_counters["disk_cache_hits"] += 1
+      return entry
+    _perf_counters["disk_cache_misses"] += 1
+    gen = _disk_gen.get(host, 0)
+    t0 = time.perf_counter()
+    df = _host_client(host).api.df()
+    _perf_since("docker.df", t0)
+    summary, dangling = _disk_summary(df, host)
+    entry = _disk_cache[host] = {"summary": summary, "dangling": dangling, "gen": gen, "ts": time.time(), "seconds": round(time.perf_counter() - t0, 3)}
+    return entry
+
+def _disk_view(entry: dict) -> dict:
+  return dict(entry["summary"], ts=entry["ts"], age=round(time.time() - entry["ts"], 1), seconds=entry["seconds"])
+
+def _compute_unused_images(hosts=None):
+  try:
+    results, errors = _for_each_host(_disk_usage, hosts) if len(_hosts) > 1 else ({PRIMARY_HOST: _disk_usage(PRIMARY_HOST)}, {})
+    for h, err in errors.items():
+      app.logger.info('unused(dangling) compute failed on %s: %s', h, err)
+    items = [dict({"id": item["id"], "tags": item["tags"], "size": item["unique"]}, **({"host": h} if h != PRIMARY_HOST else {}))
+             for h in _hosts if h in results for item in results[h]["dangling"]]
+    _unused_last.update({"count": len(items), "ts": time.time(), "errors": errors,
+                         "reclaimable": sum(results[h]["summary"]["images"]["dangling"]["reclaimable"] for h in results)})
     return len(items), items
   except Exception as e:
     app.logger.info('unused(dangling) compute failed: %s', e)
@@ -125,129 +589,420 @@ def _compute_unused_images():
 def images_unused():
   if not _check_auth():
     return jsonify({'error': 'unauthorized'}), 401
-  count, items = _compute_unused_images()
-  return jsonify({'count': count, 'items': items})
+  host = (request.args.get("host") or "").strip()
+  if host and host not in _hosts:
+    return jsonify({'error': f'unknown host {host}'}), 404
+  count, items = _compute_unused_images([host] if host else None)
+  reclaimable = _unused_last.get("reclaimable")
+  if len(_hosts) > 1:
+    return jsonify({'count': count, 'items': items, 'reclaimable': reclaimable, 'hosts': _hosts_summary(_unused_last.get("errors"))})
+  return jsonify({'count': count, 'items': items, 'reclaimable': reclaimable})
+
+@app.get('/disk')
+def disk_usage():
+  if not _check_auth():
+    return jsonify({'error': 'unauthorized'}), 401
+  host = (request.args.get("host") or "").strip()
+  if host and host not in _hosts:
+    return jsonify({'error': f'unknown host {host}'}), 404
+  if request.args.get("force", "").lower() in ("1","true","yes"):
+    _disk_invalidate(host or None)
+  if len(_hosts) == 1 or host:
+    try:
+      return jsonify(_disk_view(_disk_usage(host or PRIMARY_HOST)))
+    except Exception as e:
+      return jsonify({'error': str(e)}), 500
+  results, errors = _for_each_host(_disk_usage)
+  return jsonify({
+    'reclaimable': sum(e["summary"]["reclaimable"] for e in results.values()),
+    'disks': {h: _disk_view(e) for h, e in results.items()},
+    'hosts': _hosts_summary(errors),
+  })
 
 @app.post('/images/prune')
 def images_prune():
   if not _check_auth():
     return jsonify({'error': 'unauthorized'}), 401
-  try:
-    result = client.images.prune({'dangling': True})
-    return jsonify(result or {})
-  except Exception as e:
-    return jsonify({'error': str(e)}), 500
+  host = (request.args.get("host") or "").strip()
+  if host and host not in _hosts:
+    return jsonify({'error': f'unknown host {host}'}), 404
+  _disk_invalidate(host or None)
+  if len(_hosts) == 1 or host == PRIMARY_HOST:
+    try:
+      result = client.images.prune({'dangling': True})
+      return jsonify(result or {})
+    except Exception as e:
+      return jsonify({'error': str(e)}), 500
+  results, errors = _for_each_host(lambda h: _host_client(h).images.prune({'dangling': True}) or {}, [host] if host else None)
+  return jsonify({
+    'ImagesDeleted': [dict(d, host=h) for h, r in results.items() for d in (r.get('ImagesDeleted') or [])],
+    'SpaceReclaimed': sum(r.get('SpaceReclaimed') or 0 for r in results.values()),
+    'hosts': {h: {'ok': h in results, 'error': errors.get(h), 'SpaceReclaimed': (results.get(h) or {}).get('SpaceReclaimed')} for h in set(results) | set(errors)},
+  })
 
-def get_remote_digest(image: str) -> Optional[str]:
-  ACCEPTS = [
-    "application/vnd.oci.image.index.v1+json",
-    "application/vnd.docker.distribution.manifest.list.v2+json",
-    "application/vnd.oci.image.manifest.v1+json",
-    "application/vnd.docker.distribution.manifest.v2+json",
-  ]
-  def _split_repo_tag(ref: str):
-    if ":" in ref and "/" in ref.split(":")[0]: repo, tag = ref.rsplit(":", 1)
-    elif ":" in ref and "/" not in ref: repo, tag = ref.split(":", 1)
-    else: repo, tag = ref, "latest"
-    return repo, tag
-  def _resolve_registry_and_path(repo: str):
-    if repo.startswith("lscr.io/"): return "lscr.io", repo[len("lscr.io/"):]
-    if "/" not in repo: return "registry-1.docker.io", f"library/{repo}"
-    parts = repo.split("/", 1)
-    if "." in parts[0] or ":" in parts[0]: return parts[0], parts[1]
-    return "registry-1.docker.io", repo
-  def _parse_www_authenticate(header_val: str):
-    scheme, _, params = header_val.partition(" ")
-    if scheme.lower() != "bearer": return None
-    d = {}
-    for part in params.split(","):
-      if "=" in part:
-        k, v = part.split("=", 1)
-        d[k.strip()] = v.strip().strip('"')
-    return d
-  def _head_or_get(url: str, token: Optional[str]):
-    for acc in ACCEPTS:
-      headers = {"Accept": acc}
-      if token: headers["Authorization"] = f"Bearer {token}"
-      try:
-        req = urllib.request.Request(url, headers=headers); req.get_method = lambda: "HEAD"
-        with urllib.request.urlopen(req, timeout=12) as resp:
-          d = resp.headers.get("Docker-Content-Digest")
-          if d: return d, None
-      except HTTPError as he:
-        if he.code in (401, 404): return None, he.code
-      except Exception:
-        pass
-      try:
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=12) as resp:
-          d = resp.headers.get("Docker-Content-Digest")
-          if d: return d, None
-      except HTTPError as he:
-        if he.code in (401, 404): return None, he.code
-      except Exception:
-        pass
-    return None, None
-  def _fetch_with_optional_auth(url: str, registry_hint: str):
-    try:
-      d, code = _head_or_get(url, None)
-      if d or (code and code != 401): return d, code
-    except HTTPError as e:
-      if e.code != 401: return None, e.code
-    except Exception:
-      return None, None
-    try:
-      req = urllib.request.Request(url, headers={"Accept": ACCEPTS[0]})
-      with urllib.request.urlopen(req, timeout=12) as resp:
-        return resp.headers.get("Docker-Content-Digest"), None
-    except HTTPError as e:
-      if e.code != 401: return None, e.code
-      www = e.headers.get("WWW-Authenticate")
-      if not www: return None, 401
-      info = _parse_www_authenticate(www)
-      if not info or not info.get("realm"): return None, 401
-      realm = info["realm"]; qp = {}
-      if info.get("service"): qp["service"] = info["service"]
-      if info.get("scope"): qp["scope"] = info["scope"]
-      token_url = realm + ("?" + _urlparse.urlencode(qp) if qp else "")
-      try:
-        with urllib.request.urlopen(token_url, timeout=12) as tr:
-          payload = json.loads(tr.read().decode("utf-8", errors="ignore") or "{}")
-          token = payload.get("token") or payload.get("access_token")
-          if not token: return None, 401
-      except Exception:
-        return None, 401
-      return _head_or_get(url, token)
+def _split_repo_tag(ref: str):
+  ref = ref.split("@", 1)[0]
+  if ref.rfind(":") > ref.rfind("/"): repo, tag = ref.rsplit(":", 1)
+  else: repo, tag = ref, "latest"
+  return repo, tag
+
+def _resolve_registry_and_path(repo: str):
+  if repo.startswith("lscr.io/"): return "lscr.io", repo[len("lscr.io/"):]
+  if "/" not in repo: return "registry-1.docker.io", f"library/{repo}"
+  parts = repo.split("/", 1)
+  if "." in parts[0] or ":" in parts[0]: return parts[0], parts[1]
+  return "registry-1.docker.io", repo
+
+_REGISTRY_ACCEPT = ", ".join([
+  "application/vnd.oci.image.index.v1+json",
+  "application/vnd.docker.distribution.manifest.list.v2+json",
+  "application/vnd.oci.image.manifest.v1+json",
+  "application/vnd.docker.distribution.manifest.v2+json",
+])
+_REGISTRY_TIMEOUT = 12
+_REGISTRY_IDLE_PER_HOST = 4
+_registry_conns = {}
+_registry_conns_lock = threading.Lock()
+_registry_tokens = {}
+_registry_challenges = {}
+_registry_counters = {"lookups": 0, "requests": 0, "token_fetches": 0, "token_hits": 0, "reconnects": 0}
+
+def _registry_conn_get(scheme: str, host: str):
+  with _registry_conns_lock:
+    idle = _registry_conns.get((scheme, host))
+    if idle:
+      return idle.pop(), True
+  cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+  return cls(host, timeout=_REGISTRY_TIMEOUT), False
+
+def _registry_conn_put(scheme: str, host: str, conn):
+  with _registry_conns_lock:
+    idle = _registry_conns.setdefault((scheme, host), [])
+    if len(idle) < _REGISTRY_IDLE_PER_HOST:
+      idle.append(conn); return
+  conn.close()
+
+REGISTRY_HOURLY_BUDGET = max(0, int(os.getenv("REGISTRY_HOURLY_BUDGET", "0")))
+REFRESH_RESERVE = max(0, int(os.getenv("REFRESH_RESERVE", "10")))
+_registry_limits = {}
+_registry_usage = {}
+_registry_limits_lock = threading.Lock()
+
+def _registry_note_limits(netloc: str, status: int, headers):
+  remaining, limit = headers.get("RateLimit-Remaining"), headers.get("RateLimit-Limit")
+  if not remaining and status != 429:
+    return
+  now = time.time()
+  with _registry_limits_lock:
+    lim = _registry_limits.setdefault(netloc, {"limit": None, "remaining": None, "window": None, "blocked_until": 0.0, "throttled": 0, "ts": None})
+    lim["ts"] = now
+    try:
+      if remaining:
+        value, _, opts = remaining.partition(";")
+        lim["remaining"] = int(value)
+        m = re.search(r"w=(\d+)", opts)
+        if m: lim["window"] = int(m.group(1))
+      if limit:
+        lim["limit"] = int(limit.partition(";")[0])
+    except ValueError:
+      pass
+    if status == 429:
+      retry = headers.get("Retry-After")
+      lim["blocked_until"] = now + (int(retry) if retry and retry.isdigit() else 60)
+      lim["remaining"] = 0
+      lim["throttled"] += 1
+
+def _registry_spend(registry: str, requests: int):
+  if requests <= 0:
+    return
+  with _registry_limits_lock:
+    usage = _registry_usage.setdefault(registry, deque())
+    usage.append((time.time(), requests))
+
+def _registry_budget_left(registry: str) -> Optional[int]:
+  if not REGISTRY_HOURLY_BUDGET:
+    return None
+  cutoff = time.time() - 3600
+  with _registry_limits_lock:
+    usage = _registry_usage.setdefault(registry, deque())
+    while usage and usage[0][0] < cutoff:
+      usage.popleft()
+    return REGISTRY_HOURLY_BUDGET - sum(n for _, n in usage)
+
+def _registry_available(registry: str, reserve: int = 0):
+  now = time.time()
+  with _registry_limits_lock:
+    lim = dict(_registry_limits.get(registry) or {})
+  if lim.get("blocked_until", 0) > now:
+    return False, lim["blocked_until"]
+  if lim.get("remaining") is not None and lim["remaining"] <= reserve and lim.get("ts") and now - lim["ts"] < 900:
+    return False, lim["ts"] + 900
+  left = _registry_budget_left(registry)
+  if left is not None and left <= 0:
+    with _registry_limits_lock:
+      usage = _registry_usage.get(registry)
+      oldest = usage[0][0] if usage else now
+    return False, oldest + 3600
+  return True, now
+
+def _registry_request(method: str, url: str, headers: dict, counter: list, redirects: int = 3):
+  parts = _urlparse.urlsplit(url)
+  path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+  for attempt in (0, 1):
+    conn, reused = _registry_conn_get(parts.scheme, parts.netloc)
+    try:
+      conn.request(method, path, headers=headers)
+      resp = conn.getresponse()
+      body = resp.read()
+    except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError, BrokenPipeError):
+      conn.close()
+      if reused and attempt == 0:
+        _registry_counters["reconnects"] += 1
+        continue
+      raise
     except Exception:
-      return None, None
+      conn.close()
+      raise
+    counter[0] += 1
+    _registry_counters["requests"] += 1
+    _registry_note_limits(parts.netloc, resp.status, resp.headers)
+    if resp.will_close:
+      conn.close()
+    else:
+      _registry_conn_put(parts.scheme, parts.netloc, conn)
+    location = resp.headers.get("Location")
+    if resp.status in (301, 302, 303, 307, 308) and location and redirects > 0:
+      target = _urlparse.urljoin(url, location)
+      fwd = dict(headers)
+      if _urlparse.urlsplit(target).netloc != parts.netloc:
+        fwd.pop("Authorization", None)
+      return _registry_request(method, target, fwd, counter, redirects - 1)
+    return resp.status, resp.headers, body
+
+def _parse_www_authenticate(header_val: str):
+  scheme, _, params = (header_val or "").partition(" ")
+  if scheme.lower() != "bearer": return None
+  return {k: v for k, v in re.findall(r'(\w+)="([^"]*)"', params)}
+
+def _registry_token(challenge: tuple, counter: list, *, refresh: bool = False):
+  now = time.time()
+  cached = _registry_tokens.get(challenge)
+  if cached and not refresh and cached[1] > now:
+    _registry_counters["token_hits"] += 1
+    return cached[0]
+  realm, service, scope = challenge
+  qp = {}
+  if service: qp["service"] = service
+  if scope: qp["scope"] = scope
+  token_url = realm + (("&" if "?" in realm else "?") + _urlparse.urlencode(qp) if qp else "")
+  try:
+    status, _, body = _registry_request("GET", token_url, {"Accept": "application/json"}, counter)
+    _registry_counters["token_fetches"] += 1
+    if status != 200: return None
+    payload = json.loads(body.decode("utf-8", errors="ignore") or "{}")
+  except Exception:
+    return None
+  token = payload.get("token") or payload.get("access_token")
+  if not token: return None
+  try:
+    ttl = int(payload.get("expires_in") or 60)
+  except Exception:
+    ttl = 60
+  _registry_tokens[challenge] = (token, now + max(ttl - 10, 5))
+  return token
+
+def _registry_scheme(registry: str) -> str:
+  host = registry.split(":", 1)[0]
+  return "http" if host in ("localhost", "127.0.0.1") else "https"
+
+def _fetch_manifest_digest(registry: str, repo_path: str, tag: str, counter: list):
+  url = f"{_registry_scheme(registry)}://{registry}/v2/{repo_path}/manifests/{tag}"
+  headers = {"Accept": _REGISTRY_ACCEPT}
+  challenge = _registry_challenges.get((registry, repo_path))
+  token = _registry_token(challenge, counter) if challenge else None
+  if token: headers["Authorization"] = f"Bearer {token}"
+  status, resp_headers, _ = _registry_request("HEAD", url, headers, counter)
+  if status == 401:
+    info = _parse_www_authenticate(resp_headers.get("WWW-Authenticate"))
+    if not info or not info.get("realm"): return None, 401
+    challenge = (info["realm"], info.get("service") or "", info.get("scope") or f"repository:{repo_path}:pull")
+    _registry_challenges[(registry, repo_path)] = challenge
+    token = _registry_token(challenge, counter, refresh=bool(token))
+    if not token: return None, 401
+    headers["Authorization"] = f"Bearer {token}"
+    status, resp_headers, _ = _registry_request("HEAD", url, headers, counter)
+  if status == 200 and resp_headers.get("Docker-Content-Digest"):
+    return resp_headers.get("Docker-Content-Digest"), None
+  if status in (401, 404, 429): return None, status
+  status, resp_headers, body = _registry_request("GET", url, headers, counter)
+  if status == 200:
+    return resp_headers.get("Docker-Content-Digest") or ("sha256:" + hashlib.sha256(body).hexdigest()), None
+  return None, status
+
+def _get_remote_digest_counted(image: str):
+  counter = [0]
+  _registry_counters["lookups"] += 1
   try:
     repo, tag = _split_repo_tag(image)
     registry, repo_path = _resolve_registry_and_path(repo)
-    url = f"https://{registry}/v2/{repo_path}/manifests/{tag}"
-    digest, code = _fetch_with_optional_auth(url, registry)
-    if digest: return digest
+    def lookup(registry: str):
+      if _registry_limits.get(registry, {}).get("blocked_until", 0) > time.time():
+        app.logger.info("registry %s is rate limited, skipping lookup of %s", registry, image)
+        return None, None
+      t0, before = time.perf_counter(), counter[0]
+      try:
+        result = _fetch_manifest_digest(registry, repo_path, tag, counter)
+      finally:
+        _registry_spend(registry, counter[0] - before)
+      _perf_since(registry, t0, "registries")
+      return result
+    digest, code = lookup(registry)
     if (not digest) and code == 404 and registry == "lscr.io" and repo_path.startswith("linuxserver/"):
-      gh_url = f"https://ghcr.io/v2/{repo_path}/manifests/{tag}"
-      gd, _ = _fetch_with_optional_auth(gh_url, "ghcr.io")
-      if gd: return gd
-    return None
+      digest, _ = lookup("ghcr.io")
+    return digest, counter[0]
+  except Exception as e:
+    app.logger.info("registry lookup failed for %s: %s", image, e)
+    return None, counter[0]
+
+def get_remote_digest(image: str) -> Optional[str]:
+  return _get_remote_digest_counted(image)[0]
+
+REGISTRY_WORKERS = max(1, int(os.getenv("REGISTRY_WORKERS", "16")))
+REGISTRY_CONCURRENCY = max(1, int(os.getenv("REGISTRY_CONCURRENCY", "8")))
+_registry_pool = ThreadPoolExecutor(max_workers=REGISTRY_WORKERS, thread_name_prefix="registry")
+_registry_slots = {}
+_digest_inflight = {}
+_digest_lock = threading.Lock()
+
+def _registry_for_ref(image_ref: str) -> str:
+  try:
+    return _resolve_registry_and_path(_split_repo_tag(image_ref)[0])[0]
   except Exception:
-    return None
+    return ""
+
+def _ensure_pull_cache_loaded():
+  with _digest_lock:
+    if not _pull_cache_state["loaded"]:
+      _load_pull_cache_from_disk()
 
-def fetch_remote_digest_cached(image_ref: str, *, force: bool = False, now_ts: Optional[float] = None):
-  global _pull_cache
+def _registry_slot(registry: str):
+  with _digest_lock:
+    sem = _registry_slots.get(registry)
+    if sem is None:
+      sem = _registry_slots[registry] = threading.BoundedSemaphore(REGISTRY_CONCURRENCY)
+  return sem
+
+def fetch_remote_digest_cached(image_ref: str, *, force: bool = False, now_ts: Optional[float] = None,
+                               ttl: Optional[float] = None, keep_on_error: bool = False):
   now_ts = now_ts or time.time()
-  if (not force) and image_ref in _pull_cache and (now_ts - _pull_cache[image_ref]["ts"] < CACHE_TTL):
-    return _pull_cache[image_ref]["digest"]
-  digest = get_remote_digest(image_ref)
-  _pull_cache[image_ref] = {"digest": digest, "ts": now_ts}
-  return digest
+  with _digest_lock:
+    if not _pull_cache_state["loaded"]:
+      _load_pull_cache_from_disk()
+    entry = _pull_cache.get(image_ref)
+    if (not force) and entry and _pull_cache_fresh(entry, now_ts):
+      _perf_counters["pull_cache_hits"] += 1
+      return entry["digest"]
+    if (not force) and entry and entry.get("digest") and not _registry_available(_registry_for_ref(image_ref))[0]:
+      _perf_counters["pull_cache_hits"] += 1
+      return entry["digest"]
+    _perf_counters["pull_cache_misses"] += 1
+    call = _digest_inflight.get(image_ref)
+    owner = call is None
+    if owner:
+      call = _digest_inflight[image_ref] = {"done": threading.Event(), "digest": None}
+  if not owner:
+    call["done"].wait()
+    return call["digest"]
+  try:
+    t0 = time.perf_counter()
+    with _registry_slot(_registry_for_ref(image_ref)):
+      call["digest"], requests_made = _get_remote_digest_counted(image_ref)
+    _perf_since("registry.lookup", t0)
+    if call["digest"] or not (keep_on_error and entry and entry.get("digest")):
+      _pull_cache[image_ref] = {"digest": call["digest"], "ts": time.time(), "requests": requests_made, "ttl": ttl or (entry or {}).get("ttl")}
+      _pull_cache_state["dirty"] = True
+    else:
+      call["digest"] = entry["digest"]
+  finally:
+    with _digest_lock:
+      _digest_inflight.pop(image_ref, None)
+    call["done"].set()
+  return call["digest"]
+
+def resolve_remote_digests(image_refs, *, force: bool = False):
+  refs = sorted({r for r in image_refs if r})
+  now_ts = time.time()
+  futures = {ref: _registry_pool.submit(fetch_remote_digest_cached, ref, force=force, now_ts=now_ts) for ref in refs}
+  out = {}
+  for ref, f in futures.items():
+    try:
+      out[ref] = f.result()
+    except Exception as e:
+      app.logger.info("digest lookup failed for %s: %s", ref, e)
+      out[ref] = None
+  _save_pull_cache_to_disk()
+  return out
 
 @app.before_request
 def limit_remote_addr():
   if not _is_ip_allowed(request.remote_addr or ""):
     abort(403)
 
+def _parse_endpoint_limits(raw: str) -> dict:
+  limits = {}
+  for part in (raw or "").split(","):
+    group, _, n = part.strip().partition("=")
+    try:
+      if group.strip() and int(n) > 0:
+        limits[group.strip()] = int(n)
+    except ValueError:
+      logging.warning("ignoring invalid ENDPOINT_LIMITS entry: %r", part)
+  return limits
+
+SERVER_MODE = os.getenv("SERVER_MODE", "development").strip().lower()
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", "32")))
+SERVER_QUEUE = max(1, int(os.getenv("SERVER_QUEUE", "64")))
+ENDPOINT_WAIT = max(0.0, float(os.getenv("ENDPOINT_WAIT", "1")))
+ENDPOINT_LIMITS = _parse_endpoint_limits(os.getenv("ENDPOINT_LIMITS", "status=4,update=2,metrics=8,stream=8,images=2,diag=2"))
+_ENDPOINT_GROUPS = {
+  "docker_status": "status", "docker_status_one": "status",
+  "update_container": "update", "update_containers": "update",
+  "metrics_prometheus": "metrics", "metrics_one": "metrics", "metrics_history": "metrics",
+  "events_stream": "stream", "job_stream": "stream",
+  "images_unused": "images", "images_prune": "images", "disk_usage": "images",
+  "diag": "diag",
+}
+_endpoint_slots = {group: threading.BoundedSemaphore(n) for group, n in ENDPOINT_LIMITS.items()}
+_server_counters = {"queued": 0, "rejected_queue": 0, "rejected_endpoint": 0}
+
+@app.before_request
+def limit_endpoint_concurrency():
+  if SERVER_MODE != "production":
+    return
+  group = _ENDPOINT_GROUPS.get(request.endpoint)
+  slot = _endpoint_slots.get(group)
+  if slot is None:
+    return
+  if not slot.acquire(timeout=ENDPOINT_WAIT):
+    _server_counters["rejected_endpoint"] += 1
+    resp = jsonify({"error": "busy", "endpoint": group})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "1"
+    return resp
+  g.endpoint_slot = slot
+
+@app.after_request
+def hold_endpoint_slot_while_streaming(resp):
+  if resp.is_streamed and "endpoint_slot" in g:
+    resp.call_on_close(g.pop("endpoint_slot").release)
+  return resp
+
+@app.teardown_request
+def release_endpoint_slot(exc=None):
+  slot = g.pop("endpoint_slot", None)
+  if slot is not None:
+    slot.release()
+
 @app.get('/settings')
 def get_settings():
   return jsonify({
@@ -279,14 +1034,33 @@ def post_settings():
   _save_settings_to_disk({"auth_enabled": AUTH_ENABLED, "api_key": CURRENT_API_KEY, "allowed_cidrs": ALLOWED_CIDRS})
   return jsonify({'ok': True, 'auth_enabled': AUTH_ENABLED, 'api_key': CURRENT_API_KEY, 'allowed_cidrs': ALLOWED_CIDRS})
 
+@app.before_request
+def mark_first_request():
+  if "http" not in _startup["at"]:
+    _startup_mark("http")
+
+@app.get("/ready")
+def ready():
+  if not _check_auth():
+    return jsonify({"ready": False, "error": "unauthorized"}), 401
+  at, errors = dict(_startup["at"]), dict(_startup["errors"])
+  required = ["docker"] + (["inventory"] if INVENTORY_ENABLED else [])
+  optional = ["platform", "self", "digests"] + (["stats"] if (STATS_STREAM_ENABLED and STATS_STREAM_MAX) or _cgroup_version else []) + (["mqtt"] if MQTT_HOST else [])
+  subsystems = {name: {"ready": name in at, "at": at.get(name), "error": errors.get(name), "required": name in required}
+                for name in ["http"] + required + optional}
+  ok = all(name in at for name in required)
+  return jsonify({"ready": ok, "uptime": round(time.time() - _STARTED_AT, 3), "subsystems": subsystems}), 200 if ok else 503
+
 @app.get("/health")
 def health():
   if not _check_auth():
     return jsonify({"ok": False, "error": "unauthorized"}), 401
   try:
-    names = [c.name for c in client.containers.list(all=True)]
+    names = [c.name for c in _list_containers()]
   except Exception as e:
     return jsonify({"ok": False, "error": str(e)}), 500
+  if len(_hosts) > 1:
+    return jsonify({"ok": True, "containers": names, "hosts": _hosts_summary()})
   return jsonify({"ok": True, "containers": names})
 
 def _digest_only(value: Optional[str]):
@@ -308,62 +1082,78 @@ def _local_repo_digests(img_attrs):
     pass
   return digs
 
-def _compute_stats(container):
-  meta = {"state": None, "image": None, "cpu": None, "mem_usage": None, "mem_limit": None, "mem_perc": None,
+def _blank_stats_meta():
+  return {"state": None, "image": None, "cpu": None, "mem_usage": None, "mem_limit": None, "mem_perc": None,
           "net_rx": None, "net_tx": None, "blk_read": None, "blk_write": None}
+
+def _parse_stats_sample(stats, meta):
+  try:
+    cpu_stats = stats.get("cpu_stats", {}); precpu = stats.get("precpu_stats", {})
+    cpu_delta = (cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0))
+    system_delta = (cpu_stats.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0))
+    online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage", []) or []) or 1
+    if cpu_delta > 0 and system_delta > 0:
+      meta["cpu"] = (cpu_delta / system_delta) * online_cpus * 100.0
+  except Exception:
+    pass
+  try:
+    mem = stats.get("memory_stats", {}) or {}
+    usage = mem.get("usage") or 0; limit = mem.get("limit") or 0
+    meta["mem_usage"] = usage; meta["mem_limit"] = limit
+    if limit: meta["mem_perc"] = (usage / limit) * 100.0
+  except Exception:
+    pass
+  try:
+    rx = tx = 0
+    networks = stats.get("networks", {}) or {}
+    for vals in networks.values():
+      rx += int(vals.get("rx_bytes", 0) or 0)
+      tx += int(vals.get("tx_bytes", 0) or 0)
+    meta["net_rx"] = rx; meta["net_tx"] = tx
+  except Exception:
+    pass
+  try:
+    reads = writes = 0
+    blk = stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []
+    for item in blk:
+      op = (item.get("op") or "").lower(); val = int(item.get("value") or 0)
+      if op == "read": reads += val
+      elif op == "write": writes += val
+    meta["blk_read"] = reads; meta["blk_write"] = writes
+  except Exception:
+    pass
+  return meta
+
+def _compute_stats(container):
+  meta = _blank_stats_meta()
   try:
     try:
       meta["state"] = container.status or container.attrs.get("State", {}).get("Status")
     except Exception:
       meta["state"] = None
     try:
-      img_attrs = container.image.attrs or {}
-      repo_tags = img_attrs.get("RepoTags") or container.image.tags or []
-      if repo_tags:
-        meta["image"] = repo_tags[0]
-      else:
-        repo_digests = img_attrs.get("RepoDigests") or []
-        if repo_digests:
-          repo = repo_digests[0].split("@")[0]
-          meta["image"] = f"{repo}:latest"
+      meta["image"] = _image_meta_for(container)["image_ref"]
     except Exception:
       pass
+    live = _live_stats(container)
+    if live is not None:
+      _perf_counters["stats_live_hits"] += 1
+      meta.update(live)
+      return meta
+    dirs = _cgroup_dirs(container) if meta["state"] == "running" else None
+    if dirs:
+      t0 = time.perf_counter()
+      sample = _cgroup_read(container, dirs)
+      _perf_since("cgroup.read", t0)
+      if sample is not None:
+        meta.update(sample)
+        _history_record(container.name, meta)
+        return meta
+    t0 = time.perf_counter()
     stats = container.stats(stream=False)
-    try:
-      cpu_stats = stats.get("cpu_stats", {}); precpu = stats.get("precpu_stats", {})
-      cpu_delta = (cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu.get("cpu_usage", {}).get("total_usage", 0))
-      system_delta = (cpu_stats.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0))
-      online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage", []) or []) or 1
-      if cpu_delta > 0 and system_delta > 0:
-        meta["cpu"] = (cpu_delta / system_delta) * online_cpus * 100.0
-    except Exception:
-      pass
-    try:
-      mem = stats.get("memory_stats", {}) or {}
-      usage = mem.get("usage") or 0; limit = mem.get("limit") or 0
-      meta["mem_usage"] = usage; meta["mem_limit"] = limit
-      if limit: meta["mem_perc"] = (usage / limit) * 100.0
-    except Exception:
-      pass
-    try:
-      rx = tx = 0
-      networks = stats.get("networks", {}) or {}
-      for vals in networks.values():
-        rx += int(vals.get("rx_bytes", 0) or 0)
-        tx += int(vals.get("tx_bytes", 0) or 0)
-      meta["net_rx"] = rx; meta["net_tx"] = tx
-    except Exception:
-      pass
-    try:
-      reads = writes = 0
-      blk = stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []
-      for item in blk:
-        op = (item.get("op") or "").lower(); val = int(item.get("value") or 0)
-        if op == "read": reads += val
-        elif op == "write": writes += val
-      meta["blk_read"] = reads; meta["blk_write"] = writes
-    except Exception:
-      pass
+    _perf_since("docker.stats", t0)
+    _parse_stats_sample(stats, meta)
+    _history_record(container.name, meta)
   except Exception:
     pass
   return meta
@@ -375,15 +1165,7 @@ def _compute_light_meta(container):
   except Exception:
     pass
   try:
-    img_attrs = container.image.attrs or {}
-    repo_tags = img_attrs.get("RepoTags") or container.image.tags or []
-    if repo_tags:
-      m["image"] = repo_tags[0]
-    else:
-      repo_digests = img_attrs.get("RepoDigests") or []
-      if repo_digests:
-        repo = repo_digests[0].split("@")[0]
-        m["image"] = f"{repo}:latest"
+    m["image"] = _image_meta_for(container)["image_ref"]
   except Exception:
     pass
   return m
@@ -396,72 +1178,578 @@ def _compute_stats_cached(container):
   key = container.name
   cached = _stats_cache.get(key)
   if cached and (now - cached["ts"] < _STATS_TTL):
+    _perf_counters["stats_cache_hits"] += 1
     return cached["meta"]
+  _perf_counters["stats_cache_misses"] += 1
   meta = _compute_stats(container)
   _stats_cache[key] = {"ts": now, "meta": meta}
   return meta
 
-def check_updates_for_containers(containers, *, force: bool = False):
-  updates, meta = {}, {}
-  now_ts = time.time()
+def _parse_history_levels(spec: str):
+  levels = []
+  for part in spec.split(","):
+    try:
+      step, slots = (int(x) for x in part.split(":", 1))
+      if step > 0 and slots > 0:
+        levels.append((step, slots))
+    except Exception:
+      continue
+  return sorted(levels) or [(10, 60), (300, 288), (21600, 120)]
+
+HISTORY_ENABLED = _truthy(os.getenv("HISTORY_ENABLED", "true"))
+HISTORY_LEVELS = _parse_history_levels(os.getenv("HISTORY_LEVELS", "10:60,300:288,21600:120"))
+_HISTORY_METRICS = ("cpu", "mem", "net", "blk")
+_history = {}
+_history_prev = {}
+_history_lock = threading.Lock()
+
+def _history_new():
+  levels = []
+  for step, slots in HISTORY_LEVELS:
+    lv = {"step": step, "slots": slots, "bucket": array("I", [0]) * slots, "count": array("H", [0]) * slots}
+    for m in _HISTORY_METRICS:
+      lv[m] = (array("f", [0.0]) * slots, array("f", [0.0]) * slots, array("f", [0.0]) * slots)
+    levels.append(lv)
+  return levels
+
+def _history_bytes_per_container() -> int:
+  return sum(slots * (4 + 2 + len(_HISTORY_METRICS) * 3 * 4) for _, slots in HISTORY_LEVELS)
+
+def _history_record(name: str, meta: dict, ts: Optional[float] = None):
+  if not HISTORY_ENABLED or meta.get("mem_usage") is None:
+    return
+  ts = ts or time.time()
+  net = (meta.get("net_rx") or 0) + (meta.get("net_tx") or 0)
+  blk = (meta.get("blk_read") or 0) + (meta.get("blk_write") or 0)
+  with _history_lock:
+    prev = _history_prev.get(name)
+    _history_prev[name] = (ts, net, blk)
+    if not prev or ts <= prev[0]:
+      return
+    dt = ts - prev[0]
+    values = {"cpu": float(meta.get("cpu") or 0.0), "mem": float(meta.get("mem_usage") or 0),
+              "net": max(0.0, (net - prev[1]) / dt), "blk": max(0.0, (blk - prev[2]) / dt)}
+    levels = _history.get(name)
+    if levels is None:
+      levels = _history[name] = _history_new()
+    for lv in levels:
+      bucket = int(ts // lv["step"]); i = bucket % lv["slots"]
+      if lv["bucket"][i] != bucket:
+        lv["bucket"][i] = bucket; lv["count"][i] = 0
+      n = lv["count"][i] = min(lv["count"][i] + 1, 65535)
+      for m, v in values.items():
+        lo, avg, hi = lv[m]
+        if n == 1:
+          lo[i] = avg[i] = hi[i] = v
+        else:
+          lo[i] = min(lo[i], v); hi[i] = max(hi[i], v); avg[i] += (v - avg[i]) / n
+
+def _history_prune(known_names, max_idle: float = 3600.0):
+  now = time.time()
+  with _history_lock:
+    for name in list(_history_prev):
+      if name not in known_names and now - _history_prev[name][0] > max_idle:
+        _history.pop(name, None)
+        _history_prev.pop(name, None)
+
+def _history_query(name: str, range_s: int, step_s: int, now: Optional[float] = None):
+  now = now or time.time()
+  with _history_lock:
+    levels = _history.get(name)
+    if levels is None:
+      return None
+    covering = [lv for lv in levels if lv["step"] * lv["slots"] >= range_s] or [levels[-1]]
+    fitting = [lv for lv in covering if lv["step"] <= step_s]
+    lv = fitting[-1] if fitting else covering[0]
+    step = max(lv["step"], (step_s // lv["step"]) * lv["step"])
+    out = {"t": []}
+    for m in _HISTORY_METRICS:
+      out[m] = {"min": [], "avg": [], "max": []}
+    first = int((now - range_s) // lv["step"]) + 1
+    last = int(now // lv["step"])
+    first = max(first, last - lv["slots"] + 1)
+    group, acc = None, None
+    def _flush():
+      if acc is None or not acc["n"]:
+        return
+      out["t"].append(group * step)
+      for m in _HISTORY_METRICS:
+        out[m]["min"].append(round(acc[m][0], 3)); out[m]["avg"].append(round(acc[m][1] / acc["n"], 3)); out[m]["max"].append(round(acc[m][2], 3))
+    for bucket in range(first, last + 1):
+      i = bucket % lv["slots"]
+      if lv["bucket"][i] != bucket:
+        continue
+      g = (bucket * lv["step"]) // step
+      if g != group:
+        _flush()
+        group, acc = g, {"n": 0, **{m: [float("inf"), 0.0, float("-inf")] for m in _HISTORY_METRICS}}
+      n = lv["count"][i]
+      acc["n"] += n
+      for m in _HISTORY_METRICS:
+        lo, avg, hi = lv[m]
+        a = acc[m]; a[0] = min(a[0], lo[i]); a[1] += avg[i] * n; a[2] = max(a[2], hi[i])
+    _flush()
+  return step, out
+
+STATS_STREAM_ENABLED = _truthy(os.getenv("STATS_STREAM_ENABLED", "true"))
+STATS_STREAM_MAX = max(0, int(os.getenv("STATS_STREAM_MAX", "200")))
+_STATS_STREAM_MAX_AGE = 10.0
+_STATS_STREAM_SCAN = 10
+_stats_latest = {}
+_stats_streams = {}
+_stats_streams_lock = threading.Lock()
+
+def _live_stats(container):
+  if not (STATS_STREAM_ENABLED or _cgroup_version):
+    return None
+  live = _stats_latest.get(container.name)
+  if not live or live["id"] != container.id or (time.time() - live["ts"]) > _STATS_STREAM_MAX_AGE:
+    return None
+  return live["meta"]
+
+CGROUP_STATS = _truthy(os.getenv("CGROUP_STATS", "true"))
+CGROUP_ROOT = os.getenv("CGROUP_ROOT", "/sys/fs/cgroup").rstrip("/") or "/"
+HOST_PROC = os.getenv("HOST_PROC", "/proc").rstrip("/") or "/"
+CGROUP_INTERVAL = max(0.5, float(os.getenv("CGROUP_INTERVAL", "2")))
+_CGROUP_MIN_CPU_WINDOW = 0.5
+_CGROUP_RETRY = 60.0
+_CGROUP_V1_UNLIMITED = 1 << 62
+
+def _cgroup_detect(root: str, explicit: bool = False) -> Optional[int]:
+  if os.path.isfile(os.path.join(root, "cgroup.controllers")): version, base = 2, root
+  elif os.path.isdir(os.path.join(root, "memory")): version, base = 1, os.path.join(root, "memory")
+  else: return None
+  if explicit or os.path.isdir(os.path.join(base, "docker")):
+    return version
+  # Without CGROUP_ROOT the default path is usually this container's own namespace: only trust it if it holds docker scopes.
+  try:
+    scopes = os.listdir(os.path.join(base, "system.slice"))
+  except OSError:
+    return None
+  return version if any(n.startswith("docker-") and n.endswith(".scope") for n in scopes) else None
+
+_cgroup_version = _cgroup_detect(CGROUP_ROOT, bool(os.getenv("CGROUP_ROOT"))) if CGROUP_STATS else None
+_cgroup_paths = {}
+_cgroup_prev = {}
+_cgroup_mem_total = {}
+_cgroup_counters = {"samples": 0, "errors": 0}
+
+def _read_text(path: str) -> str:
+  with open(path, "r") as f:
+    return f.read()
+
+def _read_int(path: str) -> Optional[int]:
+  v = _read_text(path).strip()
+  return None if v == "max" else int(v)
+
+def _host_mem_total() -> Optional[int]:
+  if "v" not in _cgroup_mem_total:
+    _cgroup_mem_total["v"] = None
+    try:
+      for line in _read_text(f"{HOST_PROC}/meminfo").splitlines():
+        if line.startswith("MemTotal:"):
+          _cgroup_mem_total["v"] = int(line.split()[1]) * 1024
+          break
+    except Exception:
+      pass
+  return _cgroup_mem_total["v"]
+
+def _cgroup_proc_path(pid: int, cid: str, controller: str = "") -> Optional[str]:
+  try:
+    for line in _read_text(f"{HOST_PROC}/{pid}/cgroup").splitlines():
+      _, ctrls, path = line.split(":", 2)
+      if (not controller and not ctrls) or (controller and controller in ctrls.split(",")):
+        return path.lstrip("/") if cid in path and ".." not in path else None
+  except Exception:
+    pass
+  return None
+
+def _pid_in_container(pid: int, cid: str) -> bool:
+  try:
+    return cid in _read_text(f"{HOST_PROC}/{pid}/cgroup")
+  except Exception:
+    return False
+
+def _cgroup_find(cid: str, pid: int):
+  if _cgroup_version == 2:
+    for rel in (f"system.slice/docker-{cid}.scope", f"docker/{cid}", _cgroup_proc_path(pid, cid)):
+      if rel and os.path.isfile(os.path.join(CGROUP_ROOT, rel, "cpu.stat")):
+        d = os.path.join(CGROUP_ROOT, rel)
+        return {"cpu": d, "memory": d, "io": d}
+    return None
+  dirs = {}
+  for key, controllers, probe in (("cpu", ("cpuacct", "cpu,cpuacct"), "cpuacct.usage"), ("memory", ("memory",), "memory.usage_in_bytes"),
+                                  ("io", ("blkio",), "blkio.throttle.io_service_bytes_recursive")):
+    for ctrl in controllers:
+      for rel in (f"docker/{cid}", f"system.slice/docker-{cid}.scope", _cgroup_proc_path(pid, cid, ctrl.split(",")[-1])):
+        if rel and os.path.isfile(os.path.join(CGROUP_ROOT, ctrl, rel, probe)):
+          dirs[key] = os.path.join(CGROUP_ROOT, ctrl, rel)
+          break
+      if key in dirs:
+        break
+  return dirs if len(dirs) == 3 else None
+
+def _cgroup_dirs(container):
+  if _cgroup_version is None or _host_of(container) != PRIMARY_HOST:
+    return None
+  cached = _cgroup_paths.get(container.id)
+  if cached and (cached[1] is not None or time.time() - cached[0] < _CGROUP_RETRY):
+    return cached[1]
+  attrs = container.attrs or {}
+  pid = (attrs.get("State") or {}).get("Pid") or 0
+  mode = (attrs.get("HostConfig") or {}).get("NetworkMode") or ""
+  dirs = _cgroup_find(container.id, pid) if pid else None
+  if dirs is not None:
+    if mode in ("host", "none"):
+      dirs["pid"] = None
+    elif _pid_in_container(pid, container.id) and os.path.isfile(f"{HOST_PROC}/{pid}/net/dev"):
+      dirs["pid"] = pid
+    else:
+      dirs = None
+  _cgroup_paths[container.id] = (time.time(), dirs)
+  return dirs
+
+def _proc_net_dev(pid: int):
+  rx = tx = 0
+  for line in _read_text(f"{HOST_PROC}/{pid}/net/dev").splitlines()[2:]:
+    iface, _, data = line.partition(":")
+    if iface.strip() == "lo":
+      continue
+    fields = data.split()
+    rx += int(fields[0]); tx += int(fields[8])
+  return rx, tx
+
+def _cgroup_sample(cid: str, dirs: dict) -> dict:
+  now = time.monotonic()
+  reads = writes = 0
+  if _cgroup_version == 2:
+    stat = dict(line.split(None, 1) for line in _read_text(dirs["cpu"] + "/cpu.stat").splitlines() if line.strip())
+    cpu_ns = int(stat["usage_usec"]) * 1000
+    usage = _read_int(dirs["memory"] + "/memory.current")
+    limit = _read_int(dirs["memory"] + "/memory.max")
+    for line in _read_text(dirs["io"] + "/io.stat").splitlines():
+      for kv in line.split()[1:]:
+        k, _, v = kv.partition("=")
+        if k == "rbytes": reads += int(v)
+        elif k == "wbytes": writes += int(v)
+  else:
+    cpu_ns = _read_int(dirs["cpu"] + "/cpuacct.usage")
+    usage = _read_int(dirs["memory"] + "/memory.usage_in_bytes")
+    limit = _read_int(dirs["memory"] + "/memory.limit_in_bytes")
+    if limit is not None and limit >= _CGROUP_V1_UNLIMITED:
+      limit = None
+    for line in _read_text(dirs["io"] + "/blkio.throttle.io_service_bytes_recursive").splitlines():
+      fields = line.split()
+      if len(fields) == 3 and fields[1] == "Read": reads += int(fields[2])
+      elif len(fields) == 3 and fields[1] == "Write": writes += int(fields[2])
+  limit = limit or _host_mem_total() or 0
+  rx, tx = _proc_net_dev(dirs["pid"]) if dirs["pid"] else (0, 0)
+  prev = _cgroup_prev.get(cid)
+  cpu = prev[2] if prev else None
+  if prev is None or now - prev[0] >= _CGROUP_MIN_CPU_WINDOW:
+    if prev and cpu_ns >= prev[1]:
+      cpu = (cpu_ns - prev[1]) / ((now - prev[0]) * 1e9) * 100.0
+    _cgroup_prev[cid] = (now, cpu_ns, cpu)
+  return {"cpu": cpu, "mem_usage": usage, "mem_limit": limit, "mem_perc": (usage / limit) * 100.0 if limit else None,
+          "net_rx": rx, "net_tx": tx, "blk_read": reads, "blk_write": writes}
+
+def _cgroup_read(container, dirs: dict):
+  try:
+    meta = _cgroup_sample(container.id, dirs)
+    _cgroup_counters["samples"] += 1
+    return meta
+  except Exception as e:
+    _cgroup_counters["errors"] += 1
+    _cgroup_paths.pop(container.id, None)
+    _cgroup_prev.pop(container.id, None)
+    app.logger.info("cgroup read for %s failed: %s", container.name, e)
+    return None
+
+def cgroup_sampler():
+  running, listed = [], 0.0
+  _wait_inventory()
+  while True:
+    t0 = time.perf_counter()
+    try:
+      if (INVENTORY_ENABLED and _inventory_state["ready"]) or time.time() - listed >= _STATS_STREAM_SCAN:
+        running, listed = [c for c in _list_containers() if c.status == "running"], time.time()
+      for c in running:
+        dirs = _cgroup_dirs(c)
+        meta = _cgroup_read(c, dirs) if dirs else None
+        if meta is not None:
+          now = time.time()
+          _stats_latest[c.name] = {"ts": now, "id": c.id, "meta": meta}
+          _history_record(c.name, meta, now)
+      ids = {c.id for c in running}
+      for cid in [cid for cid in list(_cgroup_paths) if cid not in ids]:
+        _cgroup_paths.pop(cid, None)
+        _cgroup_prev.pop(cid, None)
+      _startup_mark("stats")
+    except Exception as e:
+      logging.info("cgroup sampler error: %s", e)
+    _perf_since("cgroup.sample", t0)
+    time.sleep(CGROUP_INTERVAL)
+
+def _cgroup_view() -> dict:
+  return dict(_cgroup_counters, version=_cgroup_version, root=CGROUP_ROOT, proc=HOST_PROC, interval=CGROUP_INTERVAL,
+              containers=sum(1 for _, d in list(_cgroup_paths.values()) if d is not None))
+
+_stats_stream_wakeup = threading.Event()
+
+def _stats_stream_worker(stream_client, name, cid, stop):
+  try:
+    for sample in stream_client.api.stats(cid, stream=True, decode=True):
+      if stop.is_set():
+        break
+      now = time.time()
+      _stats_latest[name] = {"ts": now, "id": cid, "meta": _parse_stats_sample(sample, {})}
+      _history_record(name, _stats_latest[name]["meta"], now)
+  except Exception as e:
+    app.logger.info("stats stream for %s ended: %s", name, e)
+  finally:
+    with _stats_streams_lock:
+      if (_stats_streams.get(name) or {}).get("stop") is stop:
+        del _stats_streams[name]
+    if (_stats_latest.get(name) or {}).get("id") == cid:
+      _stats_latest.pop(name, None)
+
+def _stats_stream_sync(stream_client, running, skip=()):
+  running = {c.name: c for c in running}
+  with _stats_streams_lock:
+    for name, sub in list(_stats_streams.items()):
+      c = running.get(name)
+      if c is None or c.id != sub["id"] or name in skip:
+        sub["stop"].set()
+        del _stats_streams[name]
+    for name, c in running.items():
+      if name in _stats_streams or name in skip or len(_stats_streams) >= STATS_STREAM_MAX:
+        continue
+      stop = threading.Event()
+      _stats_streams[name] = {"id": c.id, "stop": stop}
+      threading.Thread(target=_stats_stream_worker, args=(stream_client, name, c.id, stop), daemon=True, name=f"stats-{name}").start()
+  for name in list(_stats_latest):
+    if name not in running:
+      _stats_latest.pop(name, None)
+
+def stats_stream_supervisor():
+  stream_client = None
+  _inventory_listeners.append(lambda kind, action, ident: kind == "container" and _stats_stream_wakeup.set())
+  _wait_inventory()
+  while True:
+    _stats_stream_wakeup.clear()
+    try:
+      if stream_client is None:
+        stream_client = docker.DockerClient(base_url=_hosts[PRIMARY_HOST]["url"], version='auto', timeout=_hosts[PRIMARY_HOST]["timeout"], max_pool_size=STATS_STREAM_MAX + 2)
+      containers = _list_containers()
+      running = [c for c in containers if c.status == "running"]
+      _stats_stream_sync(stream_client, running, skip={c.name for c in running if _cgroup_dirs(c) is not None})
+      _history_prune({c.name for c in containers})
+      _startup_mark("stats")
+    except Exception as e:
+      logging.info("stats stream supervisor error: %s", e)
+    _stats_stream_wakeup.wait(_STATS_STREAM_SCAN)
+
+STATS_WORKERS = max(1, int(os.getenv("STATS_WORKERS", "16")))
+STATS_TIMEOUT = float(os.getenv("STATS_TIMEOUT", "8"))
+_stats_pool = ThreadPoolExecutor(max_workers=STATS_WORKERS, thread_name_prefix="stats")
+
+def _collect_stats_parallel(containers, compute=None):
+  compute = compute or _compute_stats
+  started, results = {}, {}
+  def _run(c):
+    started[c.name] = time.time()
+    return compute(c)
+  futures = {_stats_pool.submit(_run, c): c.name for c in containers}
+  waves = -(-len(futures) // STATS_WORKERS) if futures else 0
+  deadline = time.time() + STATS_TIMEOUT * (waves + 1)
+  pending = set(futures)
+  while pending:
+    done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+    for f in done:
+      try:
+        results[futures[f]] = f.result()
+      except Exception:
+        results[futures[f]] = _blank_stats_meta()
+    now = time.time()
+    for f in list(pending):
+      name = futures[f]
+      t0 = started.get(name)
+      if (t0 is not None and now - t0 > STATS_TIMEOUT) or now > deadline:
+        f.cancel(); pending.discard(f)
+        app.logger.info("stats timeout for %s", name)
+        results[name] = _blank_stats_meta()
+  return results
+
+def _image_ref_and_local_digests(container):
+  info = _image_meta_for(container)
+  return info["image_ref"], info["local_digests"]
+
+_update_status_last = {}
+
+def _resolve_update_statuses(containers, *, force: bool = False):
+  updates, targets, refs = {}, {}, {}
   for container in containers:
     name = container.name
     try:
-      img_attrs = container.image.attrs or {}
-      repo_tags = img_attrs.get("RepoTags") or container.image.tags or []
-      image_ref = repo_tags[0] if repo_tags else None
+      image_ref, local_digests = _image_ref_and_local_digests(container)
+      refs[name] = image_ref
       if not image_ref:
-        repo_digests = img_attrs.get("RepoDigests") or []
-        if repo_digests:
-          repo = repo_digests[0].split("@")[0]
-          image_ref = f"{repo}:latest"
-      if not image_ref:
-        updates[name] = "unknown_image"; meta[name] = _compute_stats(container); continue
-      local_digests = _local_repo_digests(img_attrs)
+        updates[name] = "unknown_image"; continue
       if not local_digests:
-        updates[name] = "unknown_local_digest"; meta[name] = _compute_stats(container); continue
-      remote_digest = fetch_remote_digest_cached(image_ref, force=force, now_ts=now_ts)
-      if not remote_digest:
-        updates[name] = "registry_error"; meta[name] = _compute_stats(container); continue
-      rdig = _digest_only(remote_digest)
-      same = any(_digest_only(ld) == rdig for ld in local_digests)
-      updates[name] = "up_to_date" if same else "update_available"
-      meta[name] = _compute_stats(container)
+        updates[name] = "unknown_local_digest"; continue
+      targets[name] = (image_ref, local_digests)
     except Exception as e:
       updates[name] = f"error: {e}"
-      meta[name] = {}
+  remote = resolve_remote_digests([ref for ref, _ in targets.values()], force=force)
+  for name, (image_ref, local_digests) in targets.items():
+    remote_digest = remote.get(image_ref)
+    if not remote_digest:
+      updates[name] = "registry_error"; continue
+    rdig = _digest_only(remote_digest)
+    same = any(_digest_only(ld) == rdig for ld in local_digests)
+    updates[name] = "up_to_date" if same else "update_available"
+    if PREPULL_ENABLED and not same:
+      _prepull_schedule(image_ref, remote_digest, _split_host(name)[0])
+  now = time.time()
+  for name, st in updates.items():
+    _update_status_last[name] = {"status": st, "image": refs.get(name), "ts": now}
+  return updates
+
+def check_updates_for_containers(containers, *, force: bool = False):
+  t0 = time.perf_counter()
+  updates = _resolve_update_statuses(containers, force=force)
+  _perf_since("updates.resolve", t0)
+  t0 = time.perf_counter()
+  meta = {name: {} for name, st in updates.items() if st.startswith("error")}
+  meta.update(_collect_stats_parallel([c for c in containers if c.name not in meta]))
+  _perf_since("stats.collect", t0)
   return updates, meta
 
 def check_updates_for_containers_light(containers, *, force: bool = False):
-  updates, meta = {}, {}
-  now_ts = time.time()
-  for container in containers:
-    name = container.name
+  t0 = time.perf_counter()
+  updates = _resolve_update_statuses(containers, force=force)
+  _perf_since("updates.resolve", t0)
+  t0 = time.perf_counter()
+  meta = {c.name: _compute_light_meta(c) for c in containers}
+  _perf_since("stats.light", t0)
+  return updates, meta
+
+_STATUS_TOMBSTONES_MAX = 1000
+_GZIP_MIN_BYTES = 1024
+_status_cursor = {"version": 0}
+_status_tracking = {mode: {"entries": {}, "tombstones": {}, "horizon": 0} for mode in (True, False)}
+_status_tracking_lock = threading.Lock()
+
+def _status_track(light: bool, updates: dict, meta: dict, *, partial: bool = False, removed=(), skip_hosts=()):
+  with _status_tracking_lock:
+    tr = _status_tracking[light]
+    for name, st in updates.items():
+      fp = hashlib.sha1(json.dumps([st, meta.get(name)], sort_keys=True, default=str).encode()).hexdigest()
+      if (tr["entries"].get(name) or (None,))[0] != fp:
+        _status_cursor["version"] += 1
+        tr["entries"][name] = (fp, _status_cursor["version"])
+        tr["tombstones"].pop(name, None)
+    gone = set(removed) if partial else set(tr["entries"]) - set(updates)
+    if skip_hosts:
+      gone = {n for n in gone if _split_host(n)[0] not in skip_hosts}
+    for name in gone:
+      if tr["entries"].pop(name, None) is not None:
+        _status_cursor["version"] += 1
+        tr["tombstones"][name] = _status_cursor["version"]
+    if len(tr["tombstones"]) > _STATUS_TOMBSTONES_MAX:
+      for name, v in sorted(tr["tombstones"].items(), key=lambda kv: kv[1])[:len(tr["tombstones"]) - _STATUS_TOMBSTONES_MAX]:
+        tr["horizon"] = max(tr["horizon"], v)
+        del tr["tombstones"][name]
+    return _status_cursor["version"]
+
+def _status_payload(light: bool, updates: dict, meta: dict, version: int, since: Optional[int]):
+  payload = {"status": "ok", "version": version}
+  if since is None:
+    payload.update({"updates": {str(k): v for k, v in updates.items()}, "meta": {str(k): v for k, v in meta.items()}})
+    return payload
+  with _status_tracking_lock:
+    tr = _status_tracking[light]
+    if since < tr["horizon"]:
+      payload.update({"full": True, "updates": {str(k): v for k, v in updates.items()}, "meta": {str(k): v for k, v in meta.items()}})
+      return payload
+    changed = [n for n in updates if (tr["entries"].get(n) or (None, 0))[1] > since]
+    removed = sorted(n for n, v in tr["tombstones"].items() if v > since)
+  payload.update({"since": since, "updates": {str(n): updates[n] for n in changed},
+                  "meta": {str(n): meta.get(n, {}) for n in changed}, "removed": removed})
+  return payload
+
+def _conditional_json(payload: dict, status: int = 200, volatile: Optional[dict] = None):
+  body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+  etag = 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+  headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+  inm = request.headers.get("If-None-Match") or ""
+  if status == 200 and any(t.strip() in (etag, etag[2:], "*") for t in inm.split(",")):
+    return app.response_class(status=304, headers=headers)
+  if volatile:
+    body = json.dumps(dict(payload, **volatile), ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+  if len(body) >= _GZIP_MIN_BYTES and "gzip" in (request.headers.get("Accept-Encoding") or "").lower():
+    body = gzip.compress(body, compresslevel=5)
+    headers["Content-Encoding"] = "gzip"
+  return app.response_class(body, status=status, headers=headers, content_type="application/json")
+
+def _since_arg() -> Optional[int]:
+  try:
+    return int(request.args["since"]) if request.args.get("since") not in (None, "") else None
+  except ValueError:
+    return None
+
+STATUS_MAX_STALENESS = max(0.0, float(os.getenv("STATUS_MAX_STALENESS", "5")))
+_status_snapshots = {}
+_status_flights = {}
+_status_snapshot_lock = threading.Lock()
+
+def _status_compute(light: bool, host: str, force: bool) -> dict:
+  started, inv_version = time.time(), _inventory_state["version"]
+  containers, errors = _list_all_containers([host] if host else None)
+  if light:
+    updates, meta = check_updates_for_containers_light(containers, force=force)
+  else:
+    updates, meta = check_updates_for_containers(containers, force=force)
+  skip = (set(_hosts) - {host} if host else set()) | set(errors)
+  version = _status_track(light, updates, meta, skip_hosts=skip)
+  return {"updates": updates, "meta": meta, "errors": errors, "version": version, "started": started, "ts": time.time(),
+          "inv_version": inv_version, "forced": force}
+
+def _status_fresh(snap) -> bool:
+  return bool(snap) and time.time() - snap["ts"] <= STATUS_MAX_STALENESS and snap["inv_version"] == _inventory_state["version"]
+
+def _status_snapshot(light: bool, host: str = "", *, force: bool = False) -> dict:
+  key = (light, host)
+  while True:
+    with _status_snapshot_lock:
+      snap, flight = _status_snapshots.get(key), _status_flights.get(key)
+      if not force and _status_fresh(snap):
+        _perf_counters["status_snapshot_hits"] += 1
+        return snap
+      lead = flight is None
+      if lead:
+        flight = _status_flights[key] = {"done": threading.Event(), "force": force, "snap": None, "error": None}
+    if not lead:
+      flight["done"].wait()
+      if force and not flight["force"]:
+        continue
+      _perf_counters["status_snapshot_joined"] += 1
+      if flight["error"] is not None:
+        raise flight["error"]
+      return flight["snap"]
+    _perf_counters["status_snapshot_misses"] += 1
     try:
-      img_attrs = container.image.attrs or {}
-      repo_tags = img_attrs.get("RepoTags") or container.image.tags or []
-      image_ref = repo_tags[0] if repo_tags else None
-      if not image_ref:
-        repo_digests = img_attrs.get("RepoDigests") or []
-        if repo_digests:
-          repo = repo_digests[0].split("@")[0]
-          image_ref = f"{repo}:latest"
-      if not image_ref:
-        updates[name] = "unknown_image"; meta[name] = _compute_light_meta(container); continue
-      local_digests = _local_repo_digests(img_attrs)
-      if not local_digests:
-        updates[name] = "unknown_local_digest"; meta[name] = _compute_light_meta(container); continue
-      remote_digest = fetch_remote_digest_cached(image_ref, force=force, now_ts=now_ts)
-      if not remote_digest:
-        updates[name] = "registry_error"; meta[name] = _compute_light_meta(container); continue
-      rdig = _digest_only(remote_digest)
-      same = any(_digest_only(ld) == rdig for ld in local_digests)
-      updates[name] = "up_to_date" if same else "update_available"
-      meta[name] = _compute_light_meta(container)
+      flight["snap"] = _status_compute(light, host, force)
+      with _status_snapshot_lock:
+        _status_snapshots[key] = flight["snap"]
+      return flight["snap"]
     except Exception as e:
-      updates[name] = f"error: {e}"
-      meta[name] = _compute_light_meta(container)
-  return updates, meta
+      flight["error"] = e
+      raise
+    finally:
+      with _status_snapshot_lock:
+        _status_flights.pop(key, None)
+      flight["done"].set()
 
 @app.route("/status")
 def docker_status():
@@ -469,20 +1757,135 @@ def docker_status():
     return jsonify({"error": "unauthorized"}), 401
   force = request.args.get("force", "").lower() in ("1","true","yes")
   light = request.args.get("light", "").lower() in ("1","true","yes")
-  containers = client.containers.list(all=True)
-  if light:
-    updates, meta = check_updates_for_containers_light(containers, force=force)
-  else:
-    updates, meta = check_updates_for_containers(containers, force=force)
+  host = (request.args.get("host") or "").strip()
+  if host and host not in _hosts:
+    return jsonify({"error": f"unknown host {host}"}), 404
+  snap = _status_snapshot(light, host, force=force)
+  updates, meta = snap["updates"], snap["meta"]
   app.logger.info("/status(light=%s) -> %d containers", light, len(updates))
-  return jsonify({"status": "ok","updates": {str(k): v for k, v in updates.items()},"meta": {str(k): v for k, v in meta.items()}})
+  payload = _status_payload(light, updates, meta, snap["version"], _since_arg())
+  if len(_hosts) > 1:
+    payload["hosts"] = _hosts_summary(snap["errors"])
+  return _conditional_json(payload, volatile={"snapshot_age": round(time.time() - snap["ts"], 3)})
+
+def _prom_escape(v) -> str:
+  return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_line(lines, metric: str, labels: dict, value):
+  if value is None:
+    return
+  lbl = ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items() if v is not None)
+  num = str(int(value)) if isinstance(value, int) or float(value).is_integer() else repr(float(value))
+  lines.append(f"{metric}{{{lbl}}} {num}" if lbl else f"{metric} {num}")
+
+def _render_prometheus() -> str:
+  now = time.time()
+  out = []
+  def family(name, kind, help_text, samples):
+    out.append(f"# HELP {name} {help_text}")
+    out.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+      if multi_host and "container" in labels:
+        labels = dict(labels, host=_split_host(labels["container"])[0])
+      _prom_line(out, name, labels, value)
+  multi_host = len(_hosts) > 1
+  if INVENTORY_ENABLED and _inventory_state["ready"]:
+    with _inventory_lock:
+      containers = {c.name: c.status for c in _inventory.values()}
+  else:
+    containers = None
+  stats = {}
+  for name, entry in list(_stats_cache.items()):
+    stats[name] = (entry["ts"], entry["meta"])
+  for name, entry in list(_stats_latest.items()):
+    if name not in stats or entry["ts"] > stats[name][0]:
+      stats[name] = (entry["ts"], entry["meta"])
+  if containers is not None:
+    stats = {n: v for n, v in stats.items() if n in containers or _split_host(n)[0] != PRIMARY_HOST}
+  rows = sorted(stats.items())
+  def lbl(name, meta):
+    return {"container": name, "image": meta.get("image") or (_update_status_last.get(name) or {}).get("image")}
+  family("docker_monitor_container_cpu_percent", "gauge", "CPU usage in percent of one core.",
+         [(lbl(n, m), m.get("cpu") or 0.0) for n, (_, m) in rows if m.get("mem_usage") is not None])
+  family("docker_monitor_container_memory_usage_bytes", "gauge", "Memory usage in bytes.", [(lbl(n, m), m.get("mem_usage")) for n, (_, m) in rows])
+  family("docker_monitor_container_memory_limit_bytes", "gauge", "Memory limit in bytes.", [(lbl(n, m), m.get("mem_limit")) for n, (_, m) in rows])
+  family("docker_monitor_container_network_receive_bytes", "gauge", "Bytes received on all interfaces.", [(lbl(n, m), m.get("net_rx")) for n, (_, m) in rows])
+  family("docker_monitor_container_network_transmit_bytes", "gauge", "Bytes sent on all interfaces.", [(lbl(n, m), m.get("net_tx")) for n, (_, m) in rows])
+  family("docker_monitor_container_blkio_read_bytes", "gauge", "Bytes read from block devices.", [(lbl(n, m), m.get("blk_read")) for n, (_, m) in rows])
+  family("docker_monitor_container_blkio_write_bytes", "gauge", "Bytes written to block devices.", [(lbl(n, m), m.get("blk_write")) for n, (_, m) in rows])
+  family("docker_monitor_container_stats_age_seconds", "gauge", "Age of the last stats sample.", [({"container": n}, now - ts) for n, (ts, _) in rows])
+  if containers is not None:
+    family("docker_monitor_container_running", "gauge", "1 if the container is running.", [({"container": n}, 1 if st == "running" else 0) for n, st in sorted(containers.items())])
+  statuses = sorted((n, e) for n, e in list(_update_status_last.items()) if containers is None or n in containers or _split_host(n)[0] != PRIMARY_HOST)
+  family("docker_monitor_container_update_available", "gauge", "1 if the registry digest differs from the local image, 0 if up to date.",
+         [({"container": n, "image": e["image"]}, 1 if e["status"] == "update_available" else 0) for n, e in statuses if e["status"] in ("update_available", "up_to_date")])
+  family("docker_monitor_container_update_status", "gauge", "Last update check result, one series per container with the status as label.",
+         [({"container": n, "image": e["image"], "status": e["status"] if not e["status"].startswith("error") else "error"}, 1) for n, e in statuses])
+  family("docker_monitor_container_update_check_age_seconds", "gauge", "Age of the last update check.", [({"container": n}, now - e["ts"]) for n, e in statuses])
+  family("docker_monitor_dangling_images", "gauge", "Dangling images at the last /images/unused computation.",
+         [({}, _unused_last["count"])] if _unused_last["count"] is not None else [])
+  disks = [(h, e["summary"]) for h, e in list(_disk_cache.items())]
+  family("docker_monitor_disk_reclaimable_bytes", "gauge", "Space a prune would free at the last disk usage computation.",
+         [(dict({"kind": kind}, **({"host": h} if multi_host else {})), v) for h, d in disks
+          for kind, v in (("dangling_images", d["images"]["dangling"]["reclaimable"]), ("stopped_containers", d["containers"]["reclaimable"]), ("build_cache", d["build_cache"]["reclaimable"]))])
+  family("docker_monitor_disk_images_bytes", "gauge", "Disk used by image layers, shared layers counted once.",
+         [(({"host": h} if multi_host else {}), d["images"]["size"]) for h, d in disks])
+  family("docker_monitor_update_downtime_seconds", "gauge", "Downtime of the last update, from stop to the new container running.",
+         [({"container": n, "mode": e["mode"]}, e["seconds"]) for n, e in sorted(list(_update_downtimes.items()))])
+  family("docker_monitor_updates_total", "counter", "Container recreations performed by updates.", [({}, _update_downtime_totals["count"])])
+  family("docker_monitor_update_rollbacks_total", "counter", "Swaps that failed and restored the previous container.", [({}, _update_downtime_totals["rollbacks"])])
+  if multi_host:
+    family("docker_monitor_host_up", "gauge", "1 if the last call to the Docker host succeeded.",
+           [({"host": h}, 1 if e["ok"] else 0) for h, e in _hosts.items() if e["ok"] is not None])
+  cache = sorted(list(_pull_cache.items()))
+  family("docker_monitor_digest_cache_entries", "gauge", "Remote digests held in the cache.", [({}, len(cache))])
+  family("docker_monitor_digest_cache_age_seconds", "gauge", "Age of each cached remote digest.",
+         [({"image": ref, "resolved": "true" if e.get("digest") else "false"}, now - e["ts"]) for ref, e in cache])
+  family("docker_monitor_registry_requests_total", "counter", "Registry HTTP requests since start.", [({}, _registry_counters["requests"])])
+  return "\n".join(out) + "\n"
+
+def _stats_freshness(container) -> Optional[float]:
+  live = _stats_latest.get(container.name)
+  if live and live["id"] == container.id:
+    return live["ts"]
+  cached = _stats_cache.get(container.name)
+  return cached["ts"] if cached else None
+
+def _metrics_batch(names):
+  found, missing, errors = {}, [], {}
+  for name in names:
+    try:
+      c = _get_container(name)
+      found[c.name] = c
+    except docker.errors.NotFound:
+      missing.append(name)
+    except docker.errors.APIError as e:
+      errors[name] = f"docker api error: {e.explanation or e}"
+    except Exception as e:
+      errors[name] = str(e) or type(e).__name__
+  meta = _collect_stats_parallel(list(found.values()), compute=_compute_stats_cached)
+  ts = {name: _stats_freshness(c) for name, c in found.items()}
+  return {"status": "ok", "meta": meta, "ts": ts, "not_found": missing, "errors": errors}
+
+@app.route("/metrics", methods=["GET", "POST"])
+def metrics_prometheus():
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  if request.method == "POST":
+    names = (request.get_json(silent=True) or {}).get("names")
+    if not isinstance(names, list):
+      return jsonify({"error": "Missing 'names' list"}), 400
+    return jsonify(_metrics_batch([str(n) for n in names if str(n).strip()]))
+  if request.args.get("names") is not None:
+    return jsonify(_metrics_batch([n.strip() for n in request.args["names"].split(",") if n.strip()]))
+  return app.response_class(_render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/metrics/<name>")
 def metrics_one(name):
   if not _check_auth():
     return jsonify({"error": "unauthorized"}), 401
   try:
-    c = client.containers.get(name)
+    c = _get_container(_host_arg(name))
   except docker.errors.NotFound:
     return jsonify({"error": "not_found"}), 404
   except Exception as e:
@@ -493,6 +1896,152 @@ def metrics_one(name):
   except Exception as e:
     return jsonify({"status": "error", "error": str(e)}), 500
 
+@app.get("/metrics/<name>/history")
+def metrics_history(name):
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  try:
+    range_s = max(1, int(request.args.get("range") or 3600))
+    step_s = max(1, int(request.args.get("step") or 60))
+  except ValueError:
+    return jsonify({"error": "range and step must be integers (seconds)"}), 400
+  try:
+    c = _get_container(_host_arg(name))
+  except docker.errors.NotFound:
+    return jsonify({"error": "not_found"}), 404
+  except Exception as e:
+    return jsonify({"error": str(e)}), 500
+  res = _history_query(c.name, range_s, step_s)
+  if res is None:
+    return jsonify({"status": "ok", "range": range_s, "step": step_s, "series": {}})
+  step, series = res
+  return jsonify({"status": "ok", "range": range_s, "step": step, "series": series})
+
+SSE_TICK = 1.0
+SSE_STATUS_EVERY = 5.0
+SSE_UNUSED_EVERY = 60.0
+_SSE_QUEUE_MAX = 200
+_sse_subscribers = {}
+_sse_lock = threading.Lock()
+_sse_state = {"thread": None, "seq": 0, "version": 0, "updates": {}, "meta": {}, "unused": None, "reclaimable": None, "metrics": None}
+
+def _sse_format(event: str, data) -> str:
+  _sse_state["seq"] += 1
+  return f"id: {_sse_state['seq']}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+def _sse_broadcast(msg: str, *, metrics: bool = False):
+  now = time.time()
+  with _sse_lock:
+    subs = list(_sse_subscribers.values())
+  for sub in subs:
+    if metrics:
+      if now < sub["next_metrics"]:
+        continue
+      sub["next_metrics"] = now + sub["interval"]
+    try:
+      sub["q"].put_nowait(msg)
+    except queue.Full:
+      with _sse_lock:
+        _sse_subscribers.pop(id(sub), None)
+      sub["q"] = queue.Queue(maxsize=1)
+      sub["q"].put_nowait(None)
+
+def _sse_refresh_status():
+  snap = _status_snapshot(True)
+  updates, meta, errors, version = dict(snap["updates"]), dict(snap["meta"]), snap["errors"], snap["version"]
+  prev_updates, prev_meta = _sse_state["updates"], _sse_state["meta"]
+  for name in prev_updates:
+    if name not in updates and _split_host(name)[0] in errors:
+      updates[name], meta[name] = prev_updates[name], prev_meta.get(name) or {}
+  events = []
+  for name in sorted(updates):
+    m, pm = meta.get(name) or {}, prev_meta.get(name) or {}
+    if name not in prev_updates or prev_updates[name] != updates[name] or pm.get("image") != m.get("image"):
+      events.append(("update", {"name": name, "status": updates[name], "image": m.get("image"), "version": version}))
+    if m.get("state") != pm.get("state"):
+      events.append(("container", {"name": name, "state": m.get("state"), "image": m.get("image"), "version": version}))
+  for name in sorted(set(prev_updates) - set(updates)):
+    events.append(("container", {"name": name, "removed": True, "version": version}))
+  _sse_state.update({"updates": updates, "meta": meta, "version": version})
+  for event, data in events:
+    _sse_broadcast(_sse_format(event, data))
+
+def _sse_refresh_unused():
+  count, _ = _compute_unused_images()
+  reclaimable = _unused_last.get("reclaimable")
+  if (count, reclaimable) != (_sse_state["unused"], _sse_state["reclaimable"]):
+    _sse_state.update({"unused": count, "reclaimable": reclaimable})
+    _sse_broadcast(_sse_format("unused", {"count": count, "reclaimable": reclaimable}))
+
+def _sse_metrics_snapshot():
+  now = time.time()
+  return {name: dict(e["meta"], ts=round(e["ts"], 3)) for name, e in list(_stats_latest.items()) if now - e["ts"] <= _STATS_STREAM_MAX_AGE}
+
+def sse_producer():
+  last_status = last_unused = 0.0
+  seen = (None, None)
+  while True:
+    time.sleep(SSE_TICK)
+    with _sse_lock:
+      if not _sse_subscribers:
+        continue
+    now = time.time()
+    marks = (_inventory_state["version"], _inventory_state["image_version"])
+    try:
+      if marks[0] != seen[0] or now - last_status >= SSE_STATUS_EVERY:
+        _sse_refresh_status(); last_status = now
+      if marks[1] != seen[1] or now - last_unused >= SSE_UNUSED_EVERY:
+        _sse_refresh_unused(); last_unused = now
+      seen = marks
+      metrics = _sse_metrics_snapshot()
+      if metrics:
+        _sse_broadcast(_sse_format("metrics", metrics), metrics=True)
+    except Exception as e:
+      logging.info("sse producer error: %s", e)
+
+def _sse_subscribe(interval: float):
+  sub = {"q": queue.Queue(maxsize=_SSE_QUEUE_MAX), "interval": interval, "next_metrics": 0.0}
+  with _sse_lock:
+    _sse_subscribers[id(sub)] = sub
+    if _sse_state["thread"] is None:
+      _sse_state["thread"] = threading.Thread(target=sse_producer, daemon=True, name="sse-producer")
+      _sse_state["thread"].start()
+  return sub
+
+@app.get("/events")
+def events_stream():
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  try:
+    interval = max(1.0, float(request.args.get("metrics_interval") or 5))
+  except ValueError:
+    interval = 5.0
+  if not _sse_state["updates"]:
+    try:
+      _sse_refresh_status()
+    except Exception as e:
+      app.logger.info("sse initial status failed: %s", e)
+  sub = _sse_subscribe(interval)
+  snapshot = {"version": _sse_state["version"], "updates": _sse_state["updates"], "meta": _sse_state["meta"], "unused": _sse_state["unused"], "reclaimable": _sse_state["reclaimable"]}
+  def gen():
+    try:
+      yield "retry: 5000\n\n"
+      yield _sse_format("snapshot", snapshot)
+      while True:
+        try:
+          msg = sub["q"].get(timeout=15)
+        except queue.Empty:
+          yield ": ping\n\n"
+          continue
+        if msg is None:
+          break
+        yield msg
+    finally:
+      with _sse_lock:
+        _sse_subscribers.pop(id(sub), None)
+  return app.response_class(stream_with_context(gen()), content_type="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/diag")
 def diag():
   if not _check_auth():
@@ -502,7 +2051,7 @@ def diag():
   except Exception as e:
     return jsonify({"ok": False, "error": f"ping failed: {e}"}), 500
   try:
-    names = [c.name for c in client.containers.list(all=True)]
+    names = [c.name for c in _list_containers()]
   except Exception as e:
     return jsonify({"ok": False, "ping": ok, "error": f"list failed: {e}"}), 500
   sock = "/var/run/docker.sock"
@@ -511,7 +2060,64 @@ def diag():
     meta = {"socket_exists": True,"socket_mode": oct(st.st_mode & 0o777),"socket_uid": st.st_uid,"socket_gid": st.st_gid,"proc_uid": os.getuid(),"proc_gid": os.getgid()}
   except FileNotFoundError:
     meta = {"socket_exists": False}
-  return jsonify({"ok": True, "ping": ok, "containers": names, "socket": meta})
+  registry = dict(_registry_counters)
+  registry["last_lookup_requests"] = {ref: e.get("requests") for ref, e in list(_pull_cache.items())}
+  inventory = {k: _inventory_state[k] for k in ("ready", "version", "synced_at", "events", "resyncs")}
+  history = {"containers": len(_history), "levels": HISTORY_LEVELS, "bytes_per_container": _history_bytes_per_container()}
+  stats = {"streams": len(_stats_streams), "cgroup": _cgroup_view()}
+  startup = {"at": dict(_startup["at"]), "errors": dict(_startup["errors"]), "platform": dict(_local_platform), "self": _self_state["name"]}
+  updates = {"swap": UPDATE_SWAP, "downtime": dict(_update_downtime_totals, last=dict(_update_downtimes)),
+             "prepull": {"enabled": PREPULL_ENABLED, "images": {(ref if h == PRIMARY_HOST else f"{h}/{ref}"): dict(e) for (h, ref), e in list(_prepulls.items())}}}
+  out = {"ok": True, "ping": ok, "containers": names, "socket": meta, "registry": registry, "inventory": inventory, "history": history, "stats": stats, "startup": startup, "updates": updates, "refresh": _refresh_view(), "mqtt": _mqtt_view(),
+         "server": dict(_server_counters, mode=SERVER_MODE, workers=SERVER_WORKERS, queue=SERVER_QUEUE, limits=ENDPOINT_LIMITS)}
+  if len(_hosts) > 1:
+    _, errors = _for_each_host(lambda h: _host_client(h).ping(), [h for h in _hosts if h != PRIMARY_HOST])
+    out["hosts"] = _hosts_summary(errors)
+  return jsonify(out)
+
+_SERVER_TIMING_ENDPOINTS = ("docker_status", "docker_status_one", "metrics_one")
+
+@app.before_request
+def start_server_timing():
+  if PERF_ENABLED and request.endpoint in _SERVER_TIMING_ENDPOINTS:
+    _perf_local.timings = {}
+    _perf_local.started = time.perf_counter()
+
+@app.after_request
+def add_server_timing(resp):
+  timings = getattr(_perf_local, "timings", None)
+  if timings is None:
+    return resp
+  _perf_local.timings = None
+  total = time.perf_counter() - _perf_local.started
+  _perf_since(f"request.{request.endpoint}", _perf_local.started)
+  parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+  parts.append(f"total;dur={total * 1000:.2f}")
+  resp.headers["Server-Timing"] = ", ".join(parts)
+  return resp
+
+@app.get("/diag/perf")
+def diag_perf():
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  if _truthy(request.args.get("reset", "")):
+    with _perf_lock:
+      for group in _perf.values():
+        group.clear()
+    for k in _perf_counters:
+      _perf_counters[k] = 0
+  c = dict(_perf_counters)
+  ratio = lambda h, m: round(h / (h + m), 3) if h + m else None
+  caches = {
+    "pull_cache": {"hits": c["pull_cache_hits"], "misses": c["pull_cache_misses"], "hit_ratio": ratio(c["pull_cache_hits"], c["pull_cache_misses"]), "entries": len(_pull_cache)},
+    "stats_cache": {"hits": c["stats_cache_hits"], "misses": c["stats_cache_misses"], "hit_ratio": ratio(c["stats_cache_hits"], c["stats_cache_misses"]),
+                    "entries": len(_stats_cache), "live_stream_hits": c["stats_live_hits"]},
+    "disk_cache": {"hits": c["disk_cache_hits"], "misses": c["disk_cache_misses"], "hit_ratio": ratio(c["disk_cache_hits"], c["disk_cache_misses"]), "entries": len(_disk_cache)},
+    "status_snapshot": {"hits": c["status_snapshot_hits"], "misses": c["status_snapshot_misses"], "joined": c["status_snapshot_joined"],
+                        "hit_ratio": ratio(c["status_snapshot_hits"] + c["status_snapshot_joined"], c["status_snapshot_misses"]), "max_staleness": STATUS_MAX_STALENESS,
+                        "ages": {("light" if light else "full") + (f"@{host}" if host else ""): round(time.time() - snap["ts"], 1) for (light, host), snap in list(_status_snapshots.items())}},
+  }
+  return jsonify({"enabled": PERF_ENABLED, "window": _PERF_WINDOW, "phases": _perf_summary("phases"), "registries": _perf_summary("registries"), "caches": caches})
 
 @app.get("/status/<name>")
 def docker_status_one(name):
@@ -519,20 +2125,459 @@ def docker_status_one(name):
     return jsonify({"error": "unauthorized"}), 401
   force = request.args.get("force", "").lower() in ("1","true","yes")
   light = request.args.get("light", "").lower() in ("1","true","yes")
+  name = _host_arg(name)
   try:
-    container = client.containers.get(name)
+    container = _get_container(name)
     if light:
       updates, meta = check_updates_for_containers_light([container], force=force)
     else:
       updates, meta = check_updates_for_containers([container], force=force)
     st = updates.get(container.name)
+    version = _status_track(light, updates, meta, partial=True)
     app.logger.info("/status/%s (light=%s) -> %s", name, light, st)
-    return jsonify({"status": "ok","updates": {str(container.name): st},"meta": {str(container.name): meta.get(container.name, {})}})
+    return _conditional_json({"status": "ok","version": version,"updates": {str(container.name): st},"meta": {str(container.name): meta.get(container.name, {})}})
   except docker.errors.NotFound:
-    return jsonify({"status": "ok","updates": {str(name): "not_found"},"meta": {str(name): {}}})
+    version = _status_track(light, {}, {}, partial=True, removed=[name])
+    return _conditional_json({"status": "ok","version": version,"updates": {str(name): "not_found"},"meta": {str(name): {}}})
   except Exception as e:
     return jsonify({"status": "error", "error": str(e)}), 500
 
+UPDATE_CONCURRENCY = max(1, int(os.getenv("UPDATE_CONCURRENCY", "2")))
+_JOBS_MAX = 200
+_update_pool = ThreadPoolExecutor(max_workers=UPDATE_CONCURRENCY, thread_name_prefix="update")
+_jobs = {}
+_jobs_lock = threading.RLock()
+_jobs_by_container = {}
+_pulls = {}
+_pulls_lock = threading.Lock()
+
+class _UpdateError(Exception):
+  def __init__(self, message: str, code: int = 500):
+    super().__init__(message)
+    self.code = code
+
+def _new_job(kind: str, **fields) -> dict:
+  job = {"id": secrets.token_hex(8), "type": kind, "state": "queued", "phase": "queued", "created": time.time(),
+         "started": None, "finished": None, "result": None, "error": None, "code": None, "progress": None, "image": None, "pull": None, **fields}
+  job["done"] = threading.Event()
+  with _jobs_lock:
+    _jobs[job["id"]] = job
+    finished = [j for j in _jobs.values() if j["finished"]]
+    for old in sorted(finished, key=lambda j: j["finished"])[:max(0, len(_jobs) - _JOBS_MAX)]:
+      _jobs.pop(old["id"], None)
+  return job
+
+def _claim_container(name: str, job: dict) -> Optional[dict]:
+  with _jobs_lock:
+    owner = _jobs.get(_jobs_by_container.get(name))
+    if owner is not None and owner is not job and not owner["finished"]:
+      return owner
+    _jobs_by_container[name] = job["id"]
+    return None
+
+def _release_container(name: str, job: dict):
+  with _jobs_lock:
+    if _jobs_by_container.get(name) == job["id"]:
+      _jobs_by_container.pop(name, None)
+
+def _job_view(job: dict) -> dict:
+  snapshot = dict(job)
+  view = {k: v for k, v in snapshot.items() if k not in ("done", "pull")}
+  pull = snapshot["pull"]
+  if pull is not None:
+    view["progress"] = _pull_progress(pull)
+  return view
+
+def _pull_progress(pull: dict) -> dict:
+  layers = dict(pull["layers"])
+  current = sum(l.get("current") or 0 for l in layers.values())
+  total = sum(l.get("total") or 0 for l in layers.values())
+  return {"image": pull["ref"], "status": pull["status"], "layers": layers, "current": current, "total": total,
+          "percent": round(current * 100.0 / total, 1) if total else None, "shared_by": pull["jobs"]}
+
+def _pull_image_shared(image_ref: str, job: Optional[dict] = None, host: Optional[str] = None):
+  key = (host or PRIMARY_HOST, image_ref)
+  with _pulls_lock:
+    pull = _pulls.get(key)
+    owner = pull is None
+    if owner:
+      pull = _pulls[key] = {"ref": image_ref, "host": key[0], "status": "pulling", "layers": {}, "error": None, "code": None, "jobs": 0, "done": threading.Event()}
+    pull["jobs"] += 1
+  if job is not None:
+    job["pull"] = pull
+  if not owner:
+    pull["done"].wait()
+  else:
+    try:
+      for ev in _host_client(key[0]).api.pull(image_ref, stream=True, decode=True):
+        if ev.get("error"):
+          raise docker.errors.APIError(ev["error"], explanation=ev["error"])
+        lid = ev.get("id")
+        if lid and ev.get("status"):
+          detail = ev.get("progressDetail") or {}
+          layer = pull["layers"].setdefault(lid, {})
+          layer["status"] = ev["status"]
+          if detail.get("total"):
+            layer["current"] = detail.get("current") or 0; layer["total"] = detail["total"]
+          elif ev["status"] in ("Pull complete", "Already exists", "Download complete") and layer.get("total"):
+            layer["current"] = layer["total"]
+      pull["status"] = "complete"
+    except docker.errors.ImageNotFound:
+      pull.update({"status": "failed", "error": "image not found to pull", "code": 404})
+    except docker.errors.NotFound:
+      pull.update({"status": "failed", "error": "image not found to pull", "code": 404})
+    except docker.errors.APIError as e:
+      pull.update({"status": "failed", "error": f"docker api error: {e.explanation}", "code": 500})
+    except Exception as e:
+      pull.update({"status": "failed", "error": str(e), "code": 500})
+    finally:
+      with _pulls_lock:
+        _pulls.pop(key, None)
+      pull["done"].set()
+  if pull["error"]:
+    raise _UpdateError(pull["error"], pull["code"] or 500)
+
+def _update_image_ref(container) -> Optional[str]:
+  image_ref = (container.attrs.get("Config", {}) or {}).get("Image")
+  if image_ref and "@sha256:" in image_ref:
+    image_ref = image_ref.split("@")[0] + ":latest"
+  if not image_ref:
+    image_ref = _image_meta_for(container)["image_ref"]
+  return image_ref
+
+UPDATE_SWAP = _truthy(os.getenv("UPDATE_SWAP", "false"))
+_update_downtimes = {}
+_update_downtime_totals = {"count": 0, "seconds": 0.0, "max": 0.0, "rollbacks": 0}
+
+def _record_downtime(name: str, seconds: float, mode: str, image_ref: str):
+  _update_downtimes[name] = {"seconds": round(seconds, 3), "mode": mode, "image": image_ref, "ts": time.time()}
+  _update_downtime_totals["count"] += 1
+  _update_downtime_totals["seconds"] += seconds
+  _update_downtime_totals["max"] = max(_update_downtime_totals["max"], seconds)
+  if mode == "rollback":
+    _update_downtime_totals["rollbacks"] += 1
+
+def _is_special_network_mode(mode: Optional[str]) -> bool:
+  if not mode: return False
+  m = str(mode).lower()
+  return m.startswith("container:") or m in ("host", "none")
+
+def _recreate_spec(container, name: str) -> dict:
+  attrs = container.attrs
+  config = attrs.get('Config', {}) or {}
+  host_config = attrs.get('HostConfig', {}) or {}
+  nets_cfg = (attrs.get('NetworkSettings', {}) or {}).get('Networks', {}) or {}
+  restart_policy = (host_config.get('RestartPolicy') or {}).get('Name')
+  network_mode = host_config.get('NetworkMode') or None
+  networks_to_connect, static_networks = {}, set()
+  for net_name, params in nets_cfg.items():
+    if not isinstance(params, dict): continue
+    ipam = params.get("IPAMConfig") or {}
+    if ipam.get("IPv4Address") or ipam.get("IPv6Address"):
+      static_networks.add(net_name)
+    networks_to_connect[net_name] = {
+      "aliases": params.get("Aliases"),
+      "links": params.get("Links"),
+      "ipv4_address": (ipam.get("IPv4Address") or params.get("IPAddress")),
+      "ipv6_address": ipam.get("IPv6Address"),
+      "link_local_ips": ipam.get("LinkLocalIPs"),
+    }
+  return {
+    "name": attrs.get('Name', '').lstrip('/') or name,
+    "create": {
+      "command": config.get('Cmd') or None, "environment": config.get('Env') or None,
+      "entrypoint": config.get('Entrypoint') or None, "working_dir": config.get('WorkingDir') or None,
+      "user": config.get('User') or None, "labels": config.get('Labels') or None,
+    },
+    "host": {
+      "binds": host_config.get('Binds') or None, "port_bindings": host_config.get('PortBindings') or None,
+      "restart_policy": {"Name": restart_policy} if restart_policy else None,
+      "network_mode": network_mode,
+    },
+    "networks": {} if _is_special_network_mode(network_mode) else networks_to_connect,
+    "static_networks": static_networks,
+  }
+
+def _connect_networks(cli, new_id: str, spec: dict, networks: dict):
+  for net_name, kw in networks.items():
+    try:
+      cli.api.connect_container_to_network(new_id, net_name, **kw)
+    except Exception as e:
+      app.logger.info("network connect failed on %s -> %s: %s", spec["name"], net_name, e)
+
+def _recreate_container(container, image_ref: str, name: str):
+  spec = _recreate_spec(container, name)
+  cli = _host_client(_host_of(container))
+  if UPDATE_SWAP:
+    return _swap_container(cli, container, image_ref, spec, name)
+  t0 = time.time()
+  try: container.stop(timeout=10)
+  except Exception: pass
+  try: container.remove()
+  except Exception: pass
+  hc = cli.api.create_host_config(**spec["host"])
+  new_id = cli.api.create_container(image=image_ref, name=spec["name"], host_config=hc, **spec["create"])["Id"]
+  _connect_networks(cli, new_id, spec, spec["networks"])
+  cli.api.start(new_id)
+  _record_downtime(name, time.time() - t0, "recreate", image_ref)
+  return new_id
+
+def _swap_container(cli, container, image_ref: str, spec: dict, label: str):
+  name = spec["name"]
+  suffix = secrets.token_hex(3)
+  hc = cli.api.create_host_config(**spec["host"])
+  new_id = cli.api.create_container(image=image_ref, name=f"{name}-update-{suffix}", host_config=hc, **spec["create"])["Id"]
+  static = {n: kw for n, kw in spec["networks"].items() if n in spec["static_networks"]}
+  _connect_networks(cli, new_id, spec, {n: dict(kw, ipv4_address=None) for n, kw in spec["networks"].items() if n not in static})
+  t0 = time.time()
+  try: container.stop(timeout=10)
+  except Exception: pass
+  try:
+    container.rename(f"{name}-old-{suffix}")
+    _connect_networks(cli, new_id, spec, static)
+    cli.api.rename(new_id, name)
+    cli.api.start(new_id)
+  except Exception as e:
+    app.logger.info("swap of %s failed, restoring the previous container: %s", name, e)
+    try: cli.api.remove_container(new_id, force=True)
+    except Exception: pass
+    try:
+      container.rename(name)
+      container.start()
+    except Exception as e2:
+      app.logger.info("rollback of %s failed: %s", name, e2)
+    _record_downtime(label, time.time() - t0, "rollback", image_ref)
+    raise _UpdateError(f"swap failed, previous container restored: {e}", 500)
+  _record_downtime(label, time.time() - t0, "swap", image_ref)
+  try: container.remove()
+  except Exception as e:
+    app.logger.info("failed to remove previous container of %s: %s", name, e)
+  return new_id
+
+PREPULL_ENABLED = _truthy(os.getenv("PREPULL_ENABLED", "false"))
+_prepull_pool = ThreadPoolExecutor(max_workers=max(1, int(os.getenv("PREPULL_CONCURRENCY", "1"))), thread_name_prefix="prepull")
+_prepulls = {}
+_prepulls_lock = threading.Lock()
+
+def _prepull_run(image_ref: str, host: str, entry: dict):
+  entry["state"] = "pulling"
+  try:
+    _pull_image_shared(image_ref, host=host)
+    entry.update({"state": "complete", "ts": time.time()})
+  except _UpdateError as e:
+    entry.update({"state": "failed", "error": str(e), "ts": time.time()})
+
+def _prepull_schedule(image_ref: str, remote_digest: str, host: Optional[str] = None):
+  digest, key = _digest_only(remote_digest), (host or PRIMARY_HOST, image_ref)
+  with _prepulls_lock:
+    entry = _prepulls.get(key)
+    if entry and entry["digest"] == digest and (entry["state"] != "failed" or time.time() - entry["ts"] < NEGATIVE_CACHE_TTL):
+      return
+    entry = _prepulls[key] = {"digest": digest, "state": "queued", "ts": time.time(), "error": None}
+  _prepull_pool.submit(_prepull_run, image_ref, key[0], entry)
+
+def _prepull_ready(image_ref: str, host: Optional[str] = None) -> bool:
+  host = host or PRIMARY_HOST
+  entry = _prepulls.get((host, image_ref))
+  if not entry or entry["state"] != "complete":
+    return False
+  cached = _pull_cache.get(image_ref) or {}
+  if _digest_only(cached.get("digest") or "") != entry["digest"]:
+    return False
+  try:
+    local = _host_client(host).api.inspect_image(image_ref).get("RepoDigests") or []
+  except Exception:
+    return False
+  return any(_digest_only(d) == entry["digest"] for d in local)
+
+def _ensure_image(image_ref: str, job: Optional[dict] = None, host: Optional[str] = None) -> str:
+  if _prepull_ready(image_ref, host):
+    return "prestaged"
+  _pull_image_shared(image_ref, job, host)
+  return "pulled"
+
+def _run_update_job(job: dict):
+  name = job["name"]
+  job.update({"state": "running", "phase": "checking", "started": time.time()})
+  try:
+    try:
+      container = _get_container(name)
+    except docker.errors.NotFound:
+      raise _UpdateError("container not found", 404)
+    if not job.get("skip_check"):
+      try:
+        status = _resolve_update_statuses([container], force=True).get(container.name)
+        if status == "up_to_date":
+          job.update({"state": "succeeded", "phase": "done", "result": {"message": "already up to date", "updated": False}})
+          return
+      except Exception as e:
+        app.logger.info("failed to pre-check update for %s: %s", name, e)
+    image_ref = job.get("image") or _update_image_ref(container)
+    if not image_ref:
+      raise _UpdateError("cannot determine image reference for update", 400)
+    job.update({"phase": "pulling", "image": image_ref})
+    image_source = _ensure_image(image_ref, job, _host_of(container))
+    job["phase"] = "recreating"
+    new_id = _recreate_container(container, image_ref, name)
+    downtime = (_update_downtimes.get(name) or {}).get("seconds")
+    job.update({"state": "succeeded", "phase": "done", "result": {"message": "container recreated with latest image", "updated": True, "id": new_id, "image_source": image_source, "downtime": downtime}})
+  except _UpdateError as e:
+    job.update({"state": "failed", "phase": "done", "error": str(e), "code": e.code})
+  except docker.errors.APIError as e:
+    job.update({"state": "failed", "phase": "done", "error": f"docker api error: {e.explanation}", "code": 500})
+  except Exception as e:
+    job.update({"state": "failed", "phase": "done", "error": str(e), "code": 500})
+  finally:
+    _disk_invalidate(_split_host(name)[0])
+    job["finished"] = time.time()
+    _release_container(name, job)
+    job["done"].set()
+
+def submit_update_job(name: str, **fields):
+  with _jobs_lock:
+    owner = _jobs.get(_jobs_by_container.get(name))
+    if owner is not None and not owner["finished"]:
+      return owner, False
+    job = _new_job("update", name=name, **fields)
+    _jobs_by_container[name] = job["id"]
+  _update_pool.submit(_run_update_job, job)
+  return job, True
+
+BULK_UPDATE_PARALLELISM = max(1, int(os.getenv("BULK_UPDATE_PARALLELISM", "2")))
+BULK_PULL_PARALLELISM = max(1, int(os.getenv("BULK_PULL_PARALLELISM", "4")))
+_bulk_state = {"job_id": None}
+
+def _container_dependencies(container, names, by_id) -> set:
+  host_config = container.attrs.get("HostConfig", {}) or {}
+  deps = set()
+  mode = str(host_config.get("NetworkMode") or "")
+  if mode.startswith("container:"):
+    deps.add(mode.split(":", 1)[1])
+  for link in host_config.get("Links") or []:
+    deps.add(str(link).split(":", 1)[0].lstrip("/"))
+  host = _host_of(container)
+  prefix = "" if host == PRIMARY_HOST else f"{host}/"
+  deps = {by_id.get(d) or prefix + d for d in deps}
+  return {d for d in deps if d in names and d != container.name}
+
+def _recreate_waves(containers) -> list:
+  pending = {c.name: c for c in containers}
+  by_id = {c.id: c.name for c in containers}
+  deps = {name: _container_dependencies(c, set(pending), by_id) for name, c in pending.items()}
+  waves, done = [], set()
+  while pending:
+    ready = sorted(n for n in pending if deps[n] <= done) or sorted(pending)
+    waves.append([pending.pop(n) for n in ready])
+    done.update(ready)
+  return waves
+
+def _run_bulk_update_job(job: dict):
+  job.update({"state": "running", "phase": "checking", "started": time.time()})
+  report = {"containers": {}, "images": {}}
+  job["result"] = report
+  claimed = []
+  try:
+    candidates = []
+    self_name = _self_name()
+    for name in job["names"]:
+      if self_name and name == self_name:
+        report["containers"][name] = {"status": "skipped", "error": "self_update_blocked"}
+        continue
+      try:
+        candidates.append(_get_container(name))
+      except docker.errors.NotFound:
+        report["containers"][name] = {"status": "failed", "error": "container not found"}
+    statuses = _resolve_update_statuses(candidates, force=True)
+    targets = {}
+    for c in candidates:
+      st = statuses.get(c.name)
+      if st == "up_to_date" or (job["only_available"] and st != "update_available"):
+        report["containers"][c.name] = {"status": "up_to_date" if st == "up_to_date" else "skipped", "check": st}
+        continue
+      image_ref = _update_image_ref(c)
+      if not image_ref:
+        report["containers"][c.name] = {"status": "failed", "error": "cannot determine image reference for update"}
+        continue
+      owner = _claim_container(c.name, job)
+      if owner is not None:
+        report["containers"][c.name] = {"status": "skipped", "error": "update_in_progress", "job_id": owner["id"]}
+        continue
+      claimed.append(c.name)
+      targets[c.name] = (c, image_ref, image_ref if _host_of(c) == PRIMARY_HOST else f"{_host_of(c)}/{image_ref}")
+    job["phase"] = "pulling"
+    refs = sorted({(_host_of(c), ref, key) for c, ref, key in targets.values()})
+    with ThreadPoolExecutor(max_workers=min(BULK_PULL_PARALLELISM, max(1, len(refs))), thread_name_prefix="bulk-pull") as pool:
+      futures = {key: pool.submit(_ensure_image, ref, None, host) for host, ref, key in refs}
+      for ref, f in futures.items():
+        try:
+          report["images"][ref] = {"status": f.result()}
+        except _UpdateError as e:
+          report["images"][ref] = {"status": "failed", "error": str(e)}
+    job["phase"] = "recreating"
+    def _recreate(c, image_ref):
+      t0, name = time.time(), c.name
+      try:
+        new_id = _recreate_container(c, image_ref, name)
+        return {"status": "updated", "image": image_ref, "id": new_id, "seconds": round(time.time() - t0, 2), "downtime": (_update_downtimes.get(name) or {}).get("seconds")}
+      except docker.errors.APIError as e:
+        return {"status": "failed", "image": image_ref, "error": f"docker api error: {e.explanation}"}
+      except Exception as e:
+        return {"status": "failed", "image": image_ref, "error": str(e)}
+    ready = []
+    for name, (c, ref, key) in targets.items():
+      if report["images"][key]["status"] == "failed":
+        report["containers"][name] = {"status": "failed", "image": ref, "error": report["images"][key].get("error")}
+      else:
+        ready.append(c)
+    with ThreadPoolExecutor(max_workers=job["parallelism"], thread_name_prefix="bulk-recreate") as pool:
+      for wave in _recreate_waves(ready):
+        futures = {c.name: pool.submit(_recreate, c, targets[c.name][1]) for c in wave}
+        for name, f in futures.items():
+          report["containers"][name] = f.result()
+    summary = {}
+    for entry in report["containers"].values():
+      summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+    report["summary"] = summary
+    job.update({"state": "failed" if summary.get("failed") else "succeeded", "phase": "done"})
+  except Exception as e:
+    job.update({"state": "failed", "phase": "done", "error": str(e), "code": 500})
+  finally:
+    _disk_invalidate()
+    job["finished"] = time.time()
+    for name in claimed:
+      _release_container(name, job)
+    report["seconds"] = round(job["finished"] - job["started"], 2)
+    job["done"].set()
+
+@app.post("/update_containers")
+def update_containers():
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  data = request.get_json(silent=True) or {}
+  names = data.get("names")
+  only_available = _truthy(data.get("all")) or names == "update_available"
+  if only_available:
+    names = [c.name for c in _list_all_containers()[0]]
+  if not isinstance(names, list) or not names:
+    return jsonify({"error": "Missing 'names' list or 'all': true"}), 400
+  parallelism = data.get("parallelism")
+  if parallelism is None:
+    parallelism = BULK_UPDATE_PARALLELISM
+  elif isinstance(parallelism, bool) or not (isinstance(parallelism, int) or (isinstance(parallelism, str) and parallelism.strip().isdigit())):
+    return jsonify({"error": "'parallelism' must be an integer"}), 400
+  parallelism = min(BULK_UPDATE_PARALLELISM, max(1, int(parallelism)))
+  with _jobs_lock:
+    running = _jobs.get(_bulk_state["job_id"])
+    if running is not None and not running["finished"]:
+      return jsonify({"error": "bulk_update_in_progress", "job_id": running["id"], "status_url": f"/jobs/{running['id']}"}), 409
+    job = _new_job("bulk_update", names=sorted({str(n) for n in names}), only_available=only_available, parallelism=parallelism)
+    _bulk_state["job_id"] = job["id"]
+  threading.Thread(target=_run_bulk_update_job, args=(job,), daemon=True, name=f"bulk-{job['id']}").start()
+  if not (_truthy(data.get("wait")) or _truthy(request.args.get("wait", ""))):
+    return jsonify({"job_id": job["id"], "state": job["state"], "status_url": f"/jobs/{job['id']}"}), 202
+  job["done"].wait()
+  return jsonify(_job_view(job)), (job["code"] or 200) if job["error"] else 200
+
 @app.post("/update_container")
 def update_container():
   if not _check_auth():
@@ -541,118 +2586,461 @@ def update_container():
   name = data.get("name")
   if not name:
     return jsonify({"error": "Missing 'name'"}), 400
-  if SELF_CONTAINER_NAME and name == SELF_CONTAINER_NAME:
+  if data.get("host") and data["host"] != PRIMARY_HOST and "/" not in name:
+    name = f"{data['host']}/{name}"
+  name = _host_arg(name)
+  self_name = _self_name()
+  if self_name and name == self_name:
     return jsonify({"error": "self_update_blocked","message": "Ce service ne peut pas se mettre à jour lui-même via l’API. Mettez à jour le conteneur 'docker-monitor' depuis Portainer/Docker."}), 409
   try:
-    container = client.containers.get(name)
+    container = _get_container(name)
   except docker.errors.NotFound:
     return jsonify({"error": "container not found"}), 404
   except Exception as e:
     return jsonify({"error": str(e)}), 500
-  try:
-    updates, _ = check_updates_for_containers([container], force=True)
-    status = updates.get(container.name)
-    if status == "up_to_date":
-      return jsonify({"message": "already up to date", "updated": False}), 200
-  except Exception as e:
-    app.logger.info("failed to pre-check update for %s: %s", name, e)
-  try:
-    image_ref = (container.attrs.get("Config", {}) or {}).get("Image")
-    if image_ref and "@sha256:" in image_ref:
-      image_ref = image_ref.split("@")[0] + ":latest"
-    if not image_ref:
-      image_ref = container.image.tags[0] if container.image.tags else None
-    if not image_ref:
-      repo_digests = (container.image.attrs or {}).get("RepoDigests") or []
-      if repo_digests:
-        repo = repo_digests[0].split("@")[0]
-        image_ref = f"{repo}:latest"
-    if not image_ref:
-      return jsonify({"error": "cannot determine image reference for update"}), 400
-  except Exception as e:
-    return jsonify({"error": str(e)}), 500
-  try:
-    client.images.pull(image_ref)
-  except docker.errors.ImageNotFound:
-    return jsonify({"error": "image not found to pull"}), 404
-  except docker.errors.APIError as e:
-    return jsonify({"error": f"docker api error: {e.explanation}"}), 500
-  except Exception as e:
-    return jsonify({"error": str(e)}), 500
-  try:
-    attrs = container.attrs
-    config = attrs.get('Config', {}) or {}
-    host_config = attrs.get('HostConfig', {}) or {}
-    nets_cfg = (attrs.get('NetworkSettings', {}) or {}).get('Networks', {}) or {}
-    env = config.get('Env') or None
-    cmd = config.get('Cmd') or None
-    entrypoint = config.get('Entrypoint') or None
-    name_current = attrs.get('Name', '').lstrip('/') or name
-    labels = config.get('Labels') or None
-    working_dir = config.get('WorkingDir') or None
-    user = config.get('User') or None
-    port_bindings = host_config.get('PortBindings') or None
-    binds = host_config.get('Binds') or None
-    restart_policy = (host_config.get('RestartPolicy') or {}).get('Name')
-    network_mode = host_config.get('NetworkMode') or None
-    networks_to_connect = {}
-    for net_name, params in nets_cfg.items():
-      if not isinstance(params, dict): continue
-      ipam = params.get("IPAMConfig") or {}
-      networks_to_connect[net_name] = {
-        "aliases": params.get("Aliases"),
-        "links": params.get("Links"),
-        "ipv4_address": (ipam.get("IPv4Address") or params.get("IPAddress")),
-        "ipv6_address": ipam.get("IPv6Address"),
-        "link_local_ips": ipam.get("LinkLocalIPs"),
-      }
-    try: container.stop(timeout=10)
-    except Exception: pass
-    try: container.remove()
-    except Exception: pass
-    hc = client.api.create_host_config(
-      binds=binds, port_bindings=port_bindings,
-      restart_policy={"Name": restart_policy} if restart_policy else None,
-      network_mode=network_mode,
-    )
-    new_id = client.api.create_container(
-      image=image_ref, name=name_current, command=cmd, environment=env,
-      entrypoint=entrypoint, host_config=hc, working_dir=working_dir, user=user, labels=labels,
-    )["Id"]
-    def _is_special_network_mode(mode: Optional[str]) -> bool:
-      if not mode: return False
-      m = str(mode).lower()
-      return m.startswith("container:") or m in ("host", "none")
-    if not _is_special_network_mode(network_mode):
-      for net_name, kw in networks_to_connect.items():
-        try:
-          client.api.connect_container_to_network(
-            new_id, net_name,
-            aliases=kw.get("aliases"), links=kw.get("links"),
-            ipv4_address=kw.get("ipv4_address"), ipv6_address=kw.get("ipv6_address"),
-            link_local_ips=kw.get("link_local_ips")
-          )
-        except Exception as e:
-          app.logger.info("network connect failed on %s -> %s: %s", name_current, net_name, e)
-    client.api.start(new_id)
-    return jsonify({"message": "container recreated with latest image", "updated": True})
-  except docker.errors.APIError as e:
-    return jsonify({"error": f"docker api error: {e.explanation}"}), 500
-  except Exception as e:
-    return jsonify({"error": str(e)}), 500
+  job, created = submit_update_job(container.name)
+  if job["type"] != "update":
+    return jsonify({"error": "update_in_progress", "job_id": job["id"], "status_url": f"/jobs/{job['id']}"}), 409
+  if not (_truthy(data.get("wait")) or _truthy(request.args.get("wait", ""))):
+    return jsonify({"job_id": job["id"], "state": job["state"], "status_url": f"/jobs/{job['id']}", "existing": not created}), 202
+  job["done"].wait()
+  if job["state"] == "failed":
+    return jsonify({"error": job["error"], "job_id": job["id"]}), job["code"] or 500
+  return jsonify(dict(job["result"], job_id=job["id"]))
+
+@app.get("/jobs")
+def jobs_list():
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  with _jobs_lock:
+    jobs = sorted(_jobs.values(), key=lambda j: j["created"], reverse=True)
+  return jsonify({"jobs": [_job_view(j) for j in jobs]})
+
+@app.get("/jobs/<job_id>")
+def job_get(job_id):
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  job = _jobs.get(job_id)
+  if job is None:
+    return jsonify({"error": "not_found"}), 404
+  return jsonify(_job_view(job))
+
+@app.get("/jobs/<job_id>/stream")
+def job_stream(job_id):
+  if not _check_auth():
+    return jsonify({"error": "unauthorized"}), 401
+  job = _jobs.get(job_id)
+  if job is None:
+    return jsonify({"error": "not_found"}), 404
+  def gen():
+    last = None
+    while True:
+      done = job["done"].wait(0.5)
+      view = json.dumps(_job_view(job), separators=(",", ":"), default=str)
+      if view != last:
+        last = view
+        yield f"event: job\ndata: {view}\n\n"
+      if done:
+        yield "event: end\ndata: {}\n\n"
+        break
+  return app.response_class(stream_with_context(gen()), content_type="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+REFRESH_MUTABLE_INTERVAL = max(60, int(os.getenv("REFRESH_MUTABLE_INTERVAL", "900")))
+REFRESH_INTERVAL = max(60, int(os.getenv("REFRESH_INTERVAL", str(CACHE_TTL))))
+REFRESH_PINNED_INTERVAL = max(60, int(os.getenv("REFRESH_PINNED_INTERVAL", "21600")))
+REFRESH_JITTER = min(0.5, max(0.0, float(os.getenv("REFRESH_JITTER", "0.1"))))
+_REFRESH_SYNC_INTERVAL = 60
+_REFRESH_RECENT_CHANGE = 86400
+_MUTABLE_TAGS = {"latest", "stable", "edge", "main", "master", "nightly", "dev", "develop", "beta", "rc", "release", "lts"}
+_refresh_heap = []
+_refresh_state = {}
+_refresh_lock = threading.Lock()
+_refresh_wakeup = threading.Event()
+_refresh_flags = {"seq": 0, "resync": True}
+_refresh_counters = {"refreshes": 0, "changes": 0, "errors": 0, "deferred": 0}
+
+def _tag_kind(image_ref: str):
+  tag = _split_repo_tag(image_ref)[1]
+  if tag in _MUTABLE_TAGS or not re.search(r"\d", tag):
+    return "mutable", REFRESH_MUTABLE_INTERVAL
+  if re.match(r"^v?\d+\.\d+\.\d+", tag):
+    return "pinned", REFRESH_PINNED_INTERVAL
+  return "floating", REFRESH_INTERVAL
+
+def _refresh_interval(image_ref: str, st: dict) -> float:
+  kind, interval = _tag_kind(image_ref)
+  if st.get("changed") and time.time() - st["changed"] < _REFRESH_RECENT_CHANGE:
+    interval = max(60, interval / 2)
+  return interval
+
+def _jitter(seconds: float) -> float:
+  return seconds * (1 + random.uniform(-REFRESH_JITTER, REFRESH_JITTER))
+
+def _refresh_schedule(image_ref: str, due: float):
+  st = _refresh_state[image_ref]
+  st["due"] = due
+  _refresh_flags["seq"] += 1
+  heapq.heappush(_refresh_heap, (due, _refresh_flags["seq"], image_ref))
+
+def _refresh_sync(refs: set, now: float):
+  _ensure_pull_cache_loaded()
+  with _refresh_lock:
+    for ref in refs - set(_refresh_state):
+      st = _refresh_state[ref] = {"due": None, "errors": 0, "changed": None, "last": None, "kind": _tag_kind(ref)[0]}
+      entry = _pull_cache.get(ref)
+      if entry and entry.get("digest"):
+        _refresh_schedule(ref, max(now, entry["ts"] + _jitter(_refresh_interval(ref, st))))
+      else:
+        _refresh_schedule(ref, now)
+    for ref in set(_refresh_state) - refs:
+      del _refresh_state[ref]
+
+def _refresh_one(image_ref: str):
+  st = _refresh_state.get(image_ref)
+  if st is None:
+    return
+  prev = (_pull_cache.get(image_ref) or {}).get("digest")
+  interval = _refresh_interval(image_ref, st)
+  started = time.time()
+  digest = fetch_remote_digest_cached(image_ref, force=True, ttl=interval * (1 + REFRESH_JITTER) + _REFRESH_SYNC_INTERVAL, keep_on_error=True)
+  now = time.time()
+  ok = (_pull_cache.get(image_ref) or {}).get("ts", 0) >= started and digest
+  _refresh_counters["refreshes"] += 1
+  with _refresh_lock:
+    if image_ref not in _refresh_state:
+      return
+    st["last"] = now
+    if not ok:
+      st["errors"] += 1
+      _refresh_counters["errors"] += 1
+      _refresh_schedule(image_ref, now + min(60 * 2 ** (st["errors"] - 1), REFRESH_PINNED_INTERVAL))
+      return
+    st["errors"] = 0
+    if prev and digest != prev:
+      st["changed"] = now
+      _refresh_counters["changes"] += 1
+    _refresh_schedule(image_ref, now + _jitter(_refresh_interval(image_ref, st)))
+
+def _refresh_due(now: float) -> list:
+  due, spend = [], {}
+  with _refresh_lock:
+    while _refresh_heap and _refresh_heap[0][0] <= now:
+      at, _, ref = heapq.heappop(_refresh_heap)
+      st = _refresh_state.get(ref)
+      if st is None or st["due"] != at:
+        continue
+      registry = _registry_for_ref(ref)
+      ok, retry_at = _registry_available(registry, REFRESH_RESERVE)
+      left = _registry_budget_left(registry)
+      cost = (_pull_cache.get(ref) or {}).get("requests") or 2
+      if ok and left is not None and spend.get(registry, 0) + cost > left:
+        ok, retry_at = False, now + 300
+      if not ok:
+        _refresh_counters["deferred"] += 1
+        _refresh_schedule(ref, retry_at + random.uniform(0, 30))
+        continue
+      spend[registry] = spend.get(registry, 0) + cost
+      due.append(ref)
+  return due
+
+def digest_refresh_scheduler():
+  _wait_inventory()
+  next_sync = 0.0
+  while True:
+    now = time.time()
+    if now >= next_sync or _refresh_flags["resync"]:
+      _refresh_flags["resync"] = False
+      try:
+        _refresh_sync({r for r in (_image_meta_for(c)["image_ref"] for c in _list_all_containers()[0]) if r}, now)
+      except Exception as e:
+        logging.info("digest refresh sync error: %s", e)
+      next_sync = now + _REFRESH_SYNC_INTERVAL
+    due = _refresh_due(now)
+    if due:
+      wait([_registry_pool.submit(_refresh_one, ref) for ref in due])
+      _save_pull_cache_to_disk()
+    _startup_mark("digests")
+    with _refresh_lock:
+      next_due = _refresh_heap[0][0] if _refresh_heap else next_sync
+    _refresh_wakeup.wait(timeout=max(0.5, min(next_due, next_sync) - time.time()))
+    _refresh_wakeup.clear()
+
+def _refresh_on_inventory(kind, action, ident):
+  if kind == "container" and action in ("create", "destroy", "rename") or kind == "image" and action in ("tag", "untag", "pull"):
+    _refresh_flags["resync"] = True
+    _refresh_wakeup.set()
+
+def _refresh_view() -> dict:
+  now = time.time()
+  with _refresh_lock:
+    refs = {ref: {"kind": st["kind"], "due_in": round(st["due"] - now, 1) if st["due"] else None, "errors": st["errors"],
+                  "changed": st["changed"], "last": st["last"]} for ref, st in _refresh_state.items()}
+  with _registry_limits_lock:
+    limits = {r: dict(l) for r, l in _registry_limits.items()}
+  budget = {r: {"used_last_hour": REGISTRY_HOURLY_BUDGET - left, "left": left} for r in list(_registry_usage) for left in [_registry_budget_left(r)] if left is not None}
+  return {"counters": dict(_refresh_counters), "queue": len(_refresh_heap), "refs": refs, "limits": limits, "budget": budget, "hourly_budget": REGISTRY_HOURLY_BUDGET}
+
+def _parse_mqtt_thresholds(raw: str) -> dict:
+  thresholds = {}
+  for part in (raw or "").split(","):
+    key, _, n = part.strip().partition("=")
+    try:
+      if key.strip():
+        thresholds[key.strip()] = max(0.0, float(n))
+    except ValueError:
+      logging.warning("ignoring invalid MQTT_THRESHOLDS entry: %r", part)
+  return thresholds
+
+MQTT_HOST = os.getenv("MQTT_HOST", "").strip()
+MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
+MQTT_USERNAME = os.getenv("MQTT_USERNAME") or None
+MQTT_PASSWORD = os.getenv("MQTT_PASSWORD") or None
+MQTT_CLIENT_ID = os.getenv("MQTT_CLIENT_ID") or f"docker-monitor-{socket.gethostname()}"
+MQTT_BASE_TOPIC = os.getenv("MQTT_BASE_TOPIC", "docker_monitor").strip("/")
+MQTT_DISCOVERY_PREFIX = os.getenv("MQTT_DISCOVERY_PREFIX", "homeassistant").strip("/")
+MQTT_INTERVAL = max(1.0, float(os.getenv("MQTT_INTERVAL", "5")))
+MQTT_KEEPALIVE = max(5, int(os.getenv("MQTT_KEEPALIVE", "60")))
+MQTT_QUEUE_MAX = max(10, int(os.getenv("MQTT_QUEUE_MAX", "1000")))
+MQTT_THRESHOLDS = _parse_mqtt_thresholds(os.getenv("MQTT_THRESHOLDS", "cpu=5,mem_perc=2,mem_usage=16777216"))
+_MQTT_BATCH = 100
+_MQTT_CONNACK_ERRORS = {1: "unacceptable protocol version", 2: "client id rejected", 3: "server unavailable", 4: "bad username or password", 5: "not authorized"}
+
+def _mqtt_str(s) -> bytes:
+  b = s.encode("utf-8") if isinstance(s, str) else s
+  return len(b).to_bytes(2, "big") + b
 
-def warm_remote_digest_cache():
+def _mqtt_packet(kind: int, body: bytes) -> bytes:
+  head, n = bytearray([kind]), len(body)
   while True:
+    n, byte = divmod(n, 128)
+    head.append(byte | (0x80 if n else 0))
+    if not n:
+      return bytes(head) + body
+
+class _MqttClient:
+  def __init__(self, host: str, port: int, client_id: str, *, username=None, password=None, keepalive: int = 60, will=None):
+    self.host, self.port, self.client_id = host, port, client_id
+    self.username, self.password, self.keepalive, self.will = username, password, keepalive, will
+    self.sock, self.last_out = None, 0.0
+
+  def connect(self, timeout: float = 10.0):
+    flags, payload = 0x02, _mqtt_str(self.client_id)
+    if self.will:
+      flags |= 0x04 | 0x20
+      payload += _mqtt_str(self.will[0]) + _mqtt_str(self.will[1])
+    if self.username is not None:
+      flags |= 0x80
+      payload += _mqtt_str(self.username)
+      if self.password is not None:
+        flags |= 0x40
+        payload += _mqtt_str(self.password)
+    sock = socket.create_connection((self.host, self.port), timeout=timeout)
     try:
-      for c in client.containers.list(all=True):
-        tags = (c.image.attrs.get("RepoTags") or c.image.tags or [])
-        if not tags: continue
-        fetch_remote_digest_cached(tags[0], force=False)
+      sock.sendall(_mqtt_packet(0x10, _mqtt_str("MQTT") + bytes([4, flags]) + self.keepalive.to_bytes(2, "big") + payload))
+      ack = b""
+      while len(ack) < 4:
+        chunk = sock.recv(4 - len(ack))
+        if not chunk:
+          raise ConnectionError("broker closed the connection before CONNACK")
+        ack += chunk
+      if ack[0] != 0x20:
+        raise ConnectionError(f"unexpected packet 0x{ack[0]:02x} instead of CONNACK")
+      if ack[3]:
+        raise ConnectionError(f"broker refused connection: {_MQTT_CONNACK_ERRORS.get(ack[3], ack[3])}")
+    except Exception:
+      sock.close()
+      raise
+    self.sock, self.last_out = sock, time.monotonic()
+
+  def publish_many(self, messages):
+    self.sock.sendall(b"".join(_mqtt_packet(0x30 | (1 if retain else 0), _mqtt_str(topic) + payload) for topic, payload, retain in messages))
+    self.last_out = time.monotonic()
+
+  def poll(self):
+    while select.select([self.sock], [], [], 0)[0]:
+      if not self.sock.recv(4096):
+        raise ConnectionError("broker closed the connection")
+    if time.monotonic() - self.last_out >= self.keepalive / 2:
+      self.sock.sendall(b"\xc0\x00")
+      self.last_out = time.monotonic()
+
+  def close(self):
+    if self.sock is not None:
+      try:
+        self.sock.close()
+      finally:
+        self.sock = None
+
+_mqtt_state = {"connected": False, "connected_at": None, "last_error": None, "names": set()}
+_mqtt_counters = {"published": 0, "bytes": 0, "batches": 0, "skipped": 0, "dropped": 0, "reconnects": 0}
+_mqtt_queue = {}
+_mqtt_sent = {}
+_mqtt_lock = threading.Lock()
+
+def _mqtt_slug(s: str) -> str:
+  return re.sub(r"[^A-Za-z0-9_-]+", "_", s).strip("_") or "_"
+
+def _mqtt_availability_topic() -> str:
+  return f"{MQTT_BASE_TOPIC}/status"
+
+def _mqtt_state_topic(name: str) -> str:
+  return f"{MQTT_BASE_TOPIC}/{_mqtt_slug(name)}/state"
+
+def _mqtt_discovery(name: str) -> dict:
+  if not MQTT_DISCOVERY_PREFIX:
+    return {}
+  node, slug, state = _mqtt_slug(MQTT_CLIENT_ID), _mqtt_slug(name), _mqtt_state_topic(name)
+  device = {"identifiers": [f"{node}_{slug}"], "name": name, "manufacturer": "Docker", "model": "container"}
+  entities = [
+    ("binary_sensor", "update", {"name": "Update available", "device_class": "update", "value_template": "{{ 'ON' if value_json.update == 'update_available' else 'OFF' }}",
+                                 "json_attributes_topic": state, "json_attributes_template": "{{ {'status': value_json.update, 'image': value_json.image} | tojson }}"}),
+    ("sensor", "state", {"name": "State", "icon": "mdi:docker", "value_template": "{{ value_json.state }}"}),
+  ]
+  if (STATS_STREAM_ENABLED and STATS_STREAM_MAX) or _cgroup_version:
+    entities += [
+      ("sensor", "cpu", {"name": "CPU", "unit_of_measurement": "%", "state_class": "measurement", "value_template": "{{ value_json.cpu }}"}),
+      ("sensor", "memory", {"name": "Memory", "unit_of_measurement": "%", "state_class": "measurement", "value_template": "{{ value_json.mem_perc }}"}),
+      ("sensor", "memory_usage", {"name": "Memory usage", "unit_of_measurement": "B", "device_class": "data_size", "state_class": "measurement",
+                                  "value_template": "{{ value_json.mem_usage }}"}),
+    ]
+  return {f"{MQTT_DISCOVERY_PREFIX}/{component}/{node}/{slug}_{key}/config":
+          dict(cfg, unique_id=f"{node}_{slug}_{key}", state_topic=state, availability_topic=_mqtt_availability_topic(), device=device)
+          for component, key, cfg in entities}
+
+def _mqtt_changed(old, new) -> bool:
+  if old is None or set(old) != set(new):
+    return True
+  for k, v in new.items():
+    o, limit = old[k], MQTT_THRESHOLDS.get(k)
+    if limit is not None and isinstance(v, (int, float)) and isinstance(o, (int, float)):
+      if abs(v - o) >= limit and v != o:
+        return True
+    elif v != o:
+      return True
+  return False
+
+def _mqtt_enqueue(topic: str, payload: bytes, retain: bool = True):
+  with _mqtt_lock:
+    _mqtt_queue.pop(topic, None)
+    if len(_mqtt_queue) >= MQTT_QUEUE_MAX:
+      oldest = next(iter(_mqtt_queue))
+      _mqtt_queue.pop(oldest)
+      _mqtt_sent.pop(oldest, None)
+      _mqtt_counters["dropped"] += 1
+    _mqtt_queue[topic] = (payload, retain)
+
+def _mqtt_offer(topic: str, value: dict):
+  with _mqtt_lock:
+    if not _mqtt_changed(_mqtt_sent.get(topic), value):
+      _mqtt_counters["skipped"] += 1
+      return
+    _mqtt_sent[topic] = value
+  _mqtt_enqueue(topic, json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+
+def _mqtt_collect():
+  snap = _status_snapshot(True)
+  now = time.time()
+  names = set(snap["updates"])
+  for name in names:
+    for topic, cfg in _mqtt_discovery(name).items():
+      _mqtt_offer(topic, cfg)
+    meta, live = snap["meta"].get(name) or {}, _stats_latest.get(name)
+    stats = live["meta"] if live and now - live["ts"] <= _STATS_STREAM_MAX_AGE else {}
+    cpu, mem_perc = stats.get("cpu"), stats.get("mem_perc")
+    _mqtt_offer(_mqtt_state_topic(name), {
+      "update": snap["updates"][name], "state": meta.get("state"), "image": meta.get("image"),
+      "cpu": None if cpu is None else round(cpu, 1), "mem_perc": None if mem_perc is None else round(mem_perc, 1), "mem_usage": stats.get("mem_usage"),
+    })
+  for name in _mqtt_state["names"] - names:
+    if _split_host(name)[0] in snap["errors"]:
+      names.add(name)
+      continue
+    for topic in [_mqtt_state_topic(name), *_mqtt_discovery(name)]:
+      with _mqtt_lock:
+        known = _mqtt_sent.pop(topic, None) is not None
+      if known:
+        _mqtt_enqueue(topic, b"")
+  _mqtt_state["names"] = names
+
+def _mqtt_flush(cli: _MqttClient):
+  with _mqtt_lock:
+    batch = list(_mqtt_queue.items())
+    _mqtt_queue.clear()
+  for i in range(0, len(batch), _MQTT_BATCH):
+    chunk = batch[i:i + _MQTT_BATCH]
+    try:
+      cli.publish_many([(topic, payload, retain) for topic, (payload, retain) in chunk])
+    except Exception:
+      with _mqtt_lock:
+        for topic, msg in batch[i:]:
+          _mqtt_queue.setdefault(topic, msg)
+      raise
+    _mqtt_counters["published"] += len(chunk)
+    _mqtt_counters["bytes"] += sum(len(payload) for _, (payload, _) in chunk)
+    _mqtt_counters["batches"] += 1
+
+def mqtt_publisher():
+  _wait_inventory()
+  cli, backoff, seen, last = None, 1.0, None, 0.0
+  while True:
+    try:
+      if cli is None:
+        cli = _MqttClient(MQTT_HOST, MQTT_PORT, MQTT_CLIENT_ID, username=MQTT_USERNAME, password=MQTT_PASSWORD,
+                          keepalive=MQTT_KEEPALIVE, will=(_mqtt_availability_topic(), b"offline"))
+        cli.connect()
+        cli.publish_many([(_mqtt_availability_topic(), b"online", True)])
+        with _mqtt_lock:
+          _mqtt_sent.clear()
+        if _mqtt_state["connected_at"] is not None:
+          _mqtt_counters["reconnects"] += 1
+        _mqtt_state.update(connected=True, connected_at=time.time(), last_error=None)
+        _startup_mark("mqtt")
+        logging.info("mqtt connected to %s:%d", MQTT_HOST, MQTT_PORT)
+        backoff, seen = 1.0, None
+      now = time.time()
+      mark = _inventory_state["version"]
+      if mark != seen or now - last >= MQTT_INTERVAL:
+        seen, last = mark, now
+        try:
+          _mqtt_collect()
+        except Exception as e:
+          logging.info("mqtt collect failed: %s", e)
+      _mqtt_flush(cli)
+      cli.poll()
     except Exception as e:
-      logging.info("warm cache error: %s", e)
-    time.sleep(900)
+      _mqtt_state.update(connected=False, last_error=str(e))
+      if "mqtt" not in _startup["at"]:
+        _startup["errors"]["mqtt"] = str(e)
+      logging.info("mqtt publisher error: %s (retrying in %.0fs)", e, backoff)
+      if cli is not None:
+        cli.close()
+        cli = None
+      time.sleep(backoff)
+      backoff = min(60.0, backoff * 2)
+      continue
+    time.sleep(1.0)
 
-threading.Thread(target=warm_remote_digest_cache, daemon=True).start()
+def _mqtt_view() -> dict:
+  if not MQTT_HOST:
+    return {"enabled": False}
+  with _mqtt_lock:
+    queued = len(_mqtt_queue)
+  return {"enabled": True, "broker": f"{MQTT_HOST}:{MQTT_PORT}", "connected": _mqtt_state["connected"], "last_error": _mqtt_state["last_error"],
+          "containers": len(_mqtt_state["names"]), "queue": queued, "queue_max": MQTT_QUEUE_MAX, "thresholds": MQTT_THRESHOLDS, "counters": dict(_mqtt_counters)}
+
+threading.Thread(target=startup_probe, daemon=True, name="startup-probe").start()
+if INVENTORY_ENABLED:
+  threading.Thread(target=inventory_watcher, daemon=True).start()
+_inventory_listeners.append(_refresh_on_inventory)
+threading.Thread(target=digest_refresh_scheduler, daemon=True).start()
+if STATS_STREAM_ENABLED and STATS_STREAM_MAX:
+  threading.Thread(target=stats_stream_supervisor, daemon=True).start()
+if _cgroup_version:
+  logging.info("reading container stats from cgroup v%d at %s", _cgroup_version, CGROUP_ROOT)
+  threading.Thread(target=cgroup_sampler, daemon=True, name="cgroup-sampler").start()
+if MQTT_HOST:
+  threading.Thread(target=mqtt_publisher, daemon=True, name="mqtt-publisher").start()
 
 if GUI_ENABLED:
   @app.get("/")
@@ -667,8 +3055,50 @@ else:
     return jsonify({
       "status": "ok",
       "message": "GUI disabled. API endpoints are available.",
-      "endpoints": ["/diag", "/status", "/metrics/<name>", "/update_container", "/images/unused", "/images/prune", "/settings"]
+      "endpoints": ["/ready", "/diag", "/diag/perf", "/status", "/events", "/metrics", "/metrics/<name>", "/metrics/<name>/history", "/update_container", "/update_containers", "/jobs", "/jobs/<id>", "/jobs/<id>/stream", "/images/unused", "/images/prune", "/disk", "/settings"]
     })
 
+_BUSY_BODY = b'{"error":"busy"}'
+_BUSY_RESPONSE = (b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Type: application/json\r\n"
+                  b"Content-Length: %d\r\n\r\n" % len(_BUSY_BODY)) + _BUSY_BODY
+
+def _serve_production(host: str, port: int):
+  from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+  class _OneShotHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.0"
+  class _PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+    def __init__(self, *a, **kw):
+      super().__init__(*a, **kw)
+      self._backlog = queue.Queue(maxsize=SERVER_QUEUE)
+      for i in range(SERVER_WORKERS):
+        threading.Thread(target=self._worker, daemon=True, name=f"http-{i}").start()
+    def process_request(self, request, client_address):
+      try:
+        self._backlog.put_nowait((request, client_address))
+        _server_counters["queued"] += 1
+      except queue.Full:
+        _server_counters["rejected_queue"] += 1
+        try:
+          request.sendall(_BUSY_RESPONSE)
+        except OSError:
+          pass
+        self.shutdown_request(request)
+    def _worker(self):
+      while True:
+        request, client_address = self._backlog.get()
+        try:
+          self.finish_request(request, client_address)
+        except Exception:
+          self.handle_error(request, client_address)
+        finally:
+          self.shutdown_request(request)
+  server = _PooledWSGIServer(host, port, app, handler=_OneShotHandler)
+  app.logger.info("production server on %s:%d (%d workers, queue %d, limits %s)", host, port, SERVER_WORKERS, SERVER_QUEUE, ENDPOINT_LIMITS)
+  server.serve_forever()
+
 if __name__ == "__main__":
-  app.run(host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
+  if SERVER_MODE == "production":
+    _serve_production("0.0.0.0", 5000)
+  else:
+    app.run(host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
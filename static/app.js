@@ -119,6 +119,11 @@ document.addEventListener('DOMContentLoaded', () => {
     if (authState.auth_enabled && authState.api_key) p.key = authState.api_key;
     return p;
   }
+  function containerUrl(prefix, name, params = {}) {
+    const i = name.indexOf('/');
+    if (i > 0) return buildUrl(`${prefix}/${encodeURIComponent(name.slice(i + 1))}`, keyParams({ ...params, host: name.slice(0, i) }));
+    return buildUrl(`${prefix}/${encodeURIComponent(name)}`, keyParams(params));
+  }
   function formatBytes(b) {
     if (b == null) return '0 B';
     const u = ['B', 'KB', 'MB', 'GB', 'TB', 'PB'];
@@ -230,14 +235,19 @@ document.addEventListener('DOMContentLoaded', () => {
     };
     return data;
   }
+  function setUnusedCount(count, reclaimable) {
+    if (!unusedCountElem) return;
+    unusedCountElem.textContent = (typeof count === 'number') ? count : '—';
+    unusedCountElem.title = (typeof reclaimable === 'number') ? formatBytes(reclaimable) : '';
+  }
   async function fetchUnusedImages() {
     try {
       const res = await fetch(buildUrl('/images/unused', keyParams()));
       if (!res.ok) throw new Error();
       const data = await res.json();
-      if (unusedCountElem) unusedCountElem.textContent = (typeof data.count === 'number') ? data.count : '—';
+      setUnusedCount(data.count, data.reclaimable);
     } catch {
-      if (unusedCountElem) unusedCountElem.textContent = '—';
+      setUnusedCount(null);
     }
   }
   async function pruneUnused() {
@@ -259,22 +269,36 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  let statusState = null;
   async function fetchStatus({ force=false, light=false } = {}) {
     const params = {};
     if (force) params.force = '1';
     if (light) params.light = '1';
+    if (light && !force && statusState) params.since = String(statusState.version);
     const res = await fetch(buildUrl('/status', keyParams(params)));
     if (!res.ok) throw new Error('GET /status failed');
     return res.json();
   }
+  function mergeStatus(data) {
+    if (!data || data.status !== 'ok') return data;
+    if (data.since == null || data.full || !statusState) {
+      statusState = { version: data.version, updates: { ...(data.updates || {}) }, meta: { ...(data.meta || {}) } };
+    } else {
+      Object.assign(statusState.updates, data.updates || {});
+      Object.assign(statusState.meta, data.meta || {});
+      for (const n of (data.removed || [])) { delete statusState.updates[n]; delete statusState.meta[n]; }
+      statusState.version = data.version;
+    }
+    return { status: 'ok', updates: statusState.updates, meta: statusState.meta };
+  }
   async function fetchStatusOne(name, force=false) {
-    const res = await fetch(buildUrl(`/status/${encodeURIComponent(name)}`, keyParams(force? {force:'1'}:{})));
+    const res = await fetch(containerUrl('/status', name, force? {force:'1'}:{}));
     if (!res.ok) throw new Error('GET /status/' + name + ' failed');
     return res.json();
   }
   async function fetchMetricsOne(name){
     try{
-      const res = await fetch(buildUrl(`/metrics/${encodeURIComponent(name)}`, keyParams()));
+      const res = await fetch(containerUrl('/metrics', name));
       if(!res.ok) return;
       const data = await res.json();
       const tr = document.getElementById(`row-${name}`);
@@ -284,6 +308,20 @@ document.addEventListener('DOMContentLoaded', () => {
     }catch(e){ /* soft */ }
   }
 
+  async function waitForJob(jobId, btn) {
+    for (;;) {
+      await new Promise(r => setTimeout(r, 1000));
+      const res = await fetch(buildUrl(`/jobs/${encodeURIComponent(jobId)}`, keyParams()));
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const job = await res.json();
+      if (btn) {
+        const pct = job.progress && job.progress.percent != null ? ` ${Math.round(job.progress.percent)}%` : '';
+        btn.textContent = t('update_btn') + pct;
+      }
+      if (job.state === 'succeeded' || job.state === 'failed') return job;
+    }
+  }
+
   async function updateContainer(name, btn) {
     if (btn) { btn.disabled = true; btn.textContent = t('update_btn'); }
     try {
@@ -292,11 +330,16 @@ document.addEventListener('DOMContentLoaded', () => {
         headers:{'Content-Type':'application/json'},
         body: JSON.stringify({ name })
       });
-      const data = await res.json().catch(()=> ({}));
+      let data = await res.json().catch(()=> ({}));
       if (!res.ok) {
         const msg = data && (data.error || data.message) ? (data.error || data.message) : `HTTP ${res.status}`;
         throw new Error(msg);
       }
+      if (data && data.job_id) {
+        const job = await waitForJob(data.job_id, btn);
+        if (job.state === 'failed') throw new Error(job.error || 'update failed');
+        data = job.result || {};
+      }
       if (data && (data.updated === false || /already up to date/i.test(String(data.message||'')))) {
         alert(t('up_to_date', { name }));
         await render(false);
@@ -503,10 +546,22 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   async function fillVisibleMetricsLazily(){
-    const batch = Array.from(visibleNames);
-    const chunkSize = 6;
-    for (let i=0; i<batch.length; i+=chunkSize){
-      await Promise.all(batch.slice(i, i+chunkSize).map(n => fetchMetricsOne(n)));
+    const names = Array.from(visibleNames);
+    if (!names.length) return;
+    try{
+      const res = await fetch(buildUrl('/metrics', keyParams()), {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ names })
+      });
+      if (!res.ok) throw new Error('POST /metrics failed');
+      const data = await res.json();
+      for (const [name, m] of Object.entries(data.meta || {})) {
+        const tr = document.getElementById(`row-${name}`);
+        if (tr) renderResourcesCell(tr.children[1], m || {}, name);
+      }
+    }catch(e){
+      await Promise.all(names.map(n => fetchMetricsOne(n)));
     }
   }
 
@@ -522,7 +577,7 @@ document.addEventListener('DOMContentLoaded', () => {
           if (tdRes) renderResourcesLoading(tdRes);
         }
       }
-      const data = await fetchStatus({ force, light:true });
+      const data = mergeStatus(await fetchStatus({ force, light:true }));
       if (data && data.status === 'ok') {
         try { localStorage.setItem('dm_cache', JSON.stringify({t:Date.now(), data})); } catch {}
         applyData(data, {pending:false});
@@ -544,6 +599,52 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  let eventSource = null;
+  let streamLive = false;
+  function startEventStream() {
+    if (!window.EventSource) return;
+    if (eventSource) eventSource.close();
+    const es = new EventSource(buildUrl('/events', keyParams({ metrics_interval: String(FAST_REFRESH_MS / 1000) })));
+    eventSource = es;
+    const onData = (type, fn) => es.addEventListener(type, (ev) => {
+      try { fn(JSON.parse(ev.data)); } catch (e) { console.error(e); }
+    });
+    onData('snapshot', (d) => {
+      streamLive = true;
+      applyData(mergeStatus({ status: 'ok', version: d.version, updates: d.updates, meta: d.meta }), { pending: false });
+      if (d.unused != null) setUnusedCount(d.unused, d.reclaimable);
+    });
+    onData('update', (d) => {
+      if (!statusState) return;
+      statusState.updates[d.name] = d.status;
+      statusState.meta[d.name] = { ...(statusState.meta[d.name] || {}), image: d.image };
+      statusState.version = d.version;
+      applyData({ status: 'ok', updates: statusState.updates, meta: statusState.meta });
+    });
+    onData('container', (d) => {
+      if (!statusState) return;
+      if (d.removed) {
+        delete statusState.updates[d.name];
+        delete statusState.meta[d.name];
+      } else if (d.name in statusState.updates) {
+        statusState.meta[d.name] = { ...(statusState.meta[d.name] || {}), state: d.state, image: d.image };
+      }
+      statusState.version = d.version;
+      applyData({ status: 'ok', updates: statusState.updates, meta: statusState.meta });
+    });
+    onData('metrics', (d) => {
+      for (const name of visibleNames) {
+        const tr = document.getElementById(`row-${name}`);
+        const m = d[name];
+        if (!tr || !m) continue;
+        const state = statusState && statusState.meta[name] ? statusState.meta[name].state : null;
+        renderResourcesCell(tr.children[1], { ...m, state: state || 'running' }, name);
+      }
+    });
+    onData('unused', (d) => setUnusedCount(d.count, d.reclaimable));
+    es.onerror = () => { streamLive = false; };
+  }
+
   function openSettings() {
     fetchSettings()
       .then(s => {
@@ -570,6 +671,7 @@ document.addEventListener('DOMContentLoaded', () => {
       alert(LANG === 'en' ? 'Settings saved' : 'Réglages enregistrés');
       closeSettings();
       render(true);
+      startEventStream();
     } catch (e) {
       alert((LANG === 'en' ? 'Error while saving: ' : 'Erreur lors de l’enregistrement: ') + e.message);
     }
@@ -634,7 +736,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     try { await fetchSettings(); } catch {}
     fetchUnusedImages();
-    setInterval(fetchUnusedImages, 30000);
+    setInterval(() => { if (!streamLive) fetchUnusedImages(); }, 30000);
 
     try {
       const raw = localStorage.getItem('dm_cache');
@@ -648,8 +750,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
     await render(true, true);
     setTimeout(() => fillVisibleMetricsLazily(), 300);
+    startEventStream();
 
-    setInterval(() => render(false), FAST_REFRESH_MS);
-    setInterval(() => render(false), 3600000);
+    setInterval(() => { if (!streamLive) render(false); }, FAST_REFRESH_MS);
+    setInterval(() => { if (!streamLive) render(false); }, 3600000);
   })();
 });
\ No newline at end of file
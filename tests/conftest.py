@@ -0,0 +1,6 @@
+import os, sys, tempfile
+
+_tmp = tempfile.mkdtemp(prefix="docker-monitor-tests-")
+os.environ.update(SETTINGS_PATH=os.path.join(_tmp, "settings.json"), DOCKER_HOSTS=f"local=unix://{_tmp}/docker.sock", HOSTNAME="",
+                  AUTH_ENABLED="false", CGROUP_STATS="false", INVENTORY_ENABLED="false", STATS_STREAM_ENABLED="false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
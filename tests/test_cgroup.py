@@ -0,0 +1,142 @@
+import types
+import pytest
+import script
+
+CID = "a" * 64
+OTHER = "b" * 64
+MEM_TOTAL = 16 * 1024 ** 3
+NET_DEV = """Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 999999     10    0    0    0     0          0         0   999999      10    0    0    0     0       0          0
+  eth0:   1000      5    0    0    0     0          0         0      400       3    0    0    0     0       0          0
+  eth1:    234      2    0    0    0     0          0         0       56       1    0    0    0     0       0          0
+"""
+
+def _write(path, text):
+  path.parent.mkdir(parents=True, exist_ok=True)
+  path.write_text(text)
+
+def _proc(proc, pid, cgroup_lines, net=NET_DEV):
+  _write(proc / str(pid) / "cgroup", "".join(line + "\n" for line in cgroup_lines))
+  _write(proc / str(pid) / "net" / "dev", net)
+
+def _container(cid=CID, pid=100, mode="bridge"):
+  return types.SimpleNamespace(id=cid, name="web", attrs={"State": {"Pid": pid}, "HostConfig": {"NetworkMode": mode}})
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+  root, proc = tmp_path / "cgroup", tmp_path / "proc"
+  _write(proc / "meminfo", f"MemTotal:       {MEM_TOTAL // 1024} kB\nMemFree:         1024 kB\n")
+  for name in ("CGROUP_ROOT", "HOST_PROC"):
+    monkeypatch.setattr(script, name, str(root if name == "CGROUP_ROOT" else proc))
+  for name in ("_cgroup_paths", "_cgroup_prev", "_cgroup_mem_total"):
+    monkeypatch.setattr(script, name, {})
+  clock = [1000.0]
+  monkeypatch.setattr(script.time, "monotonic", lambda: clock[0])
+  return types.SimpleNamespace(root=root, proc=proc, clock=clock, version=lambda v: monkeypatch.setattr(script, "_cgroup_version", v))
+
+def _v2(tree, cid=CID, *, usage_usec=1_000_000, current=256 * 1024 ** 2, limit="max"):
+  d = tree.root / "system.slice" / f"docker-{cid}.scope"
+  _write(tree.root / "cgroup.controllers", "cpu io memory\n")
+  _write(d / "cpu.stat", f"usage_usec {usage_usec}\nuser_usec 600000\nsystem_usec 400000\n")
+  _write(d / "memory.current", f"{current}\n")
+  _write(d / "memory.max", f"{limit}\n")
+  _write(d / "io.stat", "8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n259:0 rbytes=100 wbytes=200 rios=1 wios=1 dbytes=0 dios=0\n")
+  tree.version(2)
+  return d
+
+def _v1(tree, cid=CID, *, usage_ns=2_000_000_000, current=128 * 1024 ** 2, limit=9223372036854771712):
+  for ctrl, files in (("cpu,cpuacct", {"cpuacct.usage": usage_ns}), ("memory", {"memory.usage_in_bytes": current, "memory.limit_in_bytes": limit}),
+                      ("blkio", {"blkio.throttle.io_service_bytes_recursive":
+                                 "8:0 Read 4096\n8:0 Write 8192\n8:0 Sync 0\n8:0 Async 12288\n8:0 Total 12288\n8:16 Read 10\n8:16 Write 20\nTotal 12318"})):
+    for fname, value in files.items():
+      _write(tree.root / ctrl / "docker" / cid / fname, f"{value}\n")
+  tree.version(1)
+
+def test_v2_sample_falls_back_to_memtotal_and_skips_lo(tree):
+  d = _v2(tree)
+  _proc(tree.proc, 100, [f"0::/system.slice/docker-{CID}.scope"])
+  dirs = script._cgroup_dirs(_container())
+  assert dirs == {"cpu": str(d), "memory": str(d), "io": str(d), "pid": 100}
+  meta = script._cgroup_sample(CID, dirs)
+  assert meta["cpu"] is None
+  assert meta["mem_usage"] == 256 * 1024 ** 2
+  assert meta["mem_limit"] == MEM_TOTAL
+  assert meta["mem_perc"] == pytest.approx(256 * 1024 ** 2 / MEM_TOTAL * 100)
+  assert (meta["blk_read"], meta["blk_write"]) == (4196, 8392)
+  assert (meta["net_rx"], meta["net_tx"]) == (1234, 456)
+
+def test_v2_explicit_memory_limit(tree):
+  _v2(tree, limit=512 * 1024 ** 2)
+  _proc(tree.proc, 100, [f"0::/system.slice/docker-{CID}.scope"])
+  meta = script._cgroup_sample(CID, script._cgroup_dirs(_container()))
+  assert meta["mem_limit"] == 512 * 1024 ** 2
+  assert meta["mem_perc"] == pytest.approx(50.0)
+
+def test_v1_unlimited_limit_and_blkio(tree):
+  _v1(tree)
+  _proc(tree.proc, 100, [f"12:memory:/docker/{CID}", f"4:cpu,cpuacct:/docker/{CID}", f"3:blkio:/docker/{CID}"])
+  dirs = script._cgroup_dirs(_container())
+  assert dirs == {"cpu": str(tree.root / "cpu,cpuacct" / "docker" / CID), "memory": str(tree.root / "memory" / "docker" / CID),
+                  "io": str(tree.root / "blkio" / "docker" / CID), "pid": 100}
+  meta = script._cgroup_sample(CID, dirs)
+  assert meta["mem_limit"] == MEM_TOTAL
+  assert (meta["blk_read"], meta["blk_write"]) == (4106, 8212)
+  assert (meta["net_rx"], meta["net_tx"]) == (1234, 456)
+
+def test_cpu_percent_from_two_samples(tree):
+  d = _v2(tree, usage_usec=1_000_000)
+  _proc(tree.proc, 100, [f"0::/system.slice/docker-{CID}.scope"])
+  dirs = script._cgroup_dirs(_container())
+  assert script._cgroup_sample(CID, dirs)["cpu"] is None
+  tree.clock[0] += 2.0
+  _write(d / "cpu.stat", "usage_usec 2500000\n")
+  assert script._cgroup_sample(CID, dirs)["cpu"] == pytest.approx(75.0)
+  tree.clock[0] += 0.1
+  _write(d / "cpu.stat", "usage_usec 9000000\n")
+  assert script._cgroup_sample(CID, dirs)["cpu"] == pytest.approx(75.0)
+  tree.clock[0] += 0.9
+  assert script._cgroup_sample(CID, dirs)["cpu"] == pytest.approx(650.0)
+
+def test_find_through_proc_path(tree):
+  _v2(tree)
+  nested = tree.root / "kubepods" / "pod1" / CID
+  nested.parent.mkdir(parents=True)
+  (tree.root / "system.slice" / f"docker-{CID}.scope").rename(nested)
+  _proc(tree.proc, 100, [f"0::/kubepods/pod1/{CID}"])
+  assert script._cgroup_find(CID, 100) == {"cpu": str(nested), "memory": str(nested), "io": str(nested)}
+
+def test_pid_of_another_container_is_rejected(tree):
+  _v2(tree)
+  _v2(tree, OTHER)
+  _proc(tree.proc, 100, [f"0::/system.slice/docker-{OTHER}.scope"])
+  assert script._cgroup_dirs(_container(pid=100)) is None
+  assert script._cgroup_proc_path(100, CID) is None
+
+def test_proc_path_must_name_the_container(tree):
+  _v2(tree, OTHER)
+  _write(tree.root / "cgroup.controllers", "cpu io memory\n")
+  _proc(tree.proc, 100, [f"0::/system.slice/docker-{OTHER}.scope"])
+  assert script._cgroup_find(CID, 100) is None
+
+def test_host_network_skips_net_dev(tree):
+  _v2(tree)
+  dirs = script._cgroup_dirs(_container(pid=100, mode="host"))
+  assert dirs["pid"] is None
+  meta = script._cgroup_sample(CID, dirs)
+  assert (meta["net_rx"], meta["net_tx"]) == (0, 0)
+
+def test_detect_ignores_own_namespace_tree(tmp_path):
+  _write(tmp_path / "cgroup.controllers", "cpu io memory\n")
+  _write(tmp_path / "cpu.stat", "usage_usec 1\n")
+  (tmp_path / "init.scope").mkdir()
+  assert script._cgroup_detect(str(tmp_path)) is None
+  assert script._cgroup_detect(str(tmp_path), explicit=True) == 2
+
+def test_detect_v2_host_tree(tree):
+  _v2(tree)
+  assert script._cgroup_detect(str(tree.root)) == 2
+
+def test_detect_v1_host_tree(tree):
+  _v1(tree)
+  assert script._cgroup_detect(str(tree.root)) == 1
@@ -0,0 +1,8 @@
+import pytest
+import script
+
+@pytest.mark.parametrize("method,path", [("get", "/status"), ("get", "/images/unused"), ("post", "/images/prune"), ("get", "/disk")])
+def test_unknown_host_is_404(method, path):
+  resp = getattr(script.app.test_client(), method)(path, query_string={"host": "nope"})
+  assert resp.status_code == 404
+  assert resp.get_json() == {"error": "unknown host nope"}
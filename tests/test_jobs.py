@@ -0,0 +1,52 @@
+import threading
+import time
+import types
+import script
+
+def test_update_job_keys_are_fixed_at_creation(monkeypatch):
+  pull = {"ref": "nginx:latest", "status": "pulling", "layers": {"l1": {"current": 5, "total": 10}}, "jobs": 1}
+  def ensure(image_ref, job=None, host=None):
+    job["pull"] = pull
+    return "pulled"
+  container = types.SimpleNamespace(name="web", id="old")
+  monkeypatch.setattr(script, "_get_container", lambda name: container)
+  monkeypatch.setattr(script, "_resolve_update_statuses", lambda cs, force=False: {"web": "update_available"})
+  monkeypatch.setattr(script, "_update_image_ref", lambda c: "nginx:latest")
+  monkeypatch.setattr(script, "_ensure_image", ensure)
+  monkeypatch.setattr(script, "_recreate_container", lambda c, ref, name: "new")
+  monkeypatch.setattr(script, "_disk_invalidate", lambda host=None: None)
+  job = script._new_job("update", name="web")
+  keys = set(job)
+  views, stop = [], threading.Event()
+  def reader():
+    while not stop.is_set():
+      views.append(script._job_view(job))
+  t = threading.Thread(target=reader)
+  t.start()
+  try:
+    script._run_update_job(job)
+  finally:
+    stop.set()
+    t.join()
+  assert set(job) == keys
+  assert job["state"] == "succeeded" and job["image"] == "nginx:latest"
+  final = script._job_view(job)
+  assert "pull" not in final and "done" not in final
+  assert final["progress"]["percent"] == 50.0
+
+def test_second_bulk_update_is_rejected_while_one_runs(monkeypatch):
+  release = threading.Event()
+  def run(job):
+    release.wait(5)
+    job.update({"state": "succeeded", "phase": "done", "finished": time.time()})
+    job["done"].set()
+  monkeypatch.setattr(script, "_run_bulk_update_job", run)
+  http = script.app.test_client()
+  first = http.post("/update_containers", json={"names": ["a", "b"]})
+  assert first.status_code == 202
+  second = http.post("/update_containers", json={"names": ["c"]})
+  assert second.status_code == 409
+  assert second.get_json()["error"] == "bulk_update_in_progress" and second.get_json()["job_id"] == first.get_json()["job_id"]
+  release.set()
+  script._jobs[first.get_json()["job_id"]]["done"].wait(5)
+  assert http.post("/update_containers", json={"names": ["c"], "wait": True}).status_code == 200
@@ -0,0 +1,31 @@
+import json
+import pytest
+import script
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+  path = tmp_path / "digest_cache.json"
+  monkeypatch.setattr(script, "DIGEST_CACHE_PATH", str(path))
+  monkeypatch.setattr(script, "REFRESH_JITTER", 0.0)
+  monkeypatch.setattr(script, "_pull_cache", {})
+  monkeypatch.setattr(script, "_pull_cache_state", {"loaded": False, "dirty": False})
+  monkeypatch.setattr(script, "_refresh_state", {})
+  monkeypatch.setattr(script, "_refresh_heap", [])
+  return path
+
+def test_persisted_entry_is_scheduled_after_its_interval(cache):
+  now = 1_700_000_000.0
+  checked = now - 60
+  cache.write_text(json.dumps({"v": 1, "e": {"nginx:latest": ["sha256:" + "1" * 64, checked], "app:1.2.3": ["sha256:" + "2" * 64, checked]}}))
+  script._refresh_sync({"nginx:latest", "app:1.2.3", "redis:7"}, now)
+  assert script._pull_cache_state["loaded"]
+  assert script._refresh_state["nginx:latest"]["due"] == checked + script.REFRESH_MUTABLE_INTERVAL
+  assert script._refresh_state["app:1.2.3"]["due"] == checked + script.REFRESH_PINNED_INTERVAL
+  assert script._refresh_state["redis:7"]["due"] == now
+  assert script._refresh_due(now) == ["redis:7"]
+
+def test_stale_persisted_entry_is_due_now(cache):
+  now = 1_700_000_000.0
+  cache.write_text(json.dumps({"v": 1, "e": {"nginx:latest": ["sha256:" + "1" * 64, now - 2 * script.REFRESH_MUTABLE_INTERVAL]}}))
+  script._refresh_sync({"nginx:latest"}, now)
+  assert script._refresh_state["nginx:latest"]["due"] == now
@@ -0,0 +1,30 @@
+import script
+
+def test_lscr_fallback_is_counted_against_ghcr(monkeypatch):
+  monkeypatch.setattr(script, "PERF_ENABLED", True)
+  monkeypatch.setattr(script, "_perf", {"phases": {}, "registries": {}})
+  monkeypatch.setattr(script, "_registry_usage", {})
+  monkeypatch.setattr(script, "_registry_limits", {})
+  def fetch(registry, repo_path, tag, counter):
+    assert (repo_path, tag) == ("linuxserver/sonarr", "latest")
+    if registry == "lscr.io":
+      counter[0] += 2
+      return None, 404
+    counter[0] += 3
+    return "sha256:abc", None
+  monkeypatch.setattr(script, "_fetch_manifest_digest", fetch)
+  assert script._get_remote_digest_counted("lscr.io/linuxserver/sonarr") == ("sha256:abc", 5)
+  assert {r: sum(n for _, n in u) for r, u in script._registry_usage.items()} == {"lscr.io": 2, "ghcr.io": 3}
+  assert {r: e["count"] for r, e in script._perf["registries"].items()} == {"lscr.io": 1, "ghcr.io": 1}
+
+def test_lscr_fallback_skips_rate_limited_ghcr(monkeypatch):
+  monkeypatch.setattr(script, "_registry_usage", {})
+  monkeypatch.setattr(script, "_registry_limits", {"ghcr.io": {"blocked_until": script.time.time() + 60}})
+  calls = []
+  def fetch(registry, repo_path, tag, counter):
+    calls.append(registry)
+    counter[0] += 1
+    return None, 404
+  monkeypatch.setattr(script, "_fetch_manifest_digest", fetch)
+  assert script._get_remote_digest_counted("lscr.io/linuxserver/sonarr") == (None, 1)
+  assert calls == ["lscr.io"]
@@ -0,0 +1,57 @@
+import types
+import script
+
+class _Api:
+  def __init__(self, log):
+    self.log = log
+  def create_host_config(self, **kw):
+    return kw
+  def create_container(self, **kw):
+    self.log.append(("create", kw["name"].split("-update-")[0]))
+    return {"Id": "new"}
+  def connect_container_to_network(self, cid, net, **kw):
+    self.log.append(("connect", net, kw.get("ipv4_address")))
+  def rename(self, cid, name):
+    self.log.append(("rename_new", name))
+  def start(self, cid):
+    self.log.append(("start_new",))
+  def remove_container(self, cid, force=False):
+    self.log.append(("remove_new",))
+
+class _Container:
+  def __init__(self, log, networks):
+    self.log, self.id, self.name = log, "old", "web"
+    self.attrs = {"Name": "/web", "Config": {"Image": "nginx:latest"}, "HostConfig": {"NetworkMode": "front"},
+                  "NetworkSettings": {"Networks": networks}}
+  def stop(self, timeout=10):
+    self.log.append(("stop",))
+  def rename(self, name):
+    self.log.append(("rename_old",))
+  def remove(self):
+    self.log.append(("remove_old",))
+  def start(self):
+    self.log.append(("start_old",))
+
+def test_only_ipam_networks_wait_for_the_stop(monkeypatch):
+  log = []
+  networks = {
+    "front": {"IPAddress": "172.18.0.5", "IPAMConfig": None, "Aliases": ["web"]},
+    "back": {"IPAddress": "172.19.0.9", "IPAMConfig": {}},
+    "fixed": {"IPAddress": "10.0.0.10", "IPAMConfig": {"IPv4Address": "10.0.0.10"}},
+  }
+  container = _Container(log, networks)
+  monkeypatch.setattr(script, "_record_downtime", lambda *a: None)
+  spec = script._recreate_spec(container, "web")
+  assert spec["static_networks"] == {"fixed"}
+  script._swap_container(types.SimpleNamespace(api=_Api(log)), container, "nginx:latest", spec, "web")
+  stop = log.index(("stop",))
+  before, after = log[:stop], log[stop:]
+  assert ("connect", "front", None) in before and ("connect", "back", None) in before
+  assert ("connect", "fixed", "10.0.0.10") in after
+  assert after[-3:] == [("rename_new", "web"), ("start_new",), ("remove_old",)]
+
+def test_recreate_keeps_the_runtime_address(monkeypatch):
+  container = _Container([], {"front": {"IPAddress": "172.18.0.5", "IPAMConfig": None}})
+  spec = script._recreate_spec(container, "web")
+  assert spec["networks"]["front"]["ipv4_address"] == "172.18.0.5"
+  assert spec["static_networks"] == set()